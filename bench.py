@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Benchmarks of every stage of the pipeline, over synthetic data (see synthetic.py)
+of 10k and 100k voters. The inputs of all the stages are held in memory at once,
+several GB for 1M voters, so that size is only run when asked for (--sizes).
+
+Each stage is timed repeat times and the best time kept; its inputs are built
+beforehand and not timed. Results are json:
+    {"meta": {...}, "results": {"<size>": {"<stage>": {"seconds": s, "rows_per_sec": r}}}}
+Given a baseline (the results of an earlier run on the same machine; by default
+BASELINE, if there is one), every stage that got slower by more than threshold
+is reported, and the exit status is 1. --save-baseline makes a run the baseline.
+
+    python bench.py --save-baseline
+    python bench.py --threshold 0.2
+    python bench.py --sizes 1000000 --baseline big.json --output bench_output.txt
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+from datetime import date
+import synthetic
+import voter_reader
+import ndjson_writer
+import clean
+import extractor
+from delta_ingest import iter_rows
+from history_matrix import HistoryMatrix
+
+SIZES = [10000, 100000]
+REPEAT = 3
+DEFAULT_THRESHOLD = 0.10      # slow down (as a fraction) reported as a regression
+TODAY = date(synthetic.EXPORT_YEAR, 11, 1)
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+
+def stage_read_file(data):
+    voter_reader.read_file(data['export'])
+
+def stage_csv_decode(data):
+    for row in iter_rows(data['export']):
+        pass
+
+def stage_validation(data):
+    Voter = voter_reader.Voter
+    for row in data['rows']:
+        Voter(row)
+
+def stage_write_json(data):
+    voter_reader.write_json(data['voters'], data['out'])
+
+def stage_write_ndjson(data):
+    ndjson_writer.write_ndjson(data['voters'], data['out'])
+
+def stage_generate_all_elections(data):
+    voter_reader.generate_all_elections(data['history_rows'])
+
+def stage_efficiency(data):
+    voter_reader.avg_voting_efficiency_by_party(data['history_voters'], data['elections'])
+
+def stage_history_matrix(data):
+    h = HistoryMatrix.from_rows(data['rows'], this_year=synthetic.EXPORT_YEAR)
+    h.avg_efficiency_by(data['affiliations'])
+
+def stage_clean(data):
+    clean.process_file(data['tika'], on_error=lambda kind, text: None)
+
+def stage_extract_fb_info(data):
+    extractor.extract_fb_info(data['dated_voters'], TODAY)
+
+# name -> function of the prepared data; each processes every row of its input
+STAGES = {
+    'read_file': stage_read_file,
+    'csv_decode': stage_csv_decode,
+    'validation': stage_validation,
+    'write_json': stage_write_json,
+    'write_ndjson': stage_write_ndjson,
+    'generate_all_elections': stage_generate_all_elections,
+    'efficiency': stage_efficiency,
+    'history_matrix': stage_history_matrix,
+    'clean.process_file': stage_clean,
+    'extract_fb_info': stage_extract_fb_info,
+    }
+
+
+def prepare(n, workdir, seed=0):
+    """
+    The inputs of the stages for n voters: the export and call list files (in
+    workdir), the rows and Voters read from the export, and the subsets the legacy
+    functions can take (voters with a well formed history, resp. date of birth).
+    """
+    export = os.path.join(workdir, 'export-%d.csv' % n)
+    tika = os.path.join(workdir, 'calllist-%d.txt' % n)
+    synthetic.write_export(export, n, seed)
+    synthetic.write_tika(tika, n, seed)
+    voters, rows = voter_reader.read_file(export)
+    ok = [(v, r) for v, r in zip(voters, rows) if type(v.history_codes) is list]
+    history_rows = [r for v, r in ok]
+    return {
+        'export': export, 'tika': tika, 'out': os.path.join(workdir, 'out'),
+        'rows': rows, 'voters': voters,
+        'affiliations': [v.affiliation for v in voters],
+        'history_rows': history_rows,
+        'history_voters': [v for v, r in ok],
+        'elections': voter_reader.generate_all_elections(history_rows),
+        'dated_voters': [v for v in voters if type(v.dob) is dict],
+        }
+
+def time_stage(func, data, repeat=REPEAT):
+    "The best of repeat timings of func(data), in seconds."
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(data)
+        t = time.perf_counter() - start
+        best = t if best is None or t < best else best
+    return best
+
+def run(sizes=SIZES, stages=None, repeat=REPEAT, seed=0, workdir=None, log=None):
+    "Benchmark results (see the module doc) for the given sizes and stages (default all)."
+    stages = stages or list(STAGES)
+    results = {}
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for n in sizes:
+            data = prepare(n, tmp, seed)
+            results[str(n)] = r = {}
+            for name in stages:
+                t = time_stage(STAGES[name], data, repeat)
+                r[name] = {'seconds': round(t, 6), 'rows_per_sec': round(n / t, 1) if t else None}
+                if log:
+                    log('{:>9} {:<24} {:10.3f}s {:>12} rows/s'.format(
+                        n, name, t, r[name]['rows_per_sec']))
+            del data
+    meta = {'date': date.today().isoformat(), 'python': platform.python_version(),
+            'platform': platform.platform(), 'machine': platform.machine(),
+            'cpus': os.cpu_count(), 'repeat': repeat, 'seed': seed}
+    return {'meta': meta, 'results': results}
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    List of (size, stage, baseline seconds, seconds, ratio) for the stages timed in
+    both results and baseline that are more than threshold slower in results.
+    """
+    regressions = []
+    for n, stages in results['results'].items():
+        for name, r in stages.items():
+            b = baseline['results'].get(n, {}).get(name)
+            if b is None or not b['seconds']:
+                continue
+            ratio = r['seconds'] / b['seconds']
+            if ratio > 1 + threshold:
+                regressions.append((n, name, b['seconds'], r['seconds'], round(ratio, 3)))
+    return regressions
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Benchmark the voter pipeline on synthetic data.')
+    p.add_argument('--sizes', default=','.join(map(str, SIZES)),
+                   help='comma separated numbers of voters')
+    p.add_argument('--stages', default=None,
+                   help='comma separated stages, of: ' + ', '.join(STAGES))
+    p.add_argument('--repeat', type=int, default=REPEAT)
+    p.add_argument('--seed', type=int, default=0)
+    p.add_argument('--output', help='write the json results here (default stdout)')
+    p.add_argument('--baseline', default=None,
+                   help='json results of an earlier run to compare against (default ' + BASELINE + ', if there)')
+    p.add_argument('--save-baseline', action='store_true', help='write the results to the baseline')
+    p.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    args = p.parse_args(argv)
+    stages = args.stages.split(',') if args.stages else None
+    for name in stages or []:
+        if name not in STAGES:
+            p.error('unknown stage ' + name)
+    log = lambda s: print(s, file=sys.stderr)
+    baseline_fn = args.baseline or BASELINE
+    if args.baseline and not args.save_baseline and not os.path.exists(args.baseline):
+        p.error('no baseline ' + args.baseline)
+    results = run([int(n) for n in args.sizes.split(',')], stages, args.repeat, args.seed, log=log)
+    if not args.save_baseline and os.path.exists(baseline_fn):
+        with open(baseline_fn) as fp:
+            baseline = json.load(fp)
+        for k in ('python', 'machine', 'cpus'):
+            if baseline['meta'].get(k) != results['meta'][k]:
+                log('WARNING baseline {} is {}, not {}'.format(k, baseline['meta'].get(k), results['meta'][k]))
+        regressions = compare(results, baseline, args.threshold)
+        results['regressions'] = [dict(zip(('size', 'stage', 'baseline', 'seconds', 'ratio'), x))
+                                  for x in regressions]
+        for x in regressions:
+            log('REGRESSION {:>9} {:<24} {:.3f}s -> {:.3f}s (x{})'.format(*x))
+    text = json.dumps(results, indent=2, sort_keys=True)
+    if args.save_baseline:
+        with open(baseline_fn, 'w') as fp:
+            fp.write(text + '\n')
+        log('baseline written to ' + baseline_fn)
+    if args.output:
+        with open(args.output, 'w') as fp:
+            fp.write(text + '\n')
+    else:
+        print(text)
+    return 1 if results.get('regressions') else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
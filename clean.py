@@ -25,6 +25,7 @@ Registered	mm/dd/yyyy
 Status          |Active| or |Active ADMIN|
 """
 import re
+import json
 
 class Voters:
     "Representation of the data for a voter."
@@ -63,45 +64,48 @@ def date_to_string(date):
                          
     
 
-def clean(line, town='CA', city_in=' (MAHOPAC|CARMEL|PUTNAM VALLEY) '):
+CITY_IN = ' (MAHOPAC|CARMEL|PUTNAM VALLEY) '
+
+def clean(line, town='CA', city_in=CITY_IN):
     "Clean the data obtained from running tika on a pdf containing voter records"
-    pre, town, ward, district, post=re.split("(" + town + ")/(\d{3})/(\d{3})", line)
+    x = extractors(town, city_in)
+    pre, town, ward, district, post = x.town_ward.split(line)
     r_town_ward={'town':town, 'ward':ward, 'district':district}
 
-    x=re.split(AFFS, pre+post)
-    assert len(x)==3, 'pre, aff, post |' + str(x) + '|'
-    pre, aff, post = x
+    x_=x.aff.split(pre+post)
+    assert len(x_)==3, 'pre, aff, post |' + str(x_) + '|'
+    pre, aff, post = x_
     r_aff=aff
 
-    x=re.split("(\d{8})", pre)
-    assert len(x)==3, print('empty, voterid, rest' + str(x))
-    empty, voterid, rest = x
+    x_=x.voterid.split(pre)
+    assert len(x_)==3, 'empty, voterid, rest' + str(x_)
+    empty, voterid, rest = x_
     r_voterid=voterid
 
-    x=re.split("("+ city_in+")", rest)
-    assert len(x)==4, print('name_add, city, zip ' + str(x))
-    name_add, city, ignore, zip = x
+    x_=x.city.split(rest)
+    assert len(x_)==4, 'name_add, city, zip ' + str(x_)
+    name_add, city, ignore, zip = x_
     r_city=city
     r_zip=zip
 
-    x=re.split("\W([0-9]+)\W", name_add)
-    assert len(x) >=3, print('name, num, add ' + str(x))
-    r_name=x[0].strip()
-    r_address=' '.join(x[1:])
+    x_=x.house_number.split(name_add)
+    assert len(x_) >=3, 'name, num, add ' + str(x_)
+    r_name=x_[0].strip()
+    r_address=' '.join(x_[1:])
 
-    rx = re.split( '([^MF]*)(M|F)\W*' + MMDDYYYY + '\W*' + MMDDYYYY +'\W*', post)
+    rx = x.post.split(post)
     ignore, phone, sex, dob, reg_date, status = rx
     r_phone=phone.strip()
     r_sex=sex
 
-    ignore, month, day, year, ignore = re.split('([0-9]{2})/([0-9]{2})/([0-9]{4})', dob)
+    ignore, month, day, year, ignore = x.date.split(dob)
     r_dob={'month':int(month), 'day':int(day), 'year':int(year)}
-    ignore, month, day, year, ignore = re.split('([0-9]{2})/([0-9]{2})/([0-9]{4})', reg_date)
+    ignore, month, day, year, ignore = x.date.split(reg_date)
     r_registered={'month':int(month), 'day':int(day), 'year':int(year)}
     r_status=status.strip()
 
-    return Voter(r_town_ward, r_voterid, r_name, r_address, r_city, r_zip, r_aff, r_phone,
-                 r_sex, r_dob, r_registered, r_status)
+    return Voters(r_town_ward, r_voterid, r_name, r_address, r_city, r_zip, r_aff, r_phone,
+                  r_sex, r_dob, r_registered, r_status)
 
 
 TOWNS = 'PATTERSON|CARMEL|KENT|PHILIPSTOWN|PUTNAM VALLEY|SOUTHEAST'
@@ -126,46 +130,138 @@ IGNORES = [
     ]
 
 IGNORE_PATTERNS = [
-    '(' + TOWNS+',\WDistrict \d*)',
+    '((?:' + TOWNS+'),\WDistrict \d*)',
     '(Putnam County Board of Elections)',
     '(Town of:)',
-    '(Detailed Voter Master Call List'),
+    '(Detailed Voter Master Call List)',
     '(Voters Reported)',
     '(User:\W\w*\W Station: BOE-)',
     ]
 
+# All the ignore rules as one regex: an exact IGNORES line, or a line containing
+# a match for one of the IGNORE_PATTERNS.
+IGNORE_RE = re.compile('|'.join(['^(?:' + '|'.join(map(re.escape, IGNORES)) + ')$'] +
+                                ['(?:' + p + ')' for p in IGNORE_PATTERNS]))
+
 def ignore(line):
-    if line in IGNORES:
-        return True
-    for pat in IGNORE_PATTERNS:
-        if len(re.split(pat, line)) > 1:
-            return True
-    return False
-
-def process_file(fn, town='CA'):
-    results=[]
-    result={}
-    with open(fn) as fp:
-        for line in fp:
-            line = line.strip()
-            if line == '':
-                continue
-            if line == 'ADMIN':
-                if 'status' in result:
-                    result['status'] = result['status'] + ' ADMIN'
-                continue
-            if len(re.split('( DEM )', line)) < 2:
-                if not ignore(line):
-                    print('Ignoring |' + line + '|')
+    return IGNORE_RE.search(line) is not None
+
+
+class Extractors:
+    "The regexes clean() uses for a given town and set of cities, compiled once."
+    def __init__(self, town, city_in):
+        self.town_ward = re.compile("(" + town + ")/(\d{3})/(\d{3})")
+        self.aff = re.compile(AFFS)
+        self.voterid = re.compile("(" + Voter_ID + ")")
+        self.record_start = re.compile(Voter_ID + ' ')     # tika lines of a record start with its id
+        self.city = re.compile("("+ city_in+")")
+        self.house_number = re.compile("\W([0-9]+)\W")
+        self.post = re.compile('([^MF]*)(' + GENDER + ')\W*' + MMDDYYYY + '\W*' + MMDDYYYY +'\W*')
+        self.date = re.compile('([0-9]{2})/([0-9]{2})/([0-9]{4})')
+        # A (possibly reassembled) line is a complete record once it has all of
+        # the voter id, town/ward/dist, affiliation and the sex, dob, registered tail.
+        self.complete = re.compile('^(?=.*' + Voter_ID + ')(?=.*' + town + '/\d{3}/\d{3})' +
+                                   '(?=.*' + AFFS + ')(?=.*(?:' + GENDER + ')\W*' +
+                                   MMDDYYYY + '\W*' + MMDDYYYY + ')')
+
+_extractors = {}
+def extractors(town, city_in=CITY_IN):
+    x = _extractors.get((town, city_in))
+    if x is None:
+        x = _extractors[(town, city_in)] = Extractors(town, city_in)
+    return x
+
+
+MAX_FRAGMENTS = 4     # lines a record may be split over before we give up on it
+
+def print_ignoring(kind, text):
+    "Default on_error for iter_records: the human-in-the-loop report."
+    print('Ignoring |' + text + '|')
+
+def iter_records(lines, town='CA', city_in=CITY_IN, on_error=print_ignoring, stats=None):
+    """
+    Generator over the Voters in the lines of tika output.
+    Each line is classified once: blank, 'ADMIN' (continues the status of the
+    previous record), a complete record, an ignored (header/footer) line, or a
+    fragment. Fragments are joined, across ignored lines such as page headers,
+    until they make a complete record; a fragment starting with a voter id
+    starts a new record. Records of any of the AFFS affiliations are taken. on_error(kind, text) is called for each
+    line (or joined fragments) that cannot be used: kind is 'fragment' for
+    fragments that never made a record, 'unparseable' for records clean() rejects.
+    stats, an ingest_stats.IngestStats, gets the count of lines of each kind.
+    """
+    if stats is not None:
+        return stats.timed(_iter_records(lines, town, city_in, _counting(on_error, stats), stats))
+    return _iter_records(lines, town, city_in, on_error, stats)
+
+def _iter_records(lines, town, city_in, on_error, stats):
+    x = extractors(town, city_in)
+    complete = x.complete.search
+    record_start = x.record_start.match
+    ignored = IGNORE_RE.search
+    fragments = []
+    pending = None        # last record, held back in case an 'ADMIN' line follows
+
+    for line in lines:
+        line = line.strip()
+        if line == '':
+            if stats is not None:
+                stats.lines['blank'] += 1
+            continue
+        if line == 'ADMIN':
+            if stats is not None:
+                stats.lines['admin'] += 1
+            if pending is not None:
+                pending.status = pending.status + ' ADMIN'
+            continue
+        if complete(line):
+            if fragments:
+                on_error('fragment', ' '.join(fragments))
+                fragments = []
+            text = line
+        elif ignored(line):
+            if stats is not None:
+                stats.lines['ignored'] += 1
+            continue
+        else:
+            if fragments and record_start(line):
+                on_error('fragment', ' '.join(fragments))
+                fragments = []
+            fragments.append(line)
+            text = ' '.join(fragments)
+            if not complete(text):
+                if len(fragments) >= MAX_FRAGMENTS:
+                    on_error('fragment', fragments.pop(0))
                 continue
-            #TODO: Figure out how to concatenate partial lines
-            result = clean(line, town)
-            results.append(result)
-    return results
+            fragments = []
+        if pending is not None:
+            yield pending
+        try:
+            pending = clean(text, town, city_in)
+            if stats is not None:
+                stats.lines['records'] += 1
+                stats.rows += 1
+        except (AssertionError, ValueError):
+            on_error('unparseable', text)
+            pending = None
+    if pending is not None:
+        yield pending
+    if fragments:
+        on_error('fragment', ' '.join(fragments))
+
+def _counting(on_error, stats):
+    def counting_on_error(kind, text):
+        stats.lines[kind] += 1
+        on_error(kind, text)
+    return counting_on_error
+
+def process_file(fn, town='CA', city_in=CITY_IN, on_error=print_ignoring, stats=None):
+    with open(fn) as fp:
+        return list(iter_records(fp, town, city_in, on_error, stats))
 
 def write_json(data, fn):
     with open(fn, 'w') as fp:
-        json.dump(result, fp, ensure_ascii=False, indent=4, sort_keys=True)
+        json.dump(data, fp, default=vars, ensure_ascii=False, indent=4, sort_keys=True)
 
 def extract_field_containing(records, field_name, value):
     "This code expects every record to have a field_name field."
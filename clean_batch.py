@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Batch cleaning of the tika extracts of the call lists of several towns.
+
+Given a directory of per-town tika text files, work out the town of each file
+(from its name, else from the Town/Ward/Dist codes in it), pick the set of
+cities for that town, and run clean.process_file on all the files in a process
+pool. The records come back as one stream, file by file in name order (so the
+same record wins every run), de-duplicated on the voter id, and with a report
+per file of what could not be parsed. A county refresh then takes about as long
+as the slowest town.
+
+    report = {}
+    for r in iter_directory('extracts/', report=report):
+        ...
+    records, report = process_directory('extracts/')
+"""
+import os
+import re
+import glob
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import clean
+
+TOWN_NAMES = {
+    'CA': 'CARMEL',
+    'KE': 'KENT',
+    'PA': 'PATTERSON',
+    'PH': 'PHILIPSTOWN',
+    'PV': 'PUTNAM VALLEY',
+    'SE': 'SOUTHEAST'
+    }
+
+# Post office cities found in the call lists of each town.
+TOWN_CITIES = {
+    'CA': ['MAHOPAC', 'MAHOPAC FALLS', 'CARMEL', 'PUTNAM VALLEY', 'BREWSTER'],
+    'KE': ['CARMEL', 'KENT', 'LAKE CARMEL', 'MAHOPAC', 'PUTNAM VALLEY', 'HOLMES'],
+    'PA': ['PATTERSON', 'BREWSTER', 'HOLMES', 'CARMEL', 'PAWLING'],
+    'PH': ['COLD SPRING', 'GARRISON', 'PUTNAM VALLEY', 'HOPEWELL JUNCTION'],
+    'PV': ['PUTNAM VALLEY', 'LAKE PEEKSKILL', 'MAHOPAC', 'CARMEL', 'CORTLANDT MANOR'],
+    'SE': ['BREWSTER', 'CARMEL', 'PATTERSON', 'SOUTHEAST']
+    }
+
+# Post office cities that are not town names; a file named for one (e.g.
+# lake_carmel.txt, in Kent) does not name the town within its name.
+PLACES = sorted(set(c for cities in TOWN_CITIES.values() for c in cities) - set(TOWN_NAMES.values()),
+                key=len, reverse=True)
+
+TOWN_WARD = re.compile(r'(' + '|'.join(TOWN_NAMES) + r')/\d{3}/\d{3}')
+SAMPLE_LINES = 500       # lines read to detect the town of a file from its contents
+
+
+def city_in(cities):
+    "The city_in regex for clean.clean matching any of cities (longest first, so e.g. MAHOPAC FALLS wins)."
+    return ' (' + '|'.join(sorted(cities, key=len, reverse=True)) + ') '
+
+def detect_town(fn):
+    """
+    The town code of the call list in fn: a town code or name in the file name
+    (as whole words, not within the name of one of the PLACES), else the most
+    common code in the first SAMPLE_LINES Town/Ward/Dist fields.
+    None if neither works.
+    """
+    stem = os.path.splitext(os.path.basename(fn))[0].upper()
+    words = ' ' + ' '.join(re.findall(r'[A-Z0-9]+', stem)) + ' '
+    for place in PLACES:
+        words = words.replace(' ' + place + ' ', '  ')
+    for code, name in TOWN_NAMES.items():
+        if ' ' + name + ' ' in words or ' ' + code + ' ' in words:
+            return code
+    seen = Counter()
+    with open(fn) as fp:
+        for i, line in enumerate(fp):
+            if i >= SAMPLE_LINES:
+                break
+            seen.update(TOWN_WARD.findall(line))
+    return seen.most_common(1)[0][0] if seen else None
+
+def _process(fn, town, cities):
+    "Worker: clean one file; returns (records, list of (kind, text) errors)."
+    errors = []
+    records = clean.process_file(fn, town, city_in(cities),
+                                 on_error=lambda kind, text: errors.append((kind, text)))
+    return records, errors
+
+def iter_directory(dirname, pattern='*.txt', workers=None, towns=None,
+                   town_cities=TOWN_CITIES, report=None):
+    """
+    Generator over the records of all the files matching pattern in dirname,
+    file by file in name order (the files are cleaned in parallel), skipping
+    voter ids already seen in an earlier file. towns maps a file name to its
+    town code, for files whose town cannot be detected. report, if given, is
+    filled with a dict per file: town, records, duplicates, errors (list of
+    (kind, text)), and failure (the exception, for files that failed).
+    """
+    towns = towns or {}
+    report = {} if report is None else report
+    seen = set()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for fn in sorted(glob.glob(os.path.join(dirname, pattern))):
+            report[fn] = {'town': None, 'records': 0, 'duplicates': 0, 'errors': [],
+                          'failure': None}
+            try:
+                town = towns.get(os.path.basename(fn)) or detect_town(fn)
+            except (OSError, UnicodeDecodeError) as e:
+                report[fn]['failure'] = e
+                continue
+            report[fn]['town'] = town
+            if town is None:
+                report[fn]['failure'] = ValueError('cannot tell the town of ' + fn)
+                continue
+            if town not in town_cities:
+                report[fn]['failure'] = KeyError('no cities known for town ' + town)
+                continue
+            futures.append((fn, pool.submit(_process, fn, town, town_cities[town])))
+        for fn, f in futures:
+            try:
+                records, errors = f.result()
+            except Exception as e:
+                report[fn]['failure'] = e
+                continue
+            report[fn]['errors'] = errors
+            for r in records:
+                if r.voterid in seen:
+                    report[fn]['duplicates'] += 1
+                    continue
+                seen.add(r.voterid)
+                report[fn]['records'] += 1
+                yield r
+
+def process_directory(dirname, pattern='*.txt', workers=None, towns=None,
+                      town_cities=TOWN_CITIES):
+    "(records, report) for all the files in dirname; see iter_directory."
+    report = {}
+    records = list(iter_directory(dirname, pattern, workers, towns, town_cities, report))
+    return records, report
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Turnout and voting frequency by cohort.
+
+A CohortStats groups voters by any combination of the DIMENSIONS (affiliation,
+town, ward, dist, assembly_dist, school_dist, age band from dob, registration
+year band from reg_date), and in one pass over them sums what is needed for
+every measure, per cohort:
+
+    voters       number of voters
+    voted        share with at least one vote on record
+    avg_votes    votes on record per voter
+    frequency    Dwight's measure (comments_from_dwight.txt): votes on record /
+                 years since registration (at least MIN_YEARS), averaged over
+                 the voters with a valid reg_date
+    efficiency   votes / elections held since the first vote on record, as in
+                 voter_reader.voting_efficiency (and HistoryMatrix.efficiency)
+    turnout_XXyy share of the voters who voted in election XXyy
+
+The sums of two CohortStats over different voters merge into the sums over
+all of them, so a sharded export is summarised by workers in parallel
+(cohort_stats_parallel, over parallel_reader.map_voters) and merged. rows()
+gives the result as a tidy table, one dict per cohort, for write_csv/write_json.
+
+    stats = CohortStats(('affiliation', 'age'), as_of=date(2017, 6, 1))
+    stats.add_all(iter_voters('putnam.csv'))
+    stats.rows(elections=['GE16', 'PE17'])
+
+    python cohorts.py putnam.csv --by town,affiliation --as-of 2017-06-01 -o cohorts.csv
+"""
+import sys
+import csv
+import json
+import argparse
+import functools
+from bisect import bisect_right
+from datetime import date
+from voter_reader import voters_of, iter_voters
+from history_matrix import full_year, history_codes_of
+from extractor import age_on
+from parallel_reader import map_voters
+
+AGE_BANDS = [18, 25, 35, 45, 55, 65, 75]
+REG_YEAR_BAND = 5                # years per registration year band
+MIN_YEARS = 1.0                  # years since registration, at least, for frequency
+UNKNOWN = ''
+
+
+def _valid_date(d):
+    return type(d) is dict and d['year'] > 0 and 1 <= d['month'] <= 12 and 1 <= d['day'] <= 31
+
+def age_band(v, as_of):
+    "The age band ('18-24', ..., '75+') of a Voter on as_of; UNKNOWN without a valid dob."
+    if not _valid_date(v.dob):
+        return UNKNOWN
+    age = age_on(v.dob, as_of)
+    i = bisect_right(AGE_BANDS, age)
+    if i == 0:
+        return '<{}'.format(AGE_BANDS[0])
+    if i == len(AGE_BANDS):
+        return '{}+'.format(AGE_BANDS[-1])
+    return '{}-{}'.format(AGE_BANDS[i - 1], AGE_BANDS[i] - 1)
+
+def reg_year_band(v, as_of):
+    "The registration years band (e.g. '2010-2014') of a Voter; UNKNOWN without a valid reg_date."
+    if not _valid_date(v.reg_date):
+        return UNKNOWN
+    y = v.reg_date['year']
+    start = y - y % REG_YEAR_BAND
+    return '{}-{}'.format(start, start + REG_YEAR_BAND - 1)
+
+def _attribute(name):
+    return lambda v, as_of: getattr(v, name)
+
+DIMENSIONS = {
+    'affiliation': _attribute('affiliation'),
+    'town': _attribute('town'),
+    'ward': _attribute('ward'),
+    'dist': _attribute('dist'),
+    'assembly_dist': _attribute('assembly_dist'),
+    'school_dist': _attribute('school_dist'),
+    'age': age_band,
+    'reg_year': reg_year_band,
+    }
+
+def years_registered(v, as_of):
+    "Years from a Voter's reg_date to as_of (None without a valid reg_date, or if after as_of)."
+    if not _valid_date(v.reg_date):
+        return None
+    r = v.reg_date
+    try:
+        days = (as_of - date(r['year'], r['month'], r['day'])).days
+    except ValueError:
+        return None
+    return days / 365.25 if days >= 0 else None
+
+
+# Per cohort sums, in a list: number of voters, voters with a vote, votes,
+# voters with a valid reg_date, sum of their frequencies, {election code: voters
+# who voted in it}, {year of first vote: votes of voters who first voted then}.
+N, VOTED, VOTES, N_REG, FREQUENCY, BY_ELECTION, BY_FIRST_YEAR = range(7)
+
+
+class CohortStats:
+    """
+    Sums over voters per cohort: by names the DIMENSIONS making up a cohort
+    (every combination of their values seen is a cohort); ages and years since
+    registration are taken on as_of (by default today).
+    """
+    def __init__(self, by, as_of=None):
+        for d in by:
+            if d not in DIMENSIONS:
+                raise ValueError('no dimension {} (one of {})'.format(d, ', '.join(DIMENSIONS)))
+        self.by = tuple(by)
+        self.as_of = as_of or date.today()
+        self.cells = {}
+        self.elections = {}              # election code -> (year, type)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __repr__(self):
+        return "<CohortStats by {} {} cohorts, {} voters>".format(
+            ','.join(self.by), len(self), sum(c[N] for c in self.cells.values()))
+
+    def add_all(self, voters):
+        "Add Voters (or the tuples of iter_voters(...)); returns self."
+        keys = [DIMENSIONS[d] for d in self.by]
+        as_of = self.as_of
+        this_year = as_of.year
+        elections = self.elections
+        cells = self.cells
+        for v in voters_of(voters):
+            key = tuple(k(v, as_of) for k in keys)
+            cell = cells.get(key)
+            if cell is None:
+                cell = cells[key] = [0, 0, 0, 0, 0.0, {}, {}]
+            codes = set()
+            first = None
+            for c in history_codes_of(v):
+                e = elections.get(c)
+                if e is None:
+                    if not c[2:].isdecimal():
+                        continue         # as HistoryMatrix, codes without a year are dropped
+                    e = elections[c] = (full_year(int(c[2:]), this_year), c[:2])
+                codes.add(c)
+                if first is None or e[0] < first:
+                    first = e[0]
+            n = len(codes)
+            cell[N] += 1
+            if n:
+                cell[VOTED] += 1
+                cell[VOTES] += n
+                for c in codes:
+                    cell[BY_ELECTION][c] = cell[BY_ELECTION].get(c, 0) + 1
+                cell[BY_FIRST_YEAR][first] = cell[BY_FIRST_YEAR].get(first, 0) + n
+            years = years_registered(v, as_of)
+            if years is not None:
+                cell[N_REG] += 1
+                cell[FREQUENCY] += n / max(years, MIN_YEARS)
+        return self
+
+    def merge(self, other):
+        "Add the sums of other (over the same dimensions and as_of) to these; returns self."
+        if other.by != self.by or other.as_of != self.as_of:
+            raise ValueError('cannot merge {!r} into {!r}'.format(other, self))
+        self.elections.update(other.elections)
+        for key, o in other.cells.items():
+            cell = self.cells.get(key)
+            if cell is None:
+                self.cells[key] = [o[N], o[VOTED], o[VOTES], o[N_REG], o[FREQUENCY],
+                                   dict(o[BY_ELECTION]), dict(o[BY_FIRST_YEAR])]
+                continue
+            for i in (N, VOTED, VOTES, N_REG, FREQUENCY):
+                cell[i] += o[i]
+            for i in (BY_ELECTION, BY_FIRST_YEAR):
+                for k, x in o[i].items():
+                    cell[i][k] = cell[i].get(k, 0) + x
+        return self
+
+    def elections_since(self):
+        "Dict mapping each year of a first vote to the number of elections held from it up to as_of."
+        years = sorted(y for y, t in set(self.elections.values()) if y <= self.as_of.year)
+        firsts = set(y for cell in self.cells.values() for y in cell[BY_FIRST_YEAR])
+        return {y: len(years) - bisect_right(years, y - 1) for y in firsts}
+
+    def latest_general(self):
+        "Code of the latest general election on record (e.g. 'GE16'), or None."
+        ges = [(e, c) for c, e in self.elections.items() if e[1] == 'GE' and e[0] <= self.as_of.year]
+        return max(ges)[1] if ges else None
+
+    def rows(self, elections=None, digits=4):
+        """
+        The tidy table: a dict per cohort (sorted), with a column per dimension
+        and the measures of the module doc. turnout columns are given for the
+        election codes elections (by default the latest general election).
+        """
+        if elections is None:
+            elections = [e for e in [self.latest_general()] if e]
+        held = self.elections_since()
+        table = []
+        for key in sorted(self.cells):
+            n, voted, votes, n_reg, frequency, by_election, by_first = self.cells[key]
+            row = dict(zip(self.by, key))
+            row['voters'] = n
+            row['voted'] = round(voted / n, digits)
+            row['avg_votes'] = round(votes / n, digits)
+            row['frequency'] = round(frequency / n_reg, digits) if n_reg else None
+            row['efficiency'] = round(sum(x / held[y] for y, x in by_first.items() if held[y]) / n, digits)
+            for e in elections:
+                row['turnout_' + e] = round(by_election.get(e, 0) / n, digits)
+            table.append(row)
+        return table
+
+    def write_csv(self, fp, elections=None):
+        "Write rows(elections) to the file object fp, as csv with a header."
+        table = self.rows(elections)
+        if not table:
+            return
+        writer = csv.DictWriter(fp, fieldnames=list(table[0]), lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(table)
+
+    def write_json(self, fp, elections=None):
+        "Write rows(elections) to the file object fp, as a json list."
+        json.dump(self.rows(elections), fp, indent=1)
+
+
+def _chunk_stats(by, as_of, items):
+    return CohortStats(by, as_of).add_all(items)
+
+def cohort_stats(fn, by, as_of=None):
+    "The CohortStats of the export fn."
+    return CohortStats(by, as_of).add_all(iter_voters(fn))
+
+def cohort_stats_parallel(fn, by, as_of=None, workers=None):
+    "As cohort_stats(fn, by, as_of), with the chunks of fn summarised by workers processes and merged."
+    stats = CohortStats(by, as_of)
+    task = functools.partial(_chunk_stats, stats.by, stats.as_of)
+    for first, part in map_voters(fn, task, workers, ordered=False):
+        stats.merge(part)
+    return stats
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Turnout and voting frequency by cohort.')
+    p.add_argument('export', help='BoE export (csv)')
+    p.add_argument('--by', default='affiliation',
+                   help='comma separated dimensions, of: ' + ', '.join(DIMENSIONS))
+    p.add_argument('--as-of', type=date.fromisoformat, default=None,
+                   help='date (YYYY-MM-DD) ages and years registered are taken on (default today)')
+    p.add_argument('--elections', default=None, help='comma separated codes to give turnout in, e.g. GE16,PE17')
+    p.add_argument('--workers', type=int, default=None, help='worker processes (default: this one only)')
+    p.add_argument('-o', '--output', default=None, help='output file, .csv or .json (default: csv to stdout)')
+    args = p.parse_args(argv)
+    by = args.by.split(',')
+    elections = args.elections.split(',') if args.elections else None
+    if args.workers:
+        stats = cohort_stats_parallel(args.export, by, args.as_of, args.workers)
+    else:
+        stats = cohort_stats(args.export, by, args.as_of)
+    if args.output is None:
+        stats.write_csv(sys.stdout, elections)
+        return
+    with open(args.output, 'w', newline='') as fp:
+        if args.output.endswith('.json'):
+            stats.write_json(fp, elections)
+        else:
+            stats.write_csv(fp, elections)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Named, dated comments on voters, from many canvassers at once.
+
+Comments are kept in a directory as an append-only log. Every writer (a process,
+or a CommentLog in it) appends to segment files of its own, named
+<writer>-<seq>.log, one json object per line, so writers never contend for a
+lock or a file. Appends are buffered and written with one write and one fsync
+per batch (batch_size comments, or max_delay seconds, whichever comes first);
+a background thread of each log makes sure of the max_delay.
+
+The in-memory index (comments by voter_id, and by town, town/ward and
+town/ward/dist in time order) is rebuilt at startup by replaying the latest
+snapshot and then the segments from the offsets it records; refresh() picks up
+what other writers have appended since, and any newer snapshot. compact() writes
+a new snapshot and deletes the segments it makes redundant, so startup stays
+quick however long the history.
+
+    log = CommentLog('comments/', author='dwight')
+    log.add('NY000000000123', 'Supports the library bond', district=('CA', '001', '004'))
+    log.for_voter('NY000000000123')
+    log.district_since('CA', '001', since='2017-09-01')
+    log.close()
+"""
+import os
+import re
+import json
+import time
+import socket
+import threading
+from bisect import insort, bisect_left
+from datetime import datetime, date, timezone
+
+SNAPSHOT = 'snapshot.json'
+SEGMENT = re.compile(r'^(.+)-(\d{6})\.log$')
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_MAX_DELAY = 1.0            # seconds an added comment may wait for its fsync
+MAX_SEGMENT_BYTES = 64 * 1024**2
+_clock = time.monotonic
+
+
+def now():
+    "The current UTC time, as the ISO string comments are dated with (these sort by time)."
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+def time_key(t):
+    "An ISO string (as from now()) for a date, datetime or string t, for comparisons."
+    if isinstance(t, datetime):
+        return t.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    if isinstance(t, date):
+        return t.isoformat()
+    return t
+
+
+class Comment:
+    "A comment by author on voter_id at time, with the voter's (town, ward, dist) if known."
+    __slots__ = ('id', 'voter_id', 'author', 'time', 'text', 'district')
+
+    def __init__(self, id, voter_id, author, time, text, district=None):
+        self.id = id
+        self.voter_id = voter_id
+        self.author = author
+        self.time = time
+        self.text = text
+        self.district = None if district is None else tuple(district)
+
+    def to_dict(self):
+        return {'id': self.id, 'voter_id': self.voter_id, 'author': self.author,
+                'time': self.time, 'text': self.text, 'district': self.district}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['id'], d['voter_id'], d['author'], d['time'], d['text'], d.get('district'))
+
+    def __repr__(self):
+        return "<Comment {} by {} on ...{}: {!r}>".format(self.time[:10], self.author,
+                                                        self.voter_id[-4:], self.text[:30])
+
+
+def segment_name(writer, seq):
+    return '{}-{:06d}.log'.format(writer, seq)
+
+def _identity(st):
+    "What tells one snapshot file from the next (each is written anew and renamed into place)."
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+class CommentLog:
+    """
+    The comments in dirname. author is the default author of added comments;
+    writer names this log's segments (by default unique to host, process and
+    log).
+    """
+    def __init__(self, dirname, author=None, writer=None, batch_size=DEFAULT_BATCH_SIZE,
+                 max_delay=DEFAULT_MAX_DELAY, max_segment_bytes=MAX_SEGMENT_BYTES):
+        os.makedirs(dirname, exist_ok=True)
+        self.dirname = dirname
+        self.author = author
+        self.writer = writer or '{}.{}.{}'.format(socket.gethostname(), os.getpid(), id(self) % 100000)
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_segment_bytes = max_segment_bytes
+        self.by_voter = {}
+        self.by_district = {}            # (town,), (town, ward), (town, ward, dist) -> comments by time
+        self.ids = set()
+        self.offsets = {}                # segment -> bytes replayed
+        self._snapshot_id = None         # (inode, mtime, size) of the snapshot read
+        self._lock = threading.Lock()           # the index and the buffer
+        self._write_lock = threading.Lock()     # the segment being written
+        self._due = threading.Condition(self._lock)
+        self._closed = False
+        self._buffer = []
+        self._first_buffered = None
+        self._session = '{:x}'.format(time.time_ns())  # comment ids stay unique if writer is reused
+        self._seq = 0
+        self._fd = None
+        self._size = 0
+        self.refresh()
+        self._flusher = threading.Thread(target=self._flush_when_due, daemon=True,
+                                         name='flusher ' + self.writer)
+        self._flusher.start()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __repr__(self):
+        return "<CommentLog {} comments in {}>".format(len(self), self.dirname)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # index
+
+    def _index(self, c):
+        if c.id in self.ids:
+            return
+        self.ids.add(c.id)
+        self.by_voter.setdefault(c.voter_id, []).append(c)
+        if c.district is not None:
+            for n in (1, 2, 3):
+                insort(self.by_district.setdefault(c.district[:n], []), c, key=lambda x: x.time)
+
+    def _segments(self):
+        "The segment files of the directory, oldest sequence number first per writer."
+        found = []
+        for fn in os.listdir(self.dirname):
+            m = SEGMENT.match(fn)
+            if m:
+                found.append((m[1], int(m[2]), fn))
+        return [fn for w, s, fn in sorted(found)]
+
+    def _read_snapshot(self):
+        """
+        Index the comments of the snapshot, if it is not the one last read (a
+        compaction elsewhere wrote a new one), merging them by id; segment
+        offsets move up to those it records.
+        """
+        path = os.path.join(self.dirname, SNAPSHOT)
+        try:
+            if _identity(os.stat(path)) == self._snapshot_id:
+                return
+            with open(path) as fp:
+                identity = _identity(os.fstat(fp.fileno()))
+                snap = json.load(fp)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            for d in snap['comments']:
+                self._index(Comment.from_dict(d))
+            for fn, n in snap['offsets'].items():
+                if n > self.offsets.get(fn, 0):
+                    self.offsets[fn] = n
+            self._snapshot_id = identity
+
+    def refresh(self):
+        """
+        Read what has been appended to the segments since they were last read,
+        and the comments of segments compacted away since into a new snapshot;
+        returns the number of comments read.
+        """
+        n = len(self)
+        segments = self._segments()
+        # A compaction writes its snapshot before deleting segments, so one that
+        # deleted segments before they were listed has written it by now.
+        self._read_snapshot()
+        for fn in segments:
+            start = self.offsets.get(fn, 0)
+            try:
+                with open(os.path.join(self.dirname, fn), 'rb') as fp:
+                    fp.seek(start)
+                    data = fp.read()
+            except FileNotFoundError:            # compacted away since listed
+                self._read_snapshot()
+                with self._lock:
+                    self.offsets.pop(fn, None)
+                continue
+            end = data.rfind(b'\n') + 1          # a batch being written may be incomplete
+            with self._lock:
+                for line in data[:end].splitlines():
+                    if line:
+                        self._index(Comment.from_dict(json.loads(line)))
+                self.offsets[fn] = start + end
+        with self._lock:
+            for fn in set(self.offsets) - set(segments):     # compacted before listed
+                del self.offsets[fn]
+        return len(self) - n
+
+    # writing
+
+    def add(self, voter_id, text, author=None, district=None, when=None, flush=True):
+        """
+        Add a comment (dated now, unless when is given) and return it. It is in
+        the index at once, and on disk within max_delay. If flush, a full batch
+        is written (and fsynced) here; else add only buffers, and leaves the
+        writing to the background thread (e.g. when called from an event loop).
+        """
+        with self._lock:
+            self._seq += 1
+            c = Comment('{}:{}:{}'.format(self.writer, self._session, self._seq), voter_id, author or self.author,
+                        now() if when is None else time_key(when), text, district)
+            self._index(c)
+            self._buffer.append(json.dumps(c.to_dict(), ensure_ascii=False))
+            if self._first_buffered is None:
+                self._first_buffered = _clock()
+                self._due.notify()
+            full = len(self._buffer) >= self.batch_size
+            if full and not flush:
+                self._due.notify()
+        if full and flush:
+            self.flush()
+        return c
+
+    def flush(self):
+        "Write and fsync the buffered comments."
+        with self._write_lock:
+            with self._lock:
+                if not self._buffer:
+                    return
+                data = ('\n'.join(self._buffer) + '\n').encode('utf-8')
+                self._buffer = []
+                self._first_buffered = None
+            # Adds carry on into a new buffer while this batch is written.
+            if self._fd is None or self._size >= self.max_segment_bytes:
+                self._open_segment()
+            os.write(self._fd, data)
+            os.fsync(self._fd)
+            self._size += len(data)
+
+    def _flush_when_due(self):
+        "The background thread: flush once a batch is full or its first comment is max_delay old."
+        while True:
+            with self._lock:
+                while not self._closed:
+                    if self._first_buffered is None:
+                        self._due.wait()
+                        continue
+                    wait = self._first_buffered + self.max_delay - _clock()
+                    if wait <= 0 or len(self._buffer) >= self.batch_size:
+                        break
+                    self._due.wait(wait)
+                if self._closed:
+                    return
+            self.flush()
+
+    def _open_segment(self):
+        "Start a new segment, after the last one of this writer."
+        if self._fd is not None:
+            os.close(self._fd)
+        seqs = [int(SEGMENT.match(fn)[2]) for fn in self._segments()
+                if SEGMENT.match(fn)[1] == self.writer]
+        name = segment_name(self.writer, max(seqs, default=0) + 1)
+        self._fd = os.open(os.path.join(self.dirname, name),
+                           os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._size = 0
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._due.notify()
+        if self._flusher is not threading.current_thread():
+            self._flusher.join()
+        self.flush()
+        with self._write_lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+    # queries
+
+    def for_voter(self, voter_id):
+        "The comments on voter_id, in the order they were read or added."
+        return list(self.by_voter.get(voter_id, []))
+
+    def district_since(self, town, ward=None, dist=None, since=None, until=None):
+        """
+        The comments on voters in town (or its ward, or its ward and election
+        district) dated at or after since and before until (dates, datetimes or
+        ISO strings), in time order.
+        """
+        key = (town,) if ward is None else (town, ward) if dist is None else (town, ward, dist)
+        cs = self.by_district.get(key, [])
+        lo = 0 if since is None else bisect_left(cs, time_key(since), key=lambda c: c.time)
+        hi = len(cs) if until is None else bisect_left(cs, time_key(until), key=lambda c: c.time)
+        return cs[lo:hi]
+
+    # compaction
+
+    def compact(self):
+        """
+        Write a snapshot of all the comments read so far, and delete the
+        segments it covers entirely that no writer will append to again (those
+        followed by a later segment of the same writer). Run it from one
+        process at a time (e.g. a nightly job); writers may keep writing.
+        Returns the number of segments deleted.
+        """
+        self.flush()
+        self.refresh()
+        with self._lock:
+            segments = self._segments()
+            latest = {}
+            for fn in segments:
+                m = SEGMENT.match(fn)
+                latest[m[1]] = fn
+            sealed = [fn for fn in segments if latest[SEGMENT.match(fn)[1]] != fn and
+                      self.offsets.get(fn) == os.path.getsize(os.path.join(self.dirname, fn))]
+            offsets = {fn: n for fn, n in self.offsets.items() if fn not in sealed and fn in segments}
+            comments = sorted((c for cs in self.by_voter.values() for c in cs), key=lambda c: c.time)
+            snapshot = {'offsets': offsets, 'comments': [c.to_dict() for c in comments]}
+        path = os.path.join(self.dirname, SNAPSHOT)
+        tmp = path + '.' + self.writer + '.tmp'
+        with open(tmp, 'w') as fp:
+            json.dump(snapshot, fp, ensure_ascii=False)
+            fp.flush()
+            os.fsync(fp.fileno())
+        os.replace(tmp, path)
+        self._snapshot_id = _identity(os.stat(path))
+        for fn in sealed:
+            os.remove(os.path.join(self.dirname, fn))
+            self.offsets.pop(fn, None)
+        return len(sealed)
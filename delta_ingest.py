@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Incremental ingest of successive BoE exports.
+
+Each export mostly repeats the previous one. A Snapshot remembers, per voter_id,
+the Voter and a fingerprint of its raw row. Ingesting the next export only csv
+decodes and fingerprints every row; rows whose fingerprint is unchanged are not
+parsed or validated again. The result is a Changeset of added, removed and
+modified voters (with field level diffs), which TurnoutAggregates uses to keep
+the election sets and efficiency scores current without a full recomputation.
+
+    snap = Snapshot.from_file('july.csv')
+    agg = TurnoutAggregates(snap.voters.values(), this_year=2017)
+    changes = snap.ingest('august.csv')
+    agg.apply(changes)
+"""
+import csv
+import hashlib
+from collections import Counter
+from voter_reader import Voter, fields_of, float2
+from voter_table import pack_row
+from history_matrix import full_year, history_codes_of
+
+DATE_KEYS = {'year', 'month', 'day'}
+
+
+def fingerprint(row):
+    "A digest of the contents of a raw row, packed by voter_table.pack_row so that no two rows collide."
+    return hashlib.blake2b(pack_row(row).encode('utf-8'), digest_size=16).digest()
+
+def iter_rows(fn):
+    "The raw rows of fn, read as iter_voters reads them."
+    with open(fn, newline='') as csvfile:
+        yield from csv.reader(csvfile, delimiter=',', quotechar='|')
+
+def field_diffs(old, new, path=''):
+    """
+    List of (field, old value, new value) for the fields in which the Voters (or
+    field dicts) old and new differ; nested fields are named e.g. 'address.zip'.
+    """
+    a = old if type(old) is dict else fields_of(old)
+    b = new if type(new) is dict else fields_of(new)
+    diffs = []
+    for k in list(a) + [k for k in b if k not in a]:
+        if k == 'deviations':
+            continue
+        x, y = a.get(k), b.get(k)
+        if x == y:
+            continue
+        if type(x) is dict and type(y) is dict and set(x) != DATE_KEYS:
+            diffs.extend(field_diffs(x, y, path + k + '.'))
+        else:
+            diffs.append((path + k, x, y))
+    return diffs
+
+
+class Changeset:
+    """
+    The differences between two exports: added and removed are lists of Voters,
+    modified a list of (old Voter, new Voter, field_diffs(old, new)).
+    """
+    def __init__(self):
+        self.added = []
+        self.removed = []
+        self.modified = []
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.modified)
+
+    def __repr__(self):
+        return "<Changeset added={} removed={} modified={}>".format(
+            len(self.added), len(self.removed), len(self.modified))
+
+    def field_counts(self):
+        "Counter of the number of modified voters per changed field."
+        return Counter(f for old, new, diffs in self.modified for f, x, y in diffs)
+
+
+class Snapshot:
+    "The voters of an export, by voter_id, with the fingerprints of their rows."
+    def __init__(self):
+        self.voters = {}
+        self.fingerprints = {}
+
+    @classmethod
+    def from_file(cls, fn):
+        snap = cls()
+        snap.ingest(fn)
+        return snap
+
+    def __len__(self):
+        return len(self.voters)
+
+    def ingest(self, fn):
+        """
+        Make this snapshot that of the export fn, and return the Changeset from
+        the previous one. Only added and changed rows are parsed.
+        (If a voter_id appears more than once in fn, its last row wins.)
+        """
+        changes = Changeset()
+        voters, fingerprints = {}, {}
+        for row in iter_rows(fn):
+            vid = row[0] if row else ''
+            fp = fingerprint(row)
+            fingerprints[vid] = fp
+            if self.fingerprints.get(vid) == fp:
+                voters[vid] = self.voters[vid]
+                continue
+            voters[vid] = Voter(row)
+        for vid, v in voters.items():
+            old = self.voters.get(vid)
+            if old is None:
+                changes.added.append(v)
+            elif old is not v:
+                diffs = field_diffs(old, v)
+                if diffs:
+                    changes.modified.append((old, v, diffs))
+        changes.removed = [v for vid, v in self.voters.items() if vid not in voters]
+        self.voters, self.fingerprints = voters, fingerprints
+        return changes
+
+
+class TurnoutAggregates:
+    """
+    Elections held (a Counter of voters per (year, type)) and per voter
+    efficiency, as in history_matrix.HistoryMatrix, with the per-party averages,
+    all kept current from Changesets.
+    """
+    def __init__(self, voters, this_year):
+        self.this_year = this_year
+        self.voter_counts = Counter()
+        self.votes = {}                      # voter_id -> set of (year, type)
+        self.affiliation = {}                # voter_id -> affiliation
+        for v in voters:
+            self._add(v)
+        self._recompute()
+
+    def _elections_of(self, v):
+        return set((full_year(int(c[2:]), self.this_year), c[:2])
+                   for c in history_codes_of(v) if c[2:].isdecimal())
+
+    def _add(self, v):
+        self.votes[v.voter_id] = e = self._elections_of(v)
+        self.affiliation[v.voter_id] = v.affiliation
+        self.voter_counts.update(e)
+
+    def _remove(self, v):
+        self.voter_counts.subtract(self.votes.pop(v.voter_id))
+        del self.affiliation[v.voter_id]
+
+    def elections(self):
+        "Dict mapping each year to the set of election types held."
+        x = {}
+        for (y, t), n in self.voter_counts.items():
+            if n > 0:
+                x.setdefault(y, set()).add(t)
+        return x
+
+    def _since_table(self):
+        per_year = Counter(y for (y, t), n in self.voter_counts.items() if n > 0)
+        since, total = {}, 0
+        for y in sorted(per_year, reverse=True):
+            total += per_year[y]
+            since[y] = total
+        return since
+
+    def _efficiency(self, e):
+        if not e:
+            return 0.0
+        return len(e) / self.since[min(y for y, t in e)]
+
+    def _recompute(self):
+        self.held = set(e for e, n in self.voter_counts.items() if n > 0)
+        self.since = self._since_table()
+        self.eff = {vid: self._efficiency(e) for vid, e in self.votes.items()}
+        self.sums = Counter()
+        self.counts = Counter()
+        for vid, x in self.eff.items():
+            self.sums[self.affiliation[vid]] += x
+            self.counts[self.affiliation[vid]] += 1
+
+    def apply(self, changes):
+        """
+        Update from a Changeset. Only the voters in it are rescored, unless the
+        set of elections held changed, which changes every voter's denominator.
+        """
+        touched = changes.added + [new for old, new, d in changes.modified]
+        for v in changes.removed + [old for old, new, d in changes.modified]:
+            vid = v.voter_id
+            self.sums[self.affiliation[vid]] -= self.eff.pop(vid)
+            self.counts[self.affiliation[vid]] -= 1
+            self._remove(v)
+        for v in touched:
+            self._add(v)
+        if set(e for e, n in self.voter_counts.items() if n > 0) != self.held:
+            self._recompute()
+            return
+        for v in touched:
+            vid = v.voter_id
+            self.eff[vid] = x = self._efficiency(self.votes[vid])
+            self.sums[self.affiliation[vid]] += x
+            self.counts[self.affiliation[vid]] += 1
+
+    def avg_efficiency_by_party(self, parties=['DEM', 'REP', 'BLK']):
+        return [(x, float2(self.sums[x] / self.counts[x])) for x in parties if self.counts[x] > 0]
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+County-wide store of the deviations found while parsing an export.
+
+Rather than a set of tuples per Voter, a DeviationLog keeps three parallel
+columns, one entry per deviation: the row index, a small integer code for the
+(kind, field) of the deviation (e.g. ('length error', 'height')), and an integer
+id for the rest of the tuple (the offending value, with the size or pattern it
+failed), interned so that a value repeated across the county is stored once.
+Aggregate queries are numpy operations over the columns, and the deviations of
+any one row are found by bisection, since rows are logged in order.
+
+    log = DeviationLog()
+    for ind, v, dev in log.collect(iter_voters('putnam.csv'), detach=True):
+        ...
+    log.counts()                             # Counter of (kind, field)
+    log.top_values(field='height')
+    log.for_row(1234)                        # as v.deviations was
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+import numpy as np
+from voter_reader import NO_DEVIATIONS
+
+
+def offending_value(rest):
+    "The offending value in the tail of a deviation tuple: its last string."
+    for x in reversed(rest):
+        if type(x) is str:
+            return x
+    return None
+
+
+class DeviationLog:
+    """
+    rows[i], codes[i], values[i] describe deviation i: kinds[codes[i]] is its
+    (kind, field), tails[values[i]] the rest of its tuple.
+    """
+    def __init__(self):
+        self.kinds = []                  # code -> (kind, field)
+        self.kind_codes = {}
+        self.tails = []                  # value id -> rest of the tuple
+        self.tail_ids = {}
+        self.rows = array('q')
+        self.codes = array('H')
+        self.values = array('q')
+        self.num_rows = 0                # rows logged, with or without deviations
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __repr__(self):
+        return "<DeviationLog {} deviations in {} rows>".format(len(self), self.num_rows)
+
+    def _code(self, kind, field):
+        c = self.kind_codes.get((kind, field))
+        if c is None:
+            c = self.kind_codes[(kind, field)] = len(self.kinds)
+            self.kinds.append((kind, field))
+        return c
+
+    def _value(self, rest):
+        i = self.tail_ids.get(rest)
+        if i is None:
+            i = self.tail_ids[rest] = len(self.tails)
+            self.tails.append(rest)
+        return i
+
+    def add(self, row, devs):
+        "Log the deviations devs of row (row indexes must not decrease)."
+        if self.rows and row < self.rows[-1]:
+            raise ValueError('rows must be logged in order')
+        self.num_rows = max(self.num_rows, row + 1)
+        for d in sorted(devs, key=repr):
+            self.rows.append(row)
+            self.codes.append(self._code(d[0], d[1]))
+            self.values.append(self._value(tuple(d[2:])))
+
+    def collect(self, items, detach=False):
+        """
+        Generator passing through a stream of (index, voter, deviations[, row])
+        tuples (from iter_voters, or iter_voters_parallel(ordered=True)), logging
+        the deviations. If detach is set, each voter's deviations are replaced by
+        NO_DEVIATIONS, leaving the log the only copy (see for_row).
+        """
+        for item in items:
+            ind, v, dev = item[:3]
+            if dev:
+                self.add(ind, dev)
+                if detach:
+                    v.deviations = NO_DEVIATIONS
+            self.num_rows = max(self.num_rows, ind + 1)
+            yield item
+
+    @classmethod
+    def from_voters(cls, voters):
+        "The log of a list of Voters (row i being voters[i])."
+        log = cls()
+        for i, v in enumerate(voters):
+            if v.deviations:
+                log.add(i, v.deviations)
+        log.num_rows = len(voters)
+        return log
+
+    def _columns(self):
+        return (np.frombuffer(self.rows, dtype=np.int64), np.frombuffer(self.codes, dtype=np.uint16),
+                np.frombuffer(self.values, dtype=np.int64))
+
+    def _mask(self, kind=None, field=None):
+        "Boolean mask of the deviations of kind and/or in field (None for any)."
+        codes = self._columns()[1]
+        wanted = np.array([(kind is None or k == kind) and (field is None or f == field)
+                           for k, f in self.kinds], dtype=bool)
+        return wanted[codes] if len(codes) else np.zeros(0, dtype=bool)
+
+    def for_row(self, row):
+        "The deviations of row, as the set the Voter's deviations would hold."
+        lo = bisect_left(self.rows, row)
+        hi = bisect_right(self.rows, row, lo)
+        if lo == hi:
+            return NO_DEVIATIONS
+        return set(self.kinds[self.codes[i]] + self.tails[self.values[i]] for i in range(lo, hi))
+
+    def counts(self, by='kind_field'):
+        "Counter of deviations by (kind, field), or by 'kind' or 'field' alone."
+        n = np.bincount(self._columns()[1], minlength=len(self.kinds))
+        c = Counter()
+        for (kind, field), k in zip(self.kinds, n.tolist()):
+            key = (kind, field) if by == 'kind_field' else kind if by == 'kind' else field
+            if k:
+                c[key] += k
+        return c
+
+    def rows_with(self, kind=None, field=None):
+        "Sorted array of the rows having a deviation of kind and/or in field."
+        rows = self._columns()[0]
+        return np.unique(rows[self._mask(kind, field)])
+
+    def sample_rows(self, kind=None, field=None, n=10, seed=None):
+        "Up to n rows having a deviation of kind and/or in field; the first n, or a random n given seed."
+        rows = self.rows_with(kind, field)
+        if seed is None or len(rows) <= n:
+            return rows[:n].tolist()
+        return sorted(np.random.RandomState(seed).choice(rows, n, replace=False).tolist())
+
+    def top_values(self, kind=None, field=None, n=10):
+        "The n most common (offending value, count) among deviations of kind and/or in field."
+        values = self._columns()[2][self._mask(kind, field)]
+        c = Counter()
+        ids, counts = np.unique(values, return_counts=True)
+        for i, k in zip(ids.tolist(), counts.tolist()):
+            c[offending_value(self.tails[i])] += k
+        return c.most_common(n)
+
+    def nbytes(self):
+        "Memory held by the columns (not counting the interned tuples)."
+        return (self.rows.itemsize * len(self.rows) + self.codes.itemsize * len(self.codes) +
+                self.values.itemsize * len(self.values))
@@ -4,45 +4,174 @@
 (c) Vijay Saraswat 2017
 All rights reserved
 """
+import io
+import os
 import re
 import csv
-import json
-from pprint import pprint
-from json import JSONEncoder
+import hashlib
+from datetime import date
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from voter_reader import voters_of
 
 
-THIS_YEAR=2017
-def extract_fb_info(records):
+FIELDNAMES = ['phone','fn', 'ln', 'zip','ct','st','country','dob','doby','gen','age']
+
+def age_on(dob, today):
+    "Age in whole years on the date today of someone born on dob ({'year','month','day'})."
+    return today.year - dob['year'] - ((today.month, today.day) < (dob['month'], dob['day']))
+
+def extract_fb_info(records, today=None):
+    "List form of iter_fb_info(records, today)."
+    return list(iter_fb_info(records, today))
+
+def iter_fb_info(records, today=None):
     """
-    records is a list of Voter records, pre-selected according to some criteria.
+    records is a list (or stream, e.g. from iter_voters(...)) of Voter records, 
+    pre-selected according to some criteria.
     Convert to the list of col names that FB expects in its input csv.
          phone,fn,ln,zip,ct,st,country,dob,doby,gen,age
     (The fields we can populate are:
        email,email,email,phone,phone,phone,madid,fn,ln,zip,ct,st,country,dob,doby,gen,age,uid
     For the formats for these fields, see https://www.facebook.com/business/help/606443329504150
     )
+    Ages are as of the date today (by default, the current date).
     """
-    result = [
-        {
+    today = today or date.today()
+    for r in voters_of(records):
+        yield {
             'phone': '' if r.tel_number == '' or r.tel_number == None else '1-('+ r.area_code+')-'+r.tel_number,
             'fn': r.name['first_name'], 'ln': r.name['last_name'],
             'zip': r.address['zip'], 'ct': r.address['city'], 'st':r.address['state'], 'country':'US',
             'dob': str(r.dob['month']) + '/' + str(r.dob['day']) + '/' + str(r.dob['year'])[2:4],
             'doby': r.dob['year'],
             'gen': r.sex,
-            'age': THIS_YEAR-r.dob['year']
+            'age': age_on(r.dob, today)
         }
-        for r in records
-        ]
-    return result
 
 def write_fb(fn, results):
     "Write out results into fn."
     with open(fn, 'w') as csvfile:
-        fieldnames = ['phone','fn', 'ln', 'zip','ct','st','country','dob','doby','gen','age']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+        writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
         writer.writeheader()
         for result in results:
             writer.writerow(result)
 
-    
+
+# Hashed audience export. The ad platform matches on SHA-256 hashes of
+# normalized identifiers (https://www.facebook.com/business/help/606443329504150):
+# lower case, no punctuation or spaces, phone with country code, 5 digit zip,
+# dob as YYYYMMDD. country is hashed too; age is sent in the clear.
+
+NON_ALNUM = re.compile(r'[\W_]+')
+NON_DIGIT = re.compile(r'\D+')
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_MAX_BYTES = 100 * 1024**2           # per output file
+
+def normalize_audience(r, today):
+    "The normalized (unhashed) FIELDNAMES values for the Voter r."
+    tel = NON_DIGIT.sub('', r.tel_number or '')
+    area = NON_DIGIT.sub('', r.area_code or '')
+    dob = r.dob if type(r.dob) is dict else None
+    return ['1' + area + tel if len(area) == 3 and len(tel) == 7 else '',
+            NON_ALNUM.sub('', r.name['first_name'].lower()),
+            NON_ALNUM.sub('', r.name['last_name'].lower()),
+            NON_DIGIT.sub('', r.address['zip'])[:5],
+            NON_ALNUM.sub('', r.address['city'].lower()),
+            NON_ALNUM.sub('', r.address['state'].lower())[:2],
+            'us',
+            '{:04d}{:02d}{:02d}'.format(dob['year'], dob['month'], dob['day']) if dob else '',
+            '{:04d}'.format(dob['year']) if dob else '',
+            r.sex.lower() if r.sex in ('M', 'F') else '',
+            str(age_on(dob, today)) if dob else '']
+
+def sha256(s):
+    return hashlib.sha256(s.encode('utf-8')).hexdigest() if s else ''
+
+def hash_batch(rows):
+    "Hash the identifiers (all but age) of a batch of normalized rows."
+    return [[sha256(x) for x in row[:-1]] + row[-1:] for row in rows]
+
+def _batches(items, size):
+    it = iter(items)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+def iter_audience(records, today=None, batch_size=DEFAULT_BATCH_SIZE, workers=None,
+                  hashed=True):
+    """
+    Generator over batches (lists of FIELDNAMES-ordered rows) of the normalized,
+    and if hashed SHA-256 hashed, audience for records (Voters or an
+    iter_voters(...) stream). Batches are normalized here and hashed on a pool
+    of workers processes (by default one per cpu), in order, with a bounded
+    number in flight; with one worker they are hashed here. (hashlib only
+    releases the GIL for inputs of a couple of KB or more, so threads would not
+    hash fields as short as these any faster.)
+    """
+    today = today or date.today()
+    rows = (normalize_audience(r, today) for r in voters_of(records))
+    if not hashed:
+        yield from _batches(rows, batch_size)
+        return
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for batch in _batches(rows, batch_size):
+            yield hash_batch(batch)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        limit = 2 * workers
+        for batch in _batches(rows, batch_size):
+            pending.append(pool.submit(hash_batch, batch))
+            if len(pending) >= limit:
+                yield pending.pop(0).result()
+        for f in pending:
+            yield f.result()
+
+def write_audience(prefix, records, today=None, max_bytes=DEFAULT_MAX_BYTES, **kw):
+    """
+    Write the hashed audience for records to prefix-0001.csv, prefix-0002.csv, ...
+    each with a header and at most max_bytes long (unless a single row is longer).
+    Rows are formatted a batch at a time, and a batch is split across files
+    where it crosses max_bytes. keywords are passed on to iter_audience.
+    Returns the list of files written.
+    """
+    files = []
+    fp = None
+    size = 0
+    header = (','.join(FIELDNAMES) + '\n').encode('utf-8')
+    try:
+        for batch in iter_audience(records, today, **kw):
+            buf = io.StringIO()
+            writer = csv.writer(buf, lineterminator='\n')
+            ends = []
+            for row in batch:
+                writer.writerow(row)
+                ends.append(buf.tell())
+            text = buf.getvalue()
+            lines = [text[i:j].encode('utf-8') for i, j in zip([0] + ends, ends)]
+            start = 0
+            while start < len(lines):
+                if fp is None or size + len(lines[start]) > max_bytes:
+                    if fp is not None:
+                        fp.close()
+                    files.append('{}-{:04d}.csv'.format(prefix, len(files) + 1))
+                    fp = open(files[-1], 'wb')
+                    fp.write(header)
+                    size = len(header) + len(lines[start])
+                    end = start + 1          # a new file takes at least one row
+                else:
+                    end = start
+                while end < len(lines) and size + len(lines[end]) <= max_bytes:
+                    size += len(lines[end])
+                    end += 1
+                fp.write(b''.join(lines[start:end]))
+                start = end
+    finally:
+        if fp is not None:
+            fp.close()
+    return files
+
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Vectorized voting history.
+
+The history_codes of every voter are decoded once into a voters x elections
+boolean matrix (an election being a (year, type) pair, e.g. (2016, 'GE')), with
+columns in chronological order. A per-year table of the number of elections held
+from that year up to the present replaces the year-by-year walk of
+voter_reader.num_elections_since, so efficiency (votes cast / elections held since
+the first vote on record, as in voter_reader.voting_efficiency), ranking and
+per-group averages are each a handful of numpy operations.
+
+History codes carry two-digit years. They are placed in the century that puts
+them at or before this_year (the year of the export; by default the current year),
+so '96' is 1996 and '16' is 2016 -- rather than the fixed 95/18 cut-offs of
+num_elections_since.
+
+    h = HistoryMatrix.from_voters(voters, this_year=2017)
+    h.efficiency()
+    h.avg_efficiency_by([v.affiliation for v in voters])
+"""
+import re
+from datetime import date
+import numpy as np
+from voter_reader import voters_of, float2
+
+CODE = re.compile(r'\w{4}')
+
+
+def full_year(yy, this_year):
+    "The four digit year for the two digit year yy, no later than this_year."
+    y = this_year - this_year % 100 + yy
+    return y if y <= this_year else y - 100
+
+def history_codes_of(v):
+    "The list of 4-char codes (type + yy) in a Voter's history."
+    codes = v.history_codes
+    if type(codes) is str:           # failed validation, kept as the raw string
+        return CODE.findall(codes)
+    return [c['type'] + c['year'] for c in codes]
+
+
+class HistoryMatrix:
+    """
+    votes[i, j] is True if voter i voted in election j. elections[j] is the
+    (year, type) of column j, in chronological order. since[y - first_year] is the
+    number of elections from year y up to this_year.
+    """
+    def __init__(self, votes, elections, this_year):
+        self.votes = votes
+        self.elections = elections
+        self.this_year = this_year
+        self.years = np.array([y for y, t in elections], dtype=np.int32)
+        self.first_year = int(self.years.min()) if len(elections) else this_year
+        per_year = np.bincount(self.years - self.first_year,
+                               minlength=this_year - self.first_year + 1)
+        self.since = np.cumsum(per_year[::-1])[::-1]
+
+    @classmethod
+    def from_voters(cls, voters, this_year=None):
+        "Build from Voters (or an iter_voters(...) stream)."
+        return cls.from_codes((history_codes_of(v) for v in voters_of(voters)), this_year)
+
+    @classmethod
+    def from_rows(cls, rows, this_year=None):
+        "Build from raw csv rows, whose second last entry is the history (cf. generate_all_elections)."
+        return cls.from_codes((CODE.findall(r[-2]) for r in rows), this_year)
+
+    @classmethod
+    def from_codes(cls, histories, this_year=None):
+        "Build from an iterable giving, per voter, the list of its 4-char history codes."
+        this_year = this_year or date.today().year
+        columns = {}                 # code -> provisional column
+        rows, cols = [], []
+        n = 0
+        for n, codes in enumerate(histories, 1):
+            for c in codes:
+                j = columns.get(c)
+                if j is None:
+                    j = columns[c] = len(columns)
+                rows.append(n - 1)
+                cols.append(j)
+        keys = [(full_year(int(c[2:]), this_year), c[:2]) if c[2:].isdecimal() else None
+                for c in columns]
+        elections = sorted(set(k for k in keys if k is not None))
+        position = {e: j for j, e in enumerate(elections)}
+        remap = np.array([position[k] if k is not None else -1 for k in keys], dtype=np.int64)
+        cols = remap[np.array(cols, dtype=np.int64)] if cols else np.zeros(0, dtype=np.int64)
+        rows = np.array(rows, dtype=np.int64)
+        ok = cols >= 0               # codes whose year is not a number are dropped
+        votes = np.zeros((n, len(elections)), dtype=bool)
+        votes[rows[ok], cols[ok]] = True
+        return cls(votes, elections, this_year)
+
+    def __len__(self):
+        return self.votes.shape[0]
+
+    def __repr__(self):
+        return "<HistoryMatrix {} voters x {} elections>".format(*self.votes.shape)
+
+    def elections_by_year(self):
+        "Dict mapping each year to the set of election types held, cf. generate_all_elections."
+        x = {}
+        for y, t in self.elections:
+            x.setdefault(y, set()).add(t)
+        return x
+
+    def elections_since(self, year):
+        "Number of elections from year (four digit) up to this_year."
+        return int(self.since[max(year - self.first_year, 0)]) if year <= self.this_year else 0
+
+    def num_votes(self):
+        return self.votes.sum(axis=1)
+
+    def first_vote_year(self):
+        "Year of each voter's earliest recorded vote (0 for voters with none)."
+        voted = self.votes.any(axis=1)
+        first = np.argmax(self.votes, axis=1) if self.votes.shape[1] else np.zeros(len(self), dtype=np.int64)
+        return np.where(voted, self.years[first] if len(self.years) else 0, 0)
+
+    def efficiency(self, start_years=None):
+        """
+        Votes cast / elections held since start_years (per voter, four digit), by
+        default since the voter's first recorded vote. 0.0 for voters with no votes.
+        """
+        n = self.num_votes()
+        start = self.first_vote_year() if start_years is None else np.asarray(start_years)
+        held = self.since[np.clip(start - self.first_year, 0, len(self.since) - 1)]
+        held = np.where(start > self.this_year, 0, held)
+        return np.divide(n, held, out=np.zeros(len(n), dtype=float), where=(n > 0) & (held > 0))
+
+    def rank_by_efficiency(self, bar=5):
+        "List of (voter index, efficiency) for voters with more than bar votes, best first."
+        eff = self.efficiency()
+        candidates = np.flatnonzero(self.num_votes() > bar)
+        # Ties are broken on the float2 value, by index, as the sorted() in voter_reader does.
+        order = candidates[np.argsort(-np.trunc(100 * eff[candidates]), kind='stable')]
+        return [(int(i), float2(eff[i])) for i in order]
+
+    def avg_efficiency_by(self, groups, eff=None):
+        """
+        Dict mapping each group to the average efficiency of its voters. groups
+        gives the group of every voter: labels (e.g. affiliations), or an integer
+        code array (e.g. a VoterTable column, keyed then by code).
+        """
+        eff = self.efficiency() if eff is None else eff
+        groups = np.asarray(groups)
+        if groups.dtype.kind in 'iu':
+            labels, inverse = np.arange(groups.max() + 1 if len(groups) else 0), groups
+        else:
+            labels, inverse = np.unique(groups, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(labels))
+        sums = np.bincount(inverse, weights=eff, minlength=len(labels))
+        return {l.item(): float2(s / c) for l, s, c in zip(labels, sums, counts) if c > 0}
+
+    def avg_voting_efficiency_by_party(self, affiliations, parties=['DEM', 'REP', 'BLK']):
+        "As voter_reader.avg_voting_efficiency_by_party, in one pass over all parties."
+        avgs = self.avg_efficiency_by(affiliations)
+        return [(x, avgs[x]) for x in parties if x in avgs]
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Households and walk lists, for canvassing.
+
+Each voter's address is normalized once into a key (town, ward, dist, street,
+house number, apartment, zip); voters with the same key are one Household, found
+in a single pass with a dict. Households are ordered for walking: by election
+district, then street, then side of the street (even numbers, then odd), then
+house number and apartment. The sort key is computed once per household, so a
+county is one sort, and district walk lists built separately (e.g. in parallel,
+see walk_lists) merge into county order with heapq.merge.
+
+Works over voter_reader.Voter / LazyVoter records (the BoE export) and
+clean.Voters records (the call lists).
+
+    for h in walk_list(voters):
+        print(h.district, h.address(), h.voters)
+"""
+import re
+import heapq
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+# Usual (USPS) abbreviations of the words in street names.
+STREET_WORDS = {
+    'ROAD': 'RD', 'STREET': 'ST', 'AVENUE': 'AVE', 'AV': 'AVE', 'DRIVE': 'DR', 'LANE': 'LN',
+    'BOULEVARD': 'BLVD', 'COURT': 'CT', 'PLACE': 'PL', 'TERRACE': 'TER', 'HIGHWAY': 'HWY',
+    'CIRCLE': 'CIR', 'PARKWAY': 'PKWY', 'TURNPIKE': 'TPKE', 'EXTENSION': 'EXT', 'HILL': 'HL',
+    'HOLLOW': 'HOLW', 'MOUNT': 'MT', 'SAINT': 'ST', 'TRAIL': 'TRL', 'ROUTE': 'RTE', 'RT': 'RTE',
+    'NORTH': 'N', 'SOUTH': 'S', 'EAST': 'E', 'WEST': 'W'
+    }
+PUNCTUATION = re.compile(r'[^\w\s/]+')
+HOUSE_NUMBER = re.compile(r'^\s*(\d+)(\S*)\s+(.*)$')
+APT_WORDS = re.compile(r'^(APT|APARTMENT|UNIT|STE|SUITE|NO)\s*')
+NO_NUMBER = 1 << 30            # sorts addresses without a house number last on their street
+
+
+def normalize_street(s):
+    "Upper case, no punctuation, usual abbreviations."
+    return ' '.join(STREET_WORDS.get(w, w) for w in PUNCTUATION.sub(' ', s.upper()).split())
+
+def normalize_apt(s):
+    return APT_WORDS.sub('', ' '.join(PUNCTUATION.sub(' ', s.upper()).split()))
+
+def house_number(s):
+    "(number, suffix) of a house number such as '12A'; NO_NUMBER if there is none."
+    m = re.match(r'\s*(\d+)(.*)$', s)
+    return (int(m[1]), m[2].strip().upper()) if m else (NO_NUMBER, s.strip().upper())
+
+def address_key(r):
+    """
+    The household key of a record: ((town, ward, dist), street, number, suffix,
+    apartment, zip), normalized; None if it has no street address.
+    """
+    if hasattr(r, 'voterid'):                # clean.Voters, from a call list
+        m = HOUSE_NUMBER.match(r.address)
+        if m is None:
+            return None
+        number, suffix, street = int(m[1]), m[2].upper(), m[3]
+        apt, zip = '', r.zip.strip()[:5]
+    else:
+        a = r.address
+        if a['street_name'] == '':
+            return None
+        number, suffix = house_number(a['street_number'])
+        if a['half_code']:
+            suffix = (suffix + ' ' + a['half_code']).strip()
+        street, apt, zip = a['street_name'], normalize_apt(a['apt_number']), a['zip']
+    return (district_of(r), normalize_street(street), number, suffix, apt, zip)
+
+def walk_order(key):
+    "Sort key of a household key: district, street, side of the street, number, apartment."
+    district, street, number, suffix, apt, zip = key
+    return (district, street, number % 2, number, suffix, apt, zip)
+
+def district_of(r):
+    "(town, ward, dist) of a record."
+    if hasattr(r, 'voterid'):
+        tw = r.town_ward
+        return (tw['town'], tw['ward'], tw['district'])
+    return (r.town, r.ward, r.dist)
+
+def voter_name(r):
+    return r.name if hasattr(r, 'voterid') else r.get_name()
+
+
+class Household:
+    "The voters at one address."
+    __slots__ = ('key', 'sort_key', 'voters')
+
+    def __init__(self, key, voters):
+        self.key = key
+        self.sort_key = walk_order(key)
+        self.voters = voters
+
+    @property
+    def district(self):
+        return self.key[0]
+
+    def address(self):
+        district, street, number, suffix, apt, zip = self.key
+        s = ('' if number == NO_NUMBER else str(number)) + suffix + ' ' + street
+        return (s + (' APT ' + apt if apt else '')).strip()
+
+    def __len__(self):
+        return len(self.voters)
+
+    def __lt__(self, other):
+        return self.sort_key < other.sort_key
+
+    def __repr__(self):
+        return "<Household {} {}, {} voters>".format('/'.join(self.district), self.address(),
+                                                     len(self.voters))
+
+
+def group_households(records, unaddressed=None):
+    """
+    List of the Households of records, in no particular order. Records without
+    a street address are appended to unaddressed, if given.
+    """
+    groups = defaultdict(list)
+    for r in records:
+        key = address_key(r)
+        if key is None:
+            if unaddressed is not None:
+                unaddressed.append(r)
+            continue
+        groups[key].append(r)
+    return [Household(key, sorted(vs, key=voter_name)) for key, vs in groups.items()]
+
+def walk_list(records, unaddressed=None):
+    "The Households of records, in walk order."
+    households = group_households(records, unaddressed)
+    households.sort(key=lambda h: h.sort_key)
+    return households
+
+def shard_by_district(records):
+    "Dict mapping each (town, ward, dist) to its records."
+    shards = defaultdict(list)
+    for r in records:
+        shards[district_of(r)].append(r)
+    return shards
+
+def _district_walk_list(records):
+    unaddressed = []
+    return walk_list(records, unaddressed), unaddressed
+
+def walk_lists(records, workers=None, unaddressed=None):
+    """
+    Dict mapping each (town, ward, dist) to its walk list, the districts built
+    in a process pool if workers is given (else in this process). Records
+    without a street address are appended to unaddressed, if given.
+    """
+    shards = shard_by_district(records)
+    if workers:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_district_walk_list, shards.values()))
+    else:
+        results = [_district_walk_list(rs) for rs in shards.values()]
+    lists = {}
+    for d, (households, rest) in zip(shards, results):
+        lists[d] = households
+        if unaddressed is not None:
+            unaddressed.extend(rest)
+    return lists
+
+def merge_walk_lists(lists):
+    "Iterator over the Households of several walk lists (e.g. of districts), in county walk order."
+    return heapq.merge(*lists, key=lambda h: h.sort_key)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Counters and timings for a load, for finding where a slow load spends its time
+and what a flood of deviations is made of.
+
+Pass an IngestStats to voter_reader.iter_voters (or read_file) and/or to
+clean.iter_records (or process_file). Without one they run exactly as before;
+with one, iter_voters switches to an instrumented loop that times csv decoding,
+the check of each field, and the construction of the Voter, and counts
+deviations by kind and field, while iter_records counts lines by how they were
+classified. With profile=True, iter_voters also runs the decoding and parsing of
+each row under cProfile.
+
+    stats = IngestStats()
+    voters, rows = read_file('putnam.csv', stats=stats)
+    print(stats.to_json())
+    stats.print_profile()          # if IngestStats(profile=True)
+"""
+import io
+import json
+import time
+import pstats
+import cProfile
+from collections import Counter
+
+LINE_KINDS = ('records', 'blank', 'admin', 'ignored', 'fragment', 'unparseable')
+
+
+class IngestStats:
+    """
+    rows of the export (or call list records) seen; elapsed, the seconds spent
+    producing them (not counting the time the caller holds each row), and wall,
+    the seconds from the first row read to the last; time spent in csv decoding and in
+    parsing (the field checks, timed per field, and building the Voter);
+    deviations, a Counter of (kind, field); lines, a Counter of the call list
+    lines by LINE_KINDS.
+    """
+    def __init__(self, profile=False):
+        self.rows = 0
+        self.elapsed = 0.0
+        self.wall = 0.0
+        self.decode_time = 0.0
+        self.parse_time = 0.0
+        self.fields = []               # names of the fields timed, in check order
+        self.field_times = []          # seconds spent checking each field
+        self.deviations = Counter()
+        self.lines = Counter()
+        self.profiler = cProfile.Profile() if profile else None
+
+    def __repr__(self):
+        return "<IngestStats rows={} lines={} deviations={}>".format(
+            self.rows, sum(self.lines.values()), sum(self.deviations.values()))
+
+    def timers(self, fields):
+        "The list accumulating the check time of each of fields (names), for a timed parser."
+        if self.fields != fields:
+            if self.fields:
+                raise ValueError('stats already hold timings for other fields')
+            self.fields = list(fields)
+            self.field_times = [0.0] * len(fields)
+        return self.field_times
+
+    def timed(self, items):
+        """
+        Generator over items (a generator), adding the time spent producing
+        them to elapsed, and the time from the first to the last to wall.
+        """
+        clock = time.perf_counter
+        start = clock()
+        try:
+            while True:
+                t = clock()
+                try:
+                    x = next(items)
+                except StopIteration:
+                    return
+                finally:
+                    self.elapsed += clock() - t
+                yield x
+        finally:
+            items.close()
+            self.wall += clock() - start
+
+    def add_deviations(self, devs):
+        for d in devs:
+            self.deviations[(d[0], d[1])] += 1
+
+    @property
+    def validation_time(self):
+        return sum(self.field_times)
+
+    @property
+    def construction_time(self):
+        return max(self.parse_time - self.validation_time, 0.0)
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else None
+
+    def hot_fields(self, n=10):
+        "The n fields whose checks took longest, as (field, seconds)."
+        return sorted(zip(self.fields, self.field_times), key=lambda x: -x[1])[:n]
+
+    def snapshot(self):
+        "The stats as a json-able dict."
+        return {
+            'rows': self.rows,
+            'elapsed': self.elapsed,
+            'wall': self.wall,
+            'rows_per_sec': self.rows_per_sec,
+            'seconds': {'csv_decode': self.decode_time,
+                        'validation': self.validation_time,
+                        'construction': self.construction_time},
+            'field_seconds': dict(zip(self.fields, self.field_times)),
+            'deviations': [{'kind': k, 'field': f, 'count': n}
+                           for (k, f), n in self.deviations.most_common()],
+            'lines': {k: self.lines[k] for k in LINE_KINDS},
+            }
+
+    def to_json(self, **kw):
+        return json.dumps(self.snapshot(), **kw)
+
+    def print_profile(self, sort='cumulative', n=25, file=None):
+        "Print the top n functions of the cProfile run, if profile was set."
+        if self.profiler is None:
+            raise ValueError('not profiling; use IngestStats(profile=True)')
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats(sort).print_stats(n)
+        print(out.getvalue(), file=file)
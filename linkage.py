@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Linking the call list records (clean.Voters) to the BoE export (voter_reader.Voter).
+
+Records are joined on the voter id where the ids agree: the 8-digit id of the
+call list is the numeric part of the export's voter_id. The rest are blocked on
+(zip, first letters of the last name, date of birth), and only compared within
+their block. In a block, the m call list records and n export records are scored
+all at once: name and street similarity are the Jaccard similarity of trigram
+sets, computed as products of m x V and n x V trigram incidence matrices, plus
+agreement on house number and sex. A call list record is a match if its best
+score is at least match_score and no other candidate (nor other call list
+record) is within margin of it, ambiguous if there are such rivals, and a
+non-match otherwise.
+
+    link = link_records(calllist, voters)
+    link.counts()            # {'id': ..., 'blocked': ..., 'ambiguous': ..., 'non_match': ...}
+    for r, v, score, method in link.matches:
+        ...
+"""
+from collections import defaultdict
+import numpy as np
+from voter_index import normalize, trigrams
+from households import normalize_street, house_number, HOUSE_NUMBER
+
+MATCH_SCORE = 0.8
+MARGIN = 0.05
+LAST_NAME_PREFIX = 3
+WEIGHTS = {'name': 0.6, 'street': 0.2, 'number': 0.1, 'sex': 0.1}
+
+
+def id_key(s):
+    "The numeric part of a voter id, as an int (None if it has none)."
+    digits = ''.join(c for c in s if c.isdigit())
+    return int(digits) if digits else None
+
+def date_key(d):
+    return (d['year'], d['month'], d['day']) if type(d) is dict else None
+
+def call_list_keys(r):
+    "(id, block, name, street, house number, sex) of a clean.Voters record."
+    last, first = (r.name.split(',', 1) + [''])[:2]
+    m = HOUSE_NUMBER.match(r.address)
+    number, street = (int(m[1]), m[3]) if m else (None, r.address)
+    block = (r.zip.strip()[:5], normalize(last)[:LAST_NAME_PREFIX], date_key(r.dob))
+    return (id_key(r.voterid), block, normalize(last + ' ' + first), normalize_street(street),
+            number, r.sex)
+
+def export_keys(v):
+    "(id, block, name, street, house number, sex) of a voter_reader.Voter (or LazyVoter)."
+    n, a = v.name, v.address
+    last = normalize(n['last_name'])
+    number = house_number(a['street_number'])[0] if a['street_number'] else None
+    block = (a['zip'], last[:LAST_NAME_PREFIX], date_key(v.dob))
+    return (id_key(v.voter_id), block, normalize(' '.join([last, n['first_name'], n['middle_name']])),
+            normalize_street(a['street_name']), number, v.sex)
+
+
+def jaccard_matrix(xs, ys):
+    "Matrix of the Jaccard similarities of the trigram sets of strings xs and ys."
+    gx = [trigrams(x) for x in xs]
+    gy = [trigrams(y) for y in ys]
+    vocab = {}
+    for g in gx + gy:
+        for t in g:
+            vocab.setdefault(t, len(vocab))
+    a = np.zeros((len(xs), len(vocab)), dtype=np.float32)
+    b = np.zeros((len(ys), len(vocab)), dtype=np.float32)
+    for i, g in enumerate(gx):
+        a[i, [vocab[t] for t in g]] = 1
+    for i, g in enumerate(gy):
+        b[i, [vocab[t] for t in g]] = 1
+    shared = a @ b.T
+    union = a.sum(1)[:, None] + b.sum(1)[None, :] - shared
+    return np.where(union > 0, shared / np.maximum(union, 1), 0.0)
+
+def score_block(left, right):
+    "Score matrix of the keys (see call_list_keys) left against the keys right."
+    s = WEIGHTS['name'] * jaccard_matrix([k[2] for k in left], [k[2] for k in right])
+    s += WEIGHTS['street'] * jaccard_matrix([k[3] for k in left], [k[3] for k in right])
+    ln = np.array([-1 if k[4] is None else k[4] for k in left])
+    rn = np.array([-2 if k[4] is None else k[4] for k in right])
+    s += WEIGHTS['number'] * (ln[:, None] == rn[None, :])
+    ls = np.array([k[5] for k in left])
+    rs = np.array([k[5] for k in right])
+    s += WEIGHTS['sex'] * (ls[:, None] == rs[None, :])
+    return s
+
+
+class Linkage:
+    """
+    matches, a list of (call list record, Voter, score, method) with method 'id'
+    or 'blocked'; ambiguous, a list of (call list record, [(Voter, score)]) of
+    the rival candidates; non_matches, the call list records not linked.
+    """
+    def __init__(self):
+        self.matches = []
+        self.ambiguous = []
+        self.non_matches = []
+
+    def counts(self):
+        n = {'id': 0, 'blocked': 0}
+        for r, v, score, method in self.matches:
+            n[method] += 1
+        n['ambiguous'] = len(self.ambiguous)
+        n['non_match'] = len(self.non_matches)
+        return n
+
+    def __repr__(self):
+        return "<Linkage {}>".format(' '.join('{}={}'.format(k, n) for k, n in self.counts().items()))
+
+
+def link_records(calllist, voters, match_score=MATCH_SCORE, margin=MARGIN):
+    "The Linkage of the clean.Voters records calllist to the Voters voters; see the module doc."
+    link = Linkage()
+    vkeys = [export_keys(v) for v in voters]
+    by_id = {}
+    for i, k in enumerate(vkeys):
+        if k[0] is not None:
+            by_id[k[0]] = i
+    linked = set()
+    blocks = defaultdict(lambda: ([], []))     # block -> (call list positions, voter positions)
+    ckeys = [call_list_keys(r) for r in calllist]
+    for j, k in enumerate(ckeys):
+        i = by_id.get(k[0])
+        if i is not None:
+            link.matches.append((calllist[j], voters[i], 1.0, 'id'))
+            linked.add(i)
+        else:
+            blocks[k[1]][0].append(j)
+    for i, k in enumerate(vkeys):
+        if i not in linked and k[1] in blocks:
+            blocks[k[1]][1].append(i)
+    for block, (cs, vs) in blocks.items():
+        if not vs:
+            link.non_matches.extend(calllist[j] for j in cs)
+            continue
+        scores = score_block([ckeys[j] for j in cs], [vkeys[i] for i in vs])
+        best = scores.argmax(axis=1)
+        top = scores[np.arange(len(cs)), best]
+        # rivals: other candidates of the same record, or other records wanting the same voter
+        near_row = (scores >= top[:, None] - margin).sum(axis=1) > 1
+        for x, j in enumerate(cs):
+            if top[x] < match_score:
+                link.non_matches.append(calllist[j])
+            elif near_row[x] or (scores[:, best[x]] >= top[x] - margin).sum() > 1:
+                rivals = [(voters[vs[y]], float(scores[x, y]))
+                          for y in np.flatnonzero(scores[x] >= top[x] - margin)]
+                link.ambiguous.append((calllist[j], rivals))
+            else:
+                link.matches.append((calllist[j], voters[vs[best[x]]], float(top[x]), 'blocked'))
+    return link
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Load test for voter_service: many concurrent clients, each on a keep-alive
+connection, sending a mix of lookups (and some comments) as fast as answers come
+back. Reports requests/sec, the latency percentiles and the status counts, as
+json.
+
+    python voter_service.py export.csv --comments comments/ &
+    python load_test.py --clients 200 --requests 50 --export export.csv
+
+Without --url, a service is started in this process over a synthetic export of
+--voters voters (see synthetic.py), which measures the server and client
+together on one box.
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from collections import Counter
+from urllib.parse import urlsplit, quote
+
+WRITE_FRACTION = 0.02
+
+
+def request_mix(voters, rnd):
+    "A function giving a random (method, path, body) for the lookups of a canvassing app."
+    ids = [v.voter_id for v in voters]
+    lasts = [v.name['last_name'] for v in voters]
+    streets = [v.address['street_name'] for v in voters]
+    districts = [(v.town, v.ward, v.dist) for v in voters]
+
+    def next_request():
+        x = rnd.random()
+        if x < WRITE_FRACTION:
+            body = json.dumps({'author': 'load', 'text': 'not home'}).encode()
+            return 'POST', '/voters/%s/comments' % rnd.choice(ids), body
+        if x < 0.4:
+            return 'GET', '/voters/' + rnd.choice(ids), b''
+        if x < 0.6:
+            return 'GET', '/voters?last=%s&limit=20' % quote(rnd.choice(lasts)[:3]), b''
+        if x < 0.75:
+            return 'GET', '/voters?street=%s&limit=20' % quote(rnd.choice(streets)[:6]), b''
+        if x < 0.9:
+            t, w, d = rnd.choice(districts)
+            return 'GET', '/voters?town=%s&ward=%s&dist=%s&offset=%d' % (t, w, d, rnd.randrange(3) * 50), b''
+        t, w, d = rnd.choice(districts)
+        return 'GET', '/comments?town=%s&ward=%s' % (t, w), b''
+    return next_request
+
+async def client(host, port, n, next_request, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for i in range(n):
+            method, path, body = next_request()
+            start = time.perf_counter()
+            writer.write(('{} {} HTTP/1.1\r\nHost: {}\r\nContent-Length: {}\r\n\r\n'.format(
+                method, path, host, len(body))).encode('latin-1') + body)
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while True:
+                h = await reader.readline()
+                if h in (b'\r\n', b''):
+                    break
+                k, _, v = h.decode('latin-1').partition(':')
+                if k.lower() == 'content-length':
+                    length = int(v)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+    finally:
+        writer.close()
+
+async def run(url, voters, clients, requests, seed=0):
+    "Results (a dict) of clients clients sending requests requests each to the service at url."
+    u = urlsplit(url)
+    rnd = random.Random(seed)
+    next_request = request_mix(voters, rnd)
+    latencies, statuses = [], Counter()
+    start = time.perf_counter()
+    results = await asyncio.gather(*(client(u.hostname, u.port, requests, next_request, latencies, statuses)
+                                     for i in range(clients)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    errors = [repr(e) for e in results if isinstance(e, Exception)]
+    latencies.sort()
+    pct = lambda p: round(1000 * latencies[min(int(p * len(latencies)), len(latencies) - 1)], 3) \
+        if latencies else None
+    return {'clients': clients, 'requests': len(latencies), 'seconds': round(elapsed, 3),
+            'requests_per_sec': round(len(latencies) / elapsed, 1),
+            'latency_ms': {'p50': pct(0.5), 'p90': pct(0.9), 'p99': pct(0.99), 'max': pct(1.0)},
+            'statuses': {str(k): n for k, n in statuses.items()}, 'client_errors': errors[:10]}
+
+async def run_local(voters, clients, requests, port, comments_dir):
+    "run against a VoterService started in this event loop."
+    from voter_service import VoterService
+    from comment_log import CommentLog
+    comments = CommentLog(comments_dir, author='load')
+    service = VoterService(voters, comments)
+    server = await asyncio.start_server(service.handle, '127.0.0.1', port, backlog=4096)
+    try:
+        results = await run('http://127.0.0.1:%d/' % port, voters, clients, requests)
+        results['cache'] = {'hits': service.cache.hits, 'misses': service.cache.misses}
+        return results
+    finally:
+        server.close()
+        comments.close()
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Load test voter_service.')
+    p.add_argument('--url', help='service to test, e.g. http://127.0.0.1:8080/ (default: start one)')
+    p.add_argument('--export', help='export the service was loaded from (to pick queries from)')
+    p.add_argument('--voters', type=int, default=20000, help='synthetic voters, without --export')
+    p.add_argument('--clients', type=int, default=200)
+    p.add_argument('--requests', type=int, default=50, help='per client')
+    p.add_argument('--port', type=int, default=8765, help='port of the service started here')
+    args = p.parse_args(argv)
+    from voter_reader import read_file, Voter
+    if args.export:
+        voters, rows = read_file(args.export)
+    else:
+        import synthetic
+        voters = [Voter(r) for r in synthetic.export_rows(args.voters)]
+    if args.url:
+        results = asyncio.run(run(args.url, voters, args.clients, args.requests))
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            results = asyncio.run(run_local(voters, args.clients, args.requests, args.port, tmp))
+    print(json.dumps(results, indent=2))
+    return 1 if results['client_errors'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Streaming export of voters as newline delimited json: one compact json object
+per line, so the output can be produced (and read back) in constant memory.
+
+Voters are encoded by a function compiled from VOTER_FIELDS, which writes the
+json text of each field directly rather than going through VoterEncoder and
+__dict__. Lines are written in batches. With compression='gzip' (or 'zstd', which
+needs the zstandard package) each batch is its own gzip member (zstd frame);
+the concatenation is a valid compressed file, and with index=True the byte
+offset and first record of every batch is written to fn + '.idx', so a loader
+can split the file and decompress the pieces in parallel.
+
+    write_ndjson(iter_voters('putnam.csv'), 'putnam.ndjson.gz', compression='gzip')
+    for d in read_ndjson('putnam.ndjson.gz'):
+        ...
+"""
+import io
+import json
+import gzip
+from json.encoder import encode_basestring
+from voter_reader import Voter, LazyVoter, VoterEncoder, VOTER_FIELDS, voters_of
+
+DEFAULT_BATCH_SIZE = 10000
+CONVERT = {'chars': '_s', 'patt': '_s', 'date': '_date', 'history': '_history'}
+COMPRESSIONS = (None, 'gzip', 'zstd')
+
+
+def _json_date(v):
+    "A date field: {'year','month','day'} dict, or the raw string if it failed to parse."
+    if type(v) is dict:
+        return '{"day":%d,"month":%d,"year":%d}' % (v['day'], v['month'], v['year'])
+    return encode_basestring(v)
+
+def _json_history(v):
+    "history_codes: list of {'year','type'} dicts, or the raw string if it failed to parse."
+    if type(v) is list:
+        return '[' + ','.join('{"type":%s,"year":%s}' % (encode_basestring(c['type']),
+                                                          encode_basestring(c['year']))
+                              for c in v) + ']'
+    return encode_basestring(v)
+
+def _json_list(v):
+    return '[' + ','.join(map(encode_basestring, v)) + ']'
+
+def _json_deviations(dev):
+    if not dev:
+        return '[]'
+    return json.dumps(sorted(dev, key=repr), ensure_ascii=False, separators=(',', ':'))
+
+def _compile_encoder(fields):
+    """
+    Compile a field spec (see voter_reader.VOTER_FIELDS) into a function giving
+    the compact json text of a Voter's __dict__, with the same content as
+    json.dumps(voter, cls=VoterEncoder) (keys in field order rather than sorted).
+    """
+    tree = {}
+    for group, attr, col, check in fields:
+        node = tree
+        for g in ([] if group is None else group.split('.')):
+            if type(node.get(g)) is not dict:
+                node[g] = {}
+            node = node[g]
+        node[attr] = '_list' if type(col) is tuple else CONVERT[check[0]]
+    tree['deviations'] = '_dev'
+    env = {'_s': encode_basestring, '_date': _json_date, '_history': _json_history,
+           '_list': _json_list, '_dev': _json_deviations}
+    src = ['def encode(d):']
+    parts = []
+
+    def walk(node, var):
+        for i, (k, x) in enumerate(node.items()):
+            key = ('{' if i == 0 else ',') + encode_basestring(k) + ':'
+            if type(x) is dict:
+                sub = var + '_' + k
+                src.append('    %s = %s[%r]' % (sub, var, k))
+                parts.append(repr(key))
+                walk(x, sub)
+            else:
+                parts.append('%r + %s(%s[%r])' % (key, x, var, k))
+        parts.append("'}'")
+
+    walk(tree, 'd')
+    src.append("    return ''.join((%s,))" % ',\n        '.join(parts))
+    exec('\n'.join(src), env)
+    return env['encode']
+
+_encode_voter = _compile_encoder(VOTER_FIELDS)
+_fallback = VoterEncoder(ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+
+def encode(o):
+    "Compact json text (one line) for a Voter, or anything VoterEncoder can handle."
+    if type(o) is Voter:
+        return _encode_voter(o.__dict__)
+    if type(o) is LazyVoter:
+        return _encode_voter(o.to_dict())
+    return _fallback.encode(o)
+
+
+def _compressor(compression):
+    "Function compressing one batch into a self contained gzip member / zstd frame."
+    if compression is None:
+        return lambda b: b
+    if compression == 'gzip':
+        return lambda b: gzip.compress(b, compresslevel=6)
+    if compression == 'zstd':
+        import zstandard                     # optional; only needed for zstd
+        return zstandard.ZstdCompressor().compress
+    raise ValueError('compression must be one of ' + repr(COMPRESSIONS))
+
+def write_ndjson(data, fn, compression=None, batch_size=DEFAULT_BATCH_SIZE, index=False):
+    """
+    Write data (Voters, or a stream from iter_voters(...)) to fn, one json object
+    per line, batch_size lines at a time. See the module doc for compression and
+    index. Returns the number of records written.
+    """
+    compress = _compressor(compression)
+    n = 0
+    idx = open(fn + '.idx', 'w') if index else None
+    try:
+        with open(fn, 'wb') as fp:
+            batch = []
+            for v in voters_of(data):
+                batch.append(encode(v))
+                if len(batch) >= batch_size:
+                    n = _write_batch(fp, idx, batch, n, compress)
+                    batch = []
+            if batch:
+                n = _write_batch(fp, idx, batch, n, compress)
+    finally:
+        if idx is not None:
+            idx.close()
+    return n
+
+def _write_batch(fp, idx, batch, n, compress):
+    if idx is not None:
+        idx.write('%d %d %d\n' % (fp.tell(), n, len(batch)))
+    fp.write(compress(('\n'.join(batch) + '\n').encode('utf-8')))
+    return n + len(batch)
+
+def read_index(fn):
+    "List of (byte offset, first record, number of records) of the batches of fn."
+    with open(fn + '.idx') as fp:
+        return [tuple(map(int, line.split())) for line in fp]
+
+def read_ndjson(fn, compression=None, start=0, end=None):
+    """
+    Generator over the decoded objects in fn (or in its bytes [start, end), which
+    must be batch boundaries from read_index). compression is guessed from the
+    file name if not given.
+    """
+    if compression is None:
+        compression = 'gzip' if fn.endswith('.gz') else 'zstd' if fn.endswith('.zst') else None
+    with open(fn, 'rb') as fp:
+        fp.seek(start)
+        raw = fp if end is None else io.BytesIO(fp.read(end - start))
+        if compression == 'gzip':
+            raw = gzip.GzipFile(fileobj=raw)
+        elif compression == 'zstd':
+            import zstandard
+            raw = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+        for line in io.TextIOWrapper(raw, encoding='utf-8'):
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Parallel ingest of large BoE exports.
+
+The file is cut into byte ranges that start and end on row boundaries, and each
+range is parsed (csv decode + Voter construction) in a process pool. Row indices
+are global: every chunk knows the index of its first row, so results carry the
+same (index, voter, deviations) that iter_voters(fn) yields for the same row.
+
+    for ind, v, dev in iter_voters_parallel('state.csv', workers=8):
+        ...
+
+Shipping every Voter back to the parent costs a pickle round trip per row. When
+only a summary is needed, map_voters runs a function over each chunk's stream
+inside the worker and only returns its result, which scales with the cores.
+
+Rows are assumed not to contain embedded newlines (true of the NTS export).
+"""
+import os
+import io
+import csv
+import mmap
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from voter_reader import Voter
+
+CHUNKS_PER_WORKER = 4     # more chunks than workers, so slow chunks even out
+
+
+def chunk_ranges(fn, num_chunks):
+    """
+    Split fn into at most num_chunks byte ranges on row boundaries.
+    Returns a list of (start, end, first_row_index).
+    """
+    size = os.path.getsize(fn)
+    if size == 0:
+        return []
+    with open(fn, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        bounds = [0]
+        for i in range(1, num_chunks):
+            pos = mm.find(b'\n', max(size * i // num_chunks, bounds[-1]))
+            if pos < 0 or pos + 1 >= size:
+                break
+            bounds.append(pos + 1)
+        bounds.append(size)
+        ranges = []
+        first = 0
+        for start, end in zip(bounds, bounds[1:]):
+            ranges.append((start, end, first))
+            first += mm[start:end].count(b'\n')
+    return ranges
+
+def _iter_chunk(fn, start, end, first, keep_raw):
+    "As iter_voters(fn, keep_raw), restricted to the bytes [start, end) of fn."
+    with open(fn, 'rb') as fp:
+        fp.seek(start)
+        data = fp.read(end - start)
+    # Decode as open(fn, newline='') does in iter_voters.
+    text = io.TextIOWrapper(io.BytesIO(data), newline='')
+    reader = csv.reader(text, delimiter=',', quotechar='|')
+    for ind, row in enumerate(reader, first):
+        v = Voter(row)
+        if keep_raw:
+            yield ind, v, v.deviations, row
+        else:
+            yield ind, v, v.deviations
+
+def _parse_chunk(fn, start, end, first, keep_raw):
+    return list(_iter_chunk(fn, start, end, first, keep_raw))
+
+def _map_chunk(fn, start, end, first, keep_raw, func):
+    return first, func(_iter_chunk(fn, start, end, first, keep_raw))
+
+def _run(fn, task, args, workers, ordered, chunks):
+    "Submit task for every chunk of fn; yield the results in file order if ordered."
+    workers = workers or os.cpu_count()
+    ranges = chunk_ranges(fn, chunks or workers * CHUNKS_PER_WORKER)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(task, fn, start, end, first, *args)
+                   for start, end, first in ranges]
+        for f in (futures if ordered else as_completed(futures)):
+            yield f.result()
+
+def iter_voters_parallel(fn, workers=None, ordered=True, keep_raw=False, chunks=None):
+    """
+    Parallel version of iter_voters(fn, keep_raw): yields the same tuples, with
+    the same indices and deviations. workers defaults to the number of cores.
+    If ordered, tuples come in file order; otherwise chunk by chunk, as each
+    chunk completes. chunks (default CHUNKS_PER_WORKER per worker) sets how
+    finely the file is split.
+    """
+    for results in _run(fn, _parse_chunk, (keep_raw,), workers, ordered, chunks):
+        yield from results
+
+def read_file_parallel(fn, workers=None):
+    "Parallel version of read_file(fn)."
+    results=[]
+    rows=[]
+    for ind, v, dev, row in iter_voters_parallel(fn, workers, keep_raw=True):
+        results.append(v)
+        rows.append(row)
+    return results, rows
+
+def map_voters(fn, func, workers=None, ordered=True, keep_raw=False, chunks=None):
+    """
+    Run func over the stream of (index, voter, deviations[, row]) tuples of each
+    chunk of fn, in the worker processes. func must be picklable (a module level
+    function), and so must its result. Yields (first_row_index, result) per chunk.
+    """
+    yield from _run(fn, _map_chunk, (keep_raw, func), workers, ordered, chunks)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+On-disk cache of parsed exports, for files that are loaded over and over.
+
+An entry is a VoterTable saved in its memory-mappable layout (see voter_table.MAGIC),
+named by the sha256 of the export's contents and the SCHEMA_VERSION of the parser,
+and next to it the parsed fields (and deviations) of every Voter, marshalled in
+chunks. Loading the table maps it rather than parsing, so it is near instant;
+iter_voters and read_file rebuild the Voters from the cached fields, with no csv
+decode and no validation. That takes a quarter to a third less time than parsing
+when streaming, not more: building the Voters' dicts is most of the cost either
+way, and read_file, holding every Voter, is mostly the garbage collector's time.
+A changed export (or parser) simply misses, and is parsed once, in full, for both. The cache is capped at max_bytes, evicting
+the least recently used files.
+
+    c = ParseCache()
+    t = c.load_table('putnam.csv')
+    for ind, v, dev in c.iter_voters('putnam.csv'):
+        ...
+"""
+import os
+import struct
+import marshal
+import hashlib
+import tempfile
+import voter_reader
+from voter_reader import Voter, SCHEMA_VERSION, NO_DEVIATIONS
+from voter_table import VoterTable
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'voters')
+DEFAULT_MAX_BYTES = 2 * 1024**3
+SUFFIX = '.vtable'
+FIELDS_SUFFIX = '.fields'
+FIELDS_CHUNK = 256            # Voters per marshalled chunk of a fields file (small, to stream)
+MARSHAL_VERSION = 4
+CHUNK_HEADER = struct.Struct('<Q')   # byte length of the marshalled chunk after it
+
+
+def file_hash(fn, block=1 << 20):
+    "sha256 (hex) of the contents of fn."
+    h = hashlib.sha256()
+    with open(fn, 'rb') as fp:
+        for b in iter(lambda: fp.read(block), b''):
+            h.update(b)
+    return h.hexdigest()
+
+
+class ParseCache:
+    "A directory of cached parses, holding at most max_bytes."
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path(self, digest, suffix=SUFFIX):
+        return os.path.join(self.cache_dir, '{}-{}{}'.format(digest, SCHEMA_VERSION, suffix))
+
+    def load_table(self, fn):
+        "The VoterTable for fn, from the cache if there, else parsed (and cached)."
+        return self._table(fn, file_hash(fn))
+
+    def _table(self, fn, digest):
+        path = self.path(digest)
+        if os.path.exists(path):
+            try:
+                t = VoterTable.load(path)
+                os.utime(path)               # mark as recently used
+                return t
+            except ValueError:
+                os.remove(path)              # corrupt or from another format
+        return self._parse(fn, digest)
+
+    def _parse(self, fn, digest):
+        "Parse fn once, caching both its table and its fields."
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                t = VoterTable.from_stream(_tee_fields(voter_reader.iter_voters(fn, keep_raw=True), fp))
+            os.replace(tmp, self.path(digest, FIELDS_SUFFIX))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.store(t, digest, fn)
+        return t
+
+    def store(self, t, digest, fn=None):
+        "Save t as the entry for the export with contents hash digest, then evict to size."
+        fd, tmp = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            t.save(tmp, meta={'source': fn, 'sha256': digest})
+            os.replace(tmp, self.path(digest))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.evict()
+
+    def iter_voters(self, fn, keep_raw=False):
+        "As voter_reader.iter_voters(fn, keep_raw), via the cache."
+        digest = file_hash(fn)
+        path = self.path(digest, FIELDS_SUFFIX)
+        if not os.path.exists(path):
+            t = self._parse(fn, digest)      # writes path
+        elif keep_raw:
+            t = self._table(fn, digest)
+        rows = t.rows() if keep_raw else None
+        os.utime(path)
+        for ind, v in _read_fields(path):
+            if keep_raw:
+                yield ind, v, v.deviations, next(rows)
+            else:
+                yield ind, v, v.deviations
+
+    def read_file(self, fn):
+        "As voter_reader.read_file(fn), via the cache."
+        results=[]
+        rows=[]
+        for ind, v, dev, row in self.iter_voters(fn, keep_raw=True):
+            results.append(v)
+            rows.append(row)
+        return results, rows
+
+    def entries(self):
+        "List of (path, size, last used) of the entries, least recently used first."
+        res = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(SUFFIX) or name.endswith(FIELDS_SUFFIX):
+                st = os.stat(os.path.join(self.cache_dir, name))
+                res.append((os.path.join(self.cache_dir, name), st.st_size, st.st_mtime))
+        return sorted(res, key=lambda e: e[2])
+
+    def invalidate(self, fn=None):
+        """
+        Drop the entries for the current contents of fn (under any parser version),
+        or every entry if fn is None. Returns the number of entries dropped.
+        """
+        prefix = file_hash(fn) + '-' if fn is not None else ''
+        dropped = 0
+        for path, size, used in self.entries():
+            if os.path.basename(path).startswith(prefix):
+                os.remove(path)
+                dropped += 1
+        return dropped
+
+    def evict(self):
+        "Drop least recently used entries until the cache holds at most max_bytes."
+        entries = self.entries()
+        total = sum(size for path, size, used in entries)
+        for path, size, used in entries:
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+
+def _tee_fields(items, fp):
+    "Pass on the (index, voter, deviations, row) items, writing (indices, field dicts) to fp by chunk."
+    inds, fields = [], []
+    for item in items:
+        inds.append(item[0])
+        fields.append(item[1].__dict__)
+        if len(inds) == FIELDS_CHUNK:
+            _write_chunk(fp, inds, fields)
+            inds, fields = [], []
+        yield item
+    if inds:
+        _write_chunk(fp, inds, fields)
+
+def _write_chunk(fp, inds, fields):
+    # marshal.load reads a file object a few bytes at a time; length-prefixed
+    # chunks are read whole, and marshal.loads is fast
+    b = marshal.dumps((inds, fields), MARSHAL_VERSION)
+    fp.write(CHUNK_HEADER.pack(len(b)))
+    fp.write(b)
+
+def _read_fields(path):
+    "Generator over (index, Voter) from a fields file, the Voters rebuilt without parsing."
+    new = Voter.__new__
+    with open(path, 'rb') as fp:
+        while True:
+            header = fp.read(CHUNK_HEADER.size)
+            if not header:
+                return
+            inds, fields = marshal.loads(fp.read(CHUNK_HEADER.unpack(header)[0]))
+            for ind, d in zip(inds, fields):
+                if not d['deviations']:
+                    d['deviations'] = NO_DEVIATIONS
+                v = new(Voter)
+                v.__dict__ = d
+                yield ind, v
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Deterministic synthetic data, for benchmarks and for trying things out without
+real voter data.
+
+export_rows(n) gives rows in the NTS export format read by voter_reader (all the
+columns of VOTER_FIELDS, then the voting history, then one trailing column), and
+tika_lines(n) the text tika extracts from a call list, as read by clean. Both
+depend only on the seed. A fraction malformed of the rows (lines) is damaged the
+way real data is: over-long values, bad dates, codes that fail their pattern,
+broken history; for tika, records split across page breaks and stray lines.
+
+    python synthetic.py export 100000 export.csv
+    python synthetic.py tika 100000 calllist.txt
+"""
+import sys
+import csv
+import random
+
+EXPORT_YEAR = 2017
+FIRST_NAMES = ['JOHN', 'MARY', 'ROBERT', 'PATRICIA', 'MICHAEL', 'LINDA', 'WILLIAM', 'BARBARA',
+               'DAVID', 'ELIZABETH', 'JAMES', 'SUSAN', 'JOSEPH', 'MARGARET', 'THOMAS', 'KAREN',
+               'CHRISTOPHER', 'NANCY', 'DANIEL', 'LISA', 'ANTHONY', 'MARIA', 'KEVIN', 'DONNA']
+LAST_NAMES = ['SMITH', 'JOHNSON', 'WILLIAMS', 'BROWN', 'JONES', 'MILLER', 'DAVIS', 'GARCIA',
+              'RODRIGUEZ', 'WILSON', 'MARTINEZ', 'ANDERSON', 'TAYLOR', 'THOMAS', 'MOORE',
+              'MARTIN', 'JACKSON', 'THOMPSON', 'WHITE', 'LOPEZ', 'LEE', 'GONZALEZ', 'HARRIS',
+              'CLARK', 'LEWIS', 'ROBINSON', 'WALKER', 'PEREZ', 'HALL', 'YOUNG', 'ALLEN',
+              'SANCHEZ', 'WRIGHT', 'KING', 'SCOTT', 'GREEN', 'BAKER', 'ADAMS', 'NELSON',
+              "O'BRIEN", 'MURPHY', 'KELLY', 'SULLIVAN', 'RUSSO', 'ESPOSITO', 'ROMANO']
+SUFFIXES = ['', '', '', '', '', '', '', '', 'JR', 'SR', 'II', 'III']
+STREETS = ['ROUTE 6', 'ROUTE 6N', 'CROTON FALLS RD', 'LONG POND RD', 'MAIN ST', 'OAK ST',
+           'HILL ST', 'LAKE BLVD', 'BUCKSHOLLOW RD', 'KENNICUT HILL RD', 'SOMERS RD',
+           'UNION VALLEY RD', 'FAIR ST', 'GLENEIDA AVE', 'SEMINARY HILL RD', 'PEEKSKILL HOLLOW RD',
+           'OSCAWANA LAKE RD', 'BREWSTER HILL RD', 'FARMERS MILLS RD', 'NIMHAM RD']
+# town -> (city, zip) of its post offices
+TOWN_POST_OFFICES = {
+    'CA': [('MAHOPAC', '10541'), ('CARMEL', '10512'), ('PUTNAM VALLEY', '10579')],
+    'KE': [('CARMEL', '10512'), ('KENT', '10512')],
+    'PA': [('PATTERSON', '12563'), ('HOLMES', '12531')],
+    'PH': [('COLD SPRING', '10516'), ('GARRISON', '10524')],
+    'PV': [('PUTNAM VALLEY', '10579'), ('LAKE PEEKSKILL', '10537')],
+    'SE': [('BREWSTER', '10509')]
+    }
+TOWN_WEIGHTS = {'CA': 34, 'KE': 13, 'PA': 12, 'PH': 10, 'PV': 12, 'SE': 19}
+AFFILIATION_WEIGHTS = {'REP': 36, 'DEM': 29, 'BLK': 22, 'IND': 7, 'CON': 3, 'WOR': 1,
+                       'GRE': 1, 'REF': 0.5, 'LBT': 0.3, 'WEP': 0.1, 'OTH': 0.1}
+SCHOOL_DISTS = ['001', '002', '003', '004', '006', '009', '010']
+FIRE_DISTS = ['%03d' % i for i in range(1, 15)]
+EYES = ['BRO', 'BLU', 'HAZ', 'GRN', 'GRY', '']
+REG_SOURCES = ['MAIL', 'DMV', 'AGENCY', 'BOE', 'SCHOOL']
+MAX_HISTORY = 12
+
+
+def elections(year):
+    "The (type, year) of the elections in the county in year, latest first."
+    e = [('GE', year), ('PE', year)]
+    if year >= 2012 and year % 2 == 0:
+        e.append(('FP', year))             # separate federal primary
+    if year % 4 == 0:
+        e.append(('PP', year))             # presidential primary
+    return e
+
+def history(rnd, reg_year, propensity, affiliated):
+    "History string, most recent election first, of a voter registered in reg_year."
+    codes = []
+    for year in range(EXPORT_YEAR, max(reg_year, 1996) - 1, -1):
+        for typ, y in elections(year):
+            p = propensity if typ == 'GE' else propensity * 0.45 if affiliated else 0
+            if rnd.random() < p:
+                codes.append('%s%02d' % (typ, y % 100))
+    return ''.join(codes[:MAX_HISTORY])
+
+def pick(rnd, weights):
+    return rnd.choices(list(weights), weights=list(weights.values()))[0]
+
+def yyyymmdd(rnd, lo, hi):
+    return '%04d%02d%02d' % (rnd.randint(lo, hi), rnd.randint(1, 12), rnd.randint(1, 28))
+
+def voter(rnd, i):
+    "The fields of voter i, as a dict; shared by export_rows and tika_lines."
+    town = pick(rnd, TOWN_WEIGHTS)
+    city, zip = rnd.choice(TOWN_POST_OFFICES[town])
+    birth = rnd.randint(1920, EXPORT_YEAR - 18)
+    reg = rnd.randint(birth + 18, EXPORT_YEAR)
+    aff = pick(rnd, AFFILIATION_WEIGHTS)
+    return {
+        'id': '%08d' % (10000000 + i), 'town': town, 'city': city, 'zip': zip,
+        'first': rnd.choice(FIRST_NAMES), 'middle': rnd.choice(['', '', 'A', 'J', 'M', 'R']),
+        'last': rnd.choice(LAST_NAMES), 'suffix': rnd.choice(SUFFIXES),
+        'number': str(rnd.randint(1, 2500)), 'street': rnd.choice(STREETS),
+        'apt': rnd.choice([''] * 9 + ['APT %d' % rnd.randint(1, 20)]),
+        'dob': yyyymmdd(rnd, birth, birth), 'reg': yyyymmdd(rnd, reg, reg),
+        'sex': rnd.choice('MF'), 'aff': aff,
+        'phone': rnd.choice([('', '')] + [('845', '%03d-%04d' % (rnd.randint(200, 999),
+                                                                rnd.randint(0, 9999)))] * 3),
+        'ward': '%03d' % rnd.randint(0, 6), 'dist': '%03d' % rnd.randint(1, 30),
+        'status': rnd.choices('AIP', weights=[90, 8, 2])[0],
+        'history': history(rnd, reg, rnd.random() ** 0.6, aff in ('DEM', 'REP', 'CON', 'IND')),
+        }
+
+def export_row(rnd, i):
+    v = voter(rnd, i)
+    absentee = rnd.random() < 0.04
+    area, tel = v['phone']
+    row = ['NY%013d' % int(v['id']), v['first'], v['middle'], v['last'], v['suffix'],
+           v['number'], rnd.choice([''] * 50 + ['1/2']), v['street'], v['apt'], '', '',
+           v['city'], 'NY', v['zip'], rnd.choice(['', '%04d' % rnd.randint(1000, 9999)]),
+           '%d0710' % EXPORT_YEAR, v['dob'], v['sex'], rnd.choice(EYES),
+           str(rnd.randint(4, 6)), str(rnd.randint(0, 11)), area, tel, v['reg'],
+           rnd.choice(REG_SOURCES), '', v['aff'], v['town'], v['ward'], v['dist'],
+           '018', '040', rnd.choice(['094', '099']), rnd.choice(SCHOOL_DISTS),
+           '%03d' % rnd.randint(1, 9), '000', rnd.choice(FIRE_DISTS), rnd.choice(['000', '001']),
+           v['status'], '', 'Y' if absentee else 'N',
+           '', '', '', '', '', '', '', '']
+    if absentee:
+        row += ['GE%02d' % (EXPORT_YEAR % 100 - 1), rnd.choice(['REG', 'PER']),
+                yyyymmdd(rnd, EXPORT_YEAR - 1, EXPORT_YEAR - 1),
+                '%s %s' % (v['number'], v['street']), '', '', '', v['city'], 'NY', v['zip'], '',
+                yyyymmdd(rnd, EXPORT_YEAR - 1, EXPORT_YEAR - 1),
+                yyyymmdd(rnd, EXPORT_YEAR - 1, EXPORT_YEAR - 1), '', '',
+                yyyymmdd(rnd, EXPORT_YEAR, EXPORT_YEAR), 'Y', '']
+    else:
+        row += [''] * 16 + ['N', '']
+    row += [v['history'], '']
+    return row
+
+def malform(rnd, row):
+    "Damage one field of an export row, in one of the ways real rows are damaged."
+    kind = rnd.randrange(6)
+    if kind == 0:
+        row[0] = row[0] + 'X'                  # voter_id too long
+    elif kind == 1:
+        row[16] = '%s-%s-%s' % (row[16][:4], row[16][4:6], row[16][6:])   # date not YYYYMMDD
+    elif kind == 2:
+        row[17] = 'U'                          # sex not M|F
+    elif kind == 3:
+        row[22] = row[22].replace('-', '') or '5551234'   # tel_number without the dash
+    elif kind == 4:
+        row[-2] = row[-2] + '*'                # stray character in the history
+    else:
+        row[7] = row[7] + ' EXTENSION OF A VERY LONG NAME'  # street_name too long
+    return row
+
+def export_rows(n, seed=0, malformed=0.01):
+    "Generator over n synthetic export rows."
+    rnd = random.Random(seed)
+    for i in range(n):
+        row = export_row(rnd, i)
+        if rnd.random() < malformed:
+            row = malform(rnd, row)
+        yield row
+
+def write_export(fn, n, seed=0, malformed=0.01):
+    "Write n synthetic export rows to fn, in the csv dialect read_file reads."
+    with open(fn, 'w', newline='') as fp:
+        csv.writer(fp, delimiter=',', quotechar='|').writerows(export_rows(n, seed, malformed))
+
+
+PAGE_SIZE = 50        # records per page of a call list
+PAGE_HEADER = ['Putnam County Board of Elections',
+               'Detailed Voter Master Call List',
+               'Town of: Carmel',
+               'CARMEL, District 12',
+               'CityVoter ID Name Street Address AFF Phone',
+               'Ward/Dist Sex Date of Birth Registered Status']
+PAGE_FOOTER = ['User: ANDREAB  Station: BOE-03']
+CALL_LIST_CITIES = TOWN_POST_OFFICES['CA']
+
+def mmddyyyy(d):
+    return '%s/%s/%s' % (d[4:6], d[6:], d[:4])
+
+def tika_record(v):
+    "The line tika extracts for a call list record (Town/Ward/Dist displaced after the zip)."
+    area, tel = v['phone']
+    phone = '(%s) %s' % (area, tel) if area else '-'
+    name = '%s, %s' % (v['last'], v['first']) + (' ' + v['middle'] if v['middle'] else '')
+    return '%s %s %s %s %s %s%s/%s/%s %s %s %s %s %s Active' % (
+        v['id'], name, v['number'], v['street'].title(), v['city'], v['zip'],
+        v['town'], v['ward'], v['dist'], v['aff'], phone, v['sex'],
+        mmddyyyy(v['dob']), mmddyyyy(v['reg']))
+
+def tika_lines(n, seed=0, malformed=0.01):
+    """
+    Generator over the lines of a synthetic Carmel call list of n DEM records,
+    with page headers and footers every PAGE_SIZE records. A fraction malformed
+    of the records is split over the following page break, or followed by a
+    stray line; some records are followed by an 'ADMIN' status line.
+    """
+    rnd = random.Random(seed)
+    yield from PAGE_HEADER
+    for i in range(n):
+        v = voter(rnd, i)
+        v['aff'] = 'DEM'
+        v['town'] = 'CA'
+        v['city'], v['zip'] = rnd.choice(CALL_LIST_CITIES)
+        line = tika_record(v)
+        page_break = (i + 1) % PAGE_SIZE == 0
+        damaged = rnd.random() < malformed
+        if page_break and damaged:
+            cut = line.index(v['city'])
+            yield line[:cut].strip()
+            yield from PAGE_FOOTER
+            yield ''
+            yield from PAGE_HEADER
+            yield line[cut:]
+            continue
+        yield line
+        if damaged:
+            yield 'PAGE %d CONTINUED' % rnd.randint(1, 999)
+        if rnd.random() < 0.01:
+            yield 'ADMIN'
+        if page_break:
+            yield from PAGE_FOOTER
+            yield ''
+            yield from PAGE_HEADER
+    yield '%d Voters Reported' % n
+
+def write_tika(fn, n, seed=0, malformed=0.01):
+    with open(fn, 'w') as fp:
+        for line in tika_lines(n, seed, malformed):
+            fp.write(line + '\n')
+
+
+if __name__ == '__main__':
+    what, n, fn = sys.argv[1], int(sys.argv[2]), sys.argv[3]
+    (write_export if what == 'export' else write_tika)(fn, n)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+iter_records recovers every record of a call list, however its lines are
+split, and reports what it cannot use.
+
+    python -m pytest -q test_clean.py
+"""
+import random
+import pytest
+import synthetic
+from clean import iter_records
+
+N = 400
+
+
+def records(lines):
+    "The records of lines, and the (kind, text) errors reported."
+    errors = []
+    found = list(iter_records(lines, on_error=lambda kind, text: errors.append((kind, text))))
+    return found, errors
+
+def ids(n):
+    return ['%08d' % (10000000 + i) for i in range(n)]
+
+@pytest.mark.parametrize('malformed', [0, 0.5, 1.0])
+def test_every_record_is_recovered(malformed):
+    lines = list(synthetic.tika_lines(N, malformed=malformed))
+    found, errors = records(lines)
+    assert [r.voterid for r in found] == ids(N)
+    strays = [line for line in lines if line.startswith('PAGE ')]
+    assert errors == [('fragment', line) for line in strays]
+    if malformed:
+        assert strays
+
+def test_record_split_across_a_page_header():
+    v = synthetic.voter(random.Random(0), 0)
+    v['aff'], v['town'], v['city'], v['zip'] = 'DEM', 'CA', 'MAHOPAC', '10541'
+    line = synthetic.tika_record(v)
+    cut = line.index(v['city'])
+    lines = ([line[:cut].strip()] + synthetic.PAGE_FOOTER + [''] + synthetic.PAGE_HEADER +
+             [line[cut:]])
+    found, errors = records(lines)
+    assert errors == []
+    assert [r.voterid for r in found] == [v['id']]
+    assert (found[0].city.strip(), found[0].zip, found[0].town_ward['town']) == ('MAHOPAC', '10541', 'CA')
+
+def test_admin_lines_continue_the_status():
+    lines = list(synthetic.tika_lines(N, seed=3))
+    found, errors = records(lines)
+    admin = [r for r in found if r.status == 'Active ADMIN']
+    assert len(admin) == lines.count('ADMIN') > 0
+    assert all(r.status in ('Active', 'Active ADMIN') for r in found)
+    follows = [lines[i - 1] for i, line in enumerate(lines) if line == 'ADMIN']
+    assert [r.voterid for r in admin] == [line.split()[0] for line in follows]
+
+def test_truncated_trailing_fragment():
+    lines = list(synthetic.tika_lines(10, malformed=0))[:-1]     # without 'Voters Reported'
+    last = lines[-1]
+    found, errors = records(lines[:-1] + [last[:len(last) // 2]])
+    assert [r.voterid for r in found] == ids(9)
+    assert errors == [('fragment', last[:len(last) // 2])]
+
+def test_other_affiliations_are_records():
+    v = synthetic.voter(random.Random(1), 7)
+    v['aff'], v['town'], v['city'], v['zip'] = 'REP', 'CA', 'CARMEL', '10512'
+    found, errors = records([synthetic.tika_record(v)])
+    assert errors == [] and [r.affiliation for r in found] == ['REP']
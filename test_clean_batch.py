@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+A file that cannot be cleaned is reported, and does not stop the batch; the
+records come back the same every run; towns are told from whole words of the
+file name.
+
+    python -m pytest -q test_clean_batch.py
+"""
+import synthetic
+from clean_batch import process_directory, detect_town
+
+
+def test_failures_are_reported_per_file(tmp_path):
+    synthetic.write_tika(str(tmp_path / 'carmel.txt'), 200)
+    (tmp_path / 'garbled.txt').write_bytes(b'\xff\xfe\x00 not text \xc3\x28\n' * 10)
+    (tmp_path / 'other.txt').write_text('CA/001/004\n')
+    (tmp_path / 'folder.txt').mkdir()
+    records, report = process_directory(str(tmp_path), workers=1, towns={'other.txt': 'ZZ'})
+    assert records and report[str(tmp_path / 'carmel.txt')]['failure'] is None
+    assert isinstance(report[str(tmp_path / 'garbled.txt')]['failure'], UnicodeDecodeError)
+    assert isinstance(report[str(tmp_path / 'other.txt')]['failure'], KeyError)
+    assert isinstance(report[str(tmp_path / 'folder.txt')]['failure'], OSError)
+
+def test_duplicates_resolve_by_file_name(tmp_path):
+    synthetic.write_tika(str(tmp_path / 'a_carmel.txt'), 1500, seed=1)
+    synthetic.write_tika(str(tmp_path / 'b_carmel.txt'), 100, seed=2)   # same ids, done first
+    a, report_a = process_directory(str(tmp_path), pattern='a_*.txt', workers=1)
+    b, report_b = process_directory(str(tmp_path), pattern='b_*.txt', workers=1)
+    for run in range(2):
+        records, report = process_directory(str(tmp_path), workers=2)
+        assert [r.name for r in records] == [r.name for r in a]
+        assert report[str(tmp_path / 'a_carmel.txt')]['duplicates'] == 0
+        assert report[str(tmp_path / 'b_carmel.txt')]['duplicates'] == len(b)
+
+def test_town_from_whole_words_of_the_file_name(tmp_path):
+    expected = {'carmel.txt': 'CA', 'Putnam_Valley-2017.txt': 'PV', 'pv.txt': 'PV',
+                'lake_carmel.txt': 'KE', 'mahopac_falls.txt': 'CA', 'cascade.txt': 'PA',
+                'kentucky.txt': 'SE', 'unknown.txt': None}
+    contents = {'lake_carmel.txt': 'KE/001/002', 'mahopac_falls.txt': 'CA/003/001',
+                'cascade.txt': 'PA/001/001', 'kentucky.txt': 'SE/002/004'}
+    for name, town in expected.items():
+        (tmp_path / name).write_text(contents.get(name, 'no codes') + '\n')
+        assert detect_town(str(tmp_path / name)) == town, name
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Summarising an export in parallel chunks and merging gives what one pass over
+it gives.
+
+    python -m pytest -q test_cohorts.py
+"""
+from datetime import date
+import synthetic
+from voter_reader import iter_voters
+from cohorts import CohortStats, cohort_stats, cohort_stats_parallel
+
+AS_OF = date(2017, 6, 1)
+BY = ('town', 'affiliation', 'age')
+
+
+def test_merged_halves_match_one_pass(tmp_path):
+    fn = str(tmp_path / 'export.csv')
+    synthetic.write_export(fn, 3000)
+    voters = list(iter_voters(fn))
+    whole = CohortStats(BY, AS_OF).add_all(voters)
+    merged = CohortStats(BY, AS_OF).add_all(voters[:1000]).merge(
+        CohortStats(BY, AS_OF).add_all(voters[1000:]))
+    assert merged.elections == whole.elections
+    assert merged.rows(elections=['GE16', 'PE17']) == whole.rows(elections=['GE16', 'PE17'])
+
+def test_parallel_matches_one_pass(tmp_path):
+    fn = str(tmp_path / 'export.csv')
+    synthetic.write_export(fn, 20000)
+    for by in (BY, ('ward',)):
+        expected = cohort_stats(fn, by, AS_OF)
+        stats = cohort_stats_parallel(fn, by, AS_OF, workers=2)
+        assert len(stats) == len(expected) and stats.latest_general() == expected.latest_general()
+        assert stats.rows() == expected.rows(), by
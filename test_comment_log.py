@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Comments reach the disk within max_delay, and logs read what others compact,
+however the compaction interleaves with their reading.
+
+    python -m pytest -q test_comment_log.py
+"""
+import time
+from comment_log import CommentLog
+
+DISTRICT = ('CA', '001', '004')
+
+
+def count(d):
+    "The comments a new log over d reads."
+    with CommentLog(d, writer='reader') as reader:
+        return len(reader)
+
+def compact(d):
+    with CommentLog(d, writer='c') as c:
+        return c.compact()
+
+
+def test_max_delay_without_further_adds(tmp_path):
+    d = str(tmp_path)
+    with CommentLog(d, author='a', max_delay=0.1) as log:
+        for flush in (True, False):
+            log.add('NY1', 'not home', district=DISTRICT, flush=flush)
+            time.sleep(0.5)
+            assert count(d) == len(log)
+
+def test_buffer_only_adds_are_written_in_batches(tmp_path):
+    d = str(tmp_path)
+    with CommentLog(d, author='a', batch_size=10, max_delay=60) as log:
+        for i in range(9):
+            log.add('NY%d' % i, 'hello', flush=False)
+        time.sleep(0.2)
+        assert count(d) == 0
+        log.add('NY9', 'hello', flush=False)
+        time.sleep(0.2)
+        assert count(d) == 10
+        for i in range(10, 25):
+            log.add('NY%d' % i, 'hello', flush=False)
+    assert count(d) == 25
+
+def test_refresh_reads_segments_compacted_since(tmp_path):
+    d = str(tmp_path)
+    with CommentLog(d, writer='w', batch_size=1, max_segment_bytes=1) as w:
+        w.add('NY0', 'hello', district=DISTRICT)
+        with CommentLog(d, writer='r') as reader:
+            assert len(reader) == 1
+            for i in (1, 2, 3):
+                w.add('NY%d' % i, 'hello', district=DISTRICT)
+            w.close()
+            assert compact(d) == 3
+            assert reader.refresh() == 3
+            assert len(reader) == 4
+            assert [c.voter_id for c in reader.district_since(*DISTRICT)] == ['NY0', 'NY1', 'NY2', 'NY3']
+            assert reader.refresh() == 0
+
+def test_refresh_when_compacted_between_listing_and_reading(tmp_path):
+    d = str(tmp_path)
+    with CommentLog(d, writer='w', batch_size=1, max_segment_bytes=1) as w:
+        for i in range(5):
+            w.add('NY%d' % i, 'hello', district=DISTRICT)
+    with CommentLog(d, writer='r') as reader:
+        with CommentLog(d, writer='w', batch_size=1, max_segment_bytes=1) as w:
+            for i in range(5, 8):
+                w.add('NY%d' % i, 'hello', district=DISTRICT)
+        listed = reader._segments()
+        compact(d)
+        reader._segments = lambda: listed         # as if listed just before the compaction
+        assert reader.refresh() == 3
+        assert len(reader) == 8 and set(reader.offsets) < set(listed)
+    assert count(d) == 8
+
+def test_replay_when_compacted_before_listing(tmp_path, monkeypatch):
+    d = str(tmp_path)
+    with CommentLog(d, writer='w', batch_size=1, max_segment_bytes=1) as w:
+        for i in range(5):
+            w.add('NY%d' % i, 'hello')
+    segments = CommentLog._segments
+    def compacting_first(log):                 # a compaction lands just before the listing
+        if log.writer == 'r':
+            compact(d)
+        return segments(log)
+    monkeypatch.setattr(CommentLog, '_segments', compacting_first)
+    with CommentLog(d, writer='r') as reader:
+        assert len(reader) == 5
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Ingesting the next export gives the Changeset between the two, and
+TurnoutAggregates kept current from it equal those recomputed from scratch.
+
+    python -m pytest -q test_delta_ingest.py
+"""
+import csv
+import random
+import synthetic
+from delta_ingest import Snapshot, TurnoutAggregates, fingerprint
+
+
+def write(fn, rows):
+    with open(fn, 'w', newline='') as fp:
+        csv.writer(fp, delimiter=',', quotechar='|').writerows(rows)
+
+def next_export(rows, new_election=False, seed=1):
+    "rows, with some removed, some with changed histories or affiliations, and some added."
+    rnd = random.Random(seed)
+    rows = [list(r) for r in rows]
+    removed = set(rnd.sample(range(len(rows)), 100))
+    changed = rnd.sample([i for i in range(len(rows)) if i not in removed], 200)
+    for k, i in enumerate(changed):
+        if k % 3 == 0:
+            rows[i][-2] = rows[i][-2][4:]            # drop the latest vote
+        elif k % 3 == 1:
+            rows[i][-2] = 'GE17' + rows[i][-2].replace('GE17', '')
+        else:
+            rows[i][26] = 'REP' if rows[i][26] != 'REP' else 'DEM'
+    if new_election:
+        rows[changed[1]][-2] = 'SP17' + rows[changed[1]][-2]
+    added = []
+    for i, row in enumerate(synthetic.export_rows(150, seed=seed, malformed=0)):
+        row[0] = 'NY%013d' % (20000000 + i)
+        added.append(row)
+    return [r for i, r in enumerate(rows) if i not in removed] + added
+
+def check_against_recompute(tmp_path, new_election):
+    rows = list(synthetic.export_rows(2000, malformed=0.02))
+    write(str(tmp_path / 'july.csv'), rows)
+    write(str(tmp_path / 'august.csv'), next_export(rows, new_election))
+    snap = Snapshot.from_file(str(tmp_path / 'july.csv'))
+    agg = TurnoutAggregates(snap.voters.values(), this_year=2017)
+    changes = snap.ingest(str(tmp_path / 'august.csv'))
+    assert (len(changes.added), len(changes.removed)) == (150, 100)
+    assert 150 <= len(changes.modified) <= 200
+    agg.apply(changes)
+    assert ('SP' in agg.elections()[2017]) == new_election
+    fresh = TurnoutAggregates(snap.voters.values(), this_year=2017)
+    assert agg.elections() == fresh.elections()
+    assert agg.held == fresh.held
+    assert agg.votes == fresh.votes
+    assert set(agg.eff) == set(fresh.eff)
+    assert all(abs(agg.eff[vid] - x) < 1e-12 for vid, x in fresh.eff.items())
+    for party, n in fresh.counts.items():
+        assert agg.counts[party] == n
+        assert abs(agg.sums[party] - fresh.sums[party]) < 1e-9
+    assert agg.avg_efficiency_by_party() == fresh.avg_efficiency_by_party()
+
+def test_apply_matches_recompute(tmp_path):
+    check_against_recompute(tmp_path, new_election=False)
+
+def test_apply_matches_recompute_when_elections_held_change(tmp_path):
+    check_against_recompute(tmp_path, new_election=True)
+
+def test_fingerprint_separates_fields():
+    assert fingerprint(['a\x1fb', 'c']) != fingerprint(['a', 'b\x1fc'])
+    assert fingerprint(['a', 'b']) == fingerprint(['a', 'b'])
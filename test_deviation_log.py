@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+A DeviationLog gives back the deviations each Voter held, and counts them as
+counting the per-row sets does.
+
+    python -m pytest -q test_deviation_log.py
+"""
+from collections import Counter
+import synthetic
+from voter_reader import Voter, NO_DEVIATIONS, iter_voters
+from deviation_log import DeviationLog, offending_value
+
+
+def voters(n=3000):
+    return [Voter(row) for row in synthetic.export_rows(n, malformed=0.1)]
+
+def test_for_row_matches_the_voters_sets():
+    vs = voters()
+    log = DeviationLog.from_voters(vs)
+    assert log.num_rows == len(vs)
+    assert sum(len(v.deviations) for v in vs) == len(log) > 0
+    for i, v in enumerate(vs):
+        assert log.for_row(i) == v.deviations, i
+        if not v.deviations:
+            assert log.for_row(i) is NO_DEVIATIONS
+    assert log.for_row(len(vs) + 5) is NO_DEVIATIONS
+
+def test_collect_detaches_what_for_row_gives_back(tmp_path):
+    fn = str(tmp_path / 'export.csv')
+    synthetic.write_export(fn, 2000, malformed=0.1)
+    expected = {i: set(d) for i, v, d in iter_voters(fn)}
+    log = DeviationLog()
+    for i, v, d in log.collect(iter_voters(fn), detach=True):
+        assert v.deviations is NO_DEVIATIONS
+    assert log.num_rows == len(expected)
+    assert all(log.for_row(i) == d for i, d in expected.items())
+
+def test_aggregates_match_counting_the_sets():
+    vs = voters()
+    log = DeviationLog.from_voters(vs)
+    devs = [d for v in vs for d in v.deviations]
+    assert log.counts() == Counter(d[:2] for d in devs)
+    assert log.counts(by='field') == Counter(d[1] for d in devs)
+    for kind, field in log.kinds:
+        rows = [i for i, v in enumerate(vs) if any(d[:2] == (kind, field) for d in v.deviations)]
+        assert log.rows_with(kind, field).tolist() == rows
+        values = Counter(offending_value(d[2:]) for d in devs if d[:2] == (kind, field))
+        assert sorted(log.top_values(kind, field, n=len(values))) == sorted(values.items())
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+The hashed audience is the same on any number of workers, and is split into
+files of at most max_bytes.
+
+    python -m pytest -q test_extractor.py
+"""
+import os
+import synthetic
+from datetime import date
+from voter_reader import Voter
+from extractor import write_audience, iter_audience, normalize_audience, sha256, FIELDNAMES
+
+
+def test_hashed_audience_on_workers():
+    voters = [Voter(row) for row in synthetic.export_rows(3000)]
+    today = date(2017, 6, 1)
+    expected = [[sha256(x) for x in row[:-1]] + row[-1:] for row in
+                (normalize_audience(v, today) for v in voters)]
+    for workers in (1, 2):
+        batches = list(iter_audience(voters, today, batch_size=500, workers=workers))
+        assert [len(b) for b in batches] == [500] * 6
+        assert [row for b in batches for row in b] == expected
+
+def test_audience_files_stay_under_max_bytes(tmp_path):
+    voters = [Voter(row) for row in synthetic.export_rows(4000)]
+    prefix = str(tmp_path / 'aud')
+    one = write_audience(prefix + '1', voters, today=date(2017, 6, 1), max_bytes=10**9)
+    files = write_audience(prefix, voters, today=date(2017, 6, 1), max_bytes=200000)
+    assert len(one) == 1 and len(files) > 1
+    assert all(os.path.getsize(fn) <= 200000 for fn in files)
+    header = ','.join(FIELDNAMES) + '\n'
+    rows = []
+    for fn in files:
+        with open(fn) as fp:
+            lines = fp.readlines()
+        assert lines[0] == header
+        rows.extend(lines[1:])
+    with open(one[0]) as fp:
+        assert rows == fp.readlines()[1:]
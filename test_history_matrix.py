@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+HistoryMatrix gives what the per-voter functions of voter_reader give, for
+histories within 1996-2017 (the span voter_reader.num_elections_since handles).
+
+    python -m pytest -q test_history_matrix.py
+"""
+import synthetic
+from voter_reader import (Voter, generate_all_elections, voting_efficiency,
+                          avg_voting_efficiency_by_party, rank_by_efficiency)
+from history_matrix import HistoryMatrix
+
+
+def voters_and_rows(n=3000):
+    "Voters with valid histories, all votes from 1996 on, and their rows."
+    voters, rows = [], []
+    for row in synthetic.export_rows(n):
+        v = Voter(row)
+        if type(v.history_codes) is list and all(c['year'] >= '96' or c['year'] <= '17'
+                                                 for c in v.history_codes):
+            voters.append(v)
+            rows.append(row)
+    return voters, rows
+
+def test_efficiency_matches_voting_efficiency():
+    voters, rows = voters_and_rows()
+    elecs = generate_all_elections(rows)
+    h = HistoryMatrix.from_rows(rows, this_year=2017)
+    assert h.elections_by_year() == {y + (1900 if y >= 96 else 2000): t for y, t in elecs.items()}
+    eff = h.efficiency()
+    for v, e in zip(voters, eff):
+        assert abs(voting_efficiency(v.history_codes, elecs) - e) < 1e-12, v
+    assert HistoryMatrix.from_voters(voters, this_year=2017).efficiency().tolist() == eff.tolist()
+
+def test_group_averages_and_ranking():
+    voters, rows = voters_and_rows()
+    elecs = generate_all_elections(rows)
+    h = HistoryMatrix.from_rows(rows, this_year=2017)
+    parties = ['DEM', 'REP', 'BLK', 'CON']
+    assert h.avg_voting_efficiency_by_party([v.affiliation for v in voters], parties) == \
+        avg_voting_efficiency_by_party(voters, elecs, parties)
+    assert h.rank_by_efficiency() == rank_by_efficiency(voters, elecs)
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+District walk lists, built apart (or in parallel) and merged, are the county
+walk list.
+
+    python -m pytest -q test_households.py
+"""
+import pytest
+import synthetic
+from voter_reader import Voter
+from clean import iter_records
+from households import walk_list, walk_lists, merge_walk_lists, walk_order
+
+
+def ids(r):
+    return r.voterid if hasattr(r, 'voterid') else r.voter_id
+
+def summary(households):
+    return [(h.key, [ids(r) for r in h.voters]) for h in households]
+
+def export_voters(n=4000):
+    voters = [Voter(row) for row in synthetic.export_rows(n)]
+    for v in voters[::40]:
+        v.address['street_name'] = ''                # unaddressed
+    for a, b in zip(voters[1:400:4], voters[3:400:4]):
+        b.address.update(a.address)                  # shared addresses
+        b.town, b.ward, b.dist = a.town, a.ward, a.dist
+    return voters
+
+def call_list_records(n=2000):
+    records = list(iter_records(synthetic.tika_lines(n), on_error=lambda kind, text: None))
+    for a, b in zip(records[1:400:4], records[3:400:4]):
+        b.address, b.zip, b.town_ward = a.address, a.zip, a.town_ward
+    return records
+
+@pytest.mark.parametrize('records', [export_voters(), call_list_records()], ids=['export', 'call list'])
+@pytest.mark.parametrize('workers', [None, 2])
+def test_merged_district_lists_are_the_walk_list(records, workers):
+    unaddressed, rest = [], []
+    expected = walk_list(records, unaddressed)
+    lists = walk_lists(records, workers=workers, unaddressed=rest)
+    assert all(h.district == d for d, hs in lists.items() for h in hs)
+    merged = list(merge_walk_lists(lists.values()))
+    assert summary(merged) == summary(expected)
+    assert sorted(map(ids, rest)) == sorted(map(ids, unaddressed))
+    assert sum(len(h) for h in expected) + len(unaddressed) == len(records)
+    assert any(len(h) > 1 for h in expected)
+    assert [h.sort_key for h in expected] == sorted(walk_order(h.key) for h in expected)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Ingest timings count the time spent reading, not the time the caller holds rows.
+
+    python -m pytest -q test_ingest_stats.py
+"""
+import time
+import synthetic
+import clean
+from voter_reader import iter_voters
+from ingest_stats import IngestStats
+
+PAUSE = 0.2
+
+
+def test_export_elapsed_excludes_the_caller(tmp_path):
+    fn = str(tmp_path / 'export.csv')
+    synthetic.write_export(fn, 500)
+    stats = IngestStats()
+    for ind, v, dev in iter_voters(fn, stats=stats):
+        if ind == 100:
+            time.sleep(PAUSE)
+    assert stats.rows == 500
+    assert stats.wall - stats.elapsed >= PAUSE * 0.9
+    assert stats.elapsed >= stats.decode_time + stats.parse_time
+
+def test_call_list_elapsed_excludes_the_caller(tmp_path):
+    fn = str(tmp_path / 'calllist.txt')
+    synthetic.write_tika(fn, 500)
+    stats = IngestStats()
+    with open(fn) as fp:
+        for i, r in enumerate(clean.iter_records(fp, on_error=lambda kind, text: None, stats=stats)):
+            if i == 100:
+                time.sleep(PAUSE)
+    assert stats.rows == stats.lines['records'] > 0
+    assert stats.wall - stats.elapsed >= PAUSE * 0.9
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+link_records finds the known links of a synthetic call list to its export: by
+id, by blocking where the ids differ, ambiguous where two voters are alike, and
+none for voters not in the export.
+
+    python -m pytest -q test_linkage.py
+"""
+import synthetic
+from clean import Voters
+from voter_reader import Voter
+from linkage import link_records, id_key
+
+N_ID, N_BLOCKED, N_TWINS, N_NEW = 1000, 600, 20, 200
+
+
+def call_list_record(v, voterid):
+    "The clean.Voters record the call list would have for the Voter v."
+    n, a = v.name, v.address
+    name = '{}, {}'.format(n['last_name'], n['first_name']).title() + \
+        (' ' + n['middle_name'] if n['middle_name'] else '')
+    street = a['street_name'].title().replace(' Rd', ' Road').replace(' St', ' Street')
+    return Voters({'town': v.town, 'ward': v.ward, 'district': v.dist}, voterid, name,
+                  '{} {}'.format(a['street_number'], street), ' {} '.format(a['city']),
+                  a['zip'], v.affiliation, '-', v.sex, dict(v.dob), dict(v.reg_date), 'Active')
+
+def synthetic_pair():
+    "(call list, export voters, expected export voter_id of each call list record, twin ids)."
+    rows = list(synthetic.export_rows(2000, seed=5, malformed=0))
+    voters = [Voter(r) for r in rows]
+    twins = {}
+    for k, row in enumerate(rows[N_ID + N_BLOCKED:N_ID + N_BLOCKED + N_TWINS]):
+        twin = Voter(['NY%013d' % (30000000 + k)] + row[1:])
+        twins[row[0]] = twin.voter_id
+        voters.append(twin)
+    calllist, truth = [], []
+    for i, v in enumerate(voters[:N_ID + N_BLOCKED + N_TWINS]):
+        voterid = id_key(v.voter_id) if i < N_ID else 90000000 + i
+        calllist.append(call_list_record(v, '%08d' % voterid))
+        truth.append(v.voter_id)
+    for i, row in enumerate(synthetic.export_rows(N_NEW, seed=6, malformed=0)):
+        v = Voter(['NY%013d' % (40000000 + i)] + row[1:])
+        calllist.append(call_list_record(v, '%08d' % (40000000 + i)))
+        truth.append(None)
+    return calllist, voters, truth, twins
+
+def test_links_match_the_known_truth():
+    calllist, voters, truth, twins = synthetic_pair()
+    link = link_records(calllist, voters)
+    assert link.counts() == {'id': N_ID, 'blocked': N_BLOCKED, 'ambiguous': N_TWINS, 'non_match': N_NEW}
+    expected = {id(r): t for r, t in zip(calllist, truth)}
+    for r, v, score, method in link.matches:
+        assert v.voter_id == expected[id(r)], (r, v, method)
+        assert (method == 'id') == (id_key(r.voterid) == id_key(v.voter_id))
+        assert score >= 0.8
+    for r, rivals in link.ambiguous:
+        v = expected[id(r)]
+        assert sorted(u.voter_id for u, score in rivals) == sorted([v, twins[v]])
+    assert all(expected[id(r)] is None for r in link.non_matches)
+
+def test_exact_ties_are_ambiguous_without_a_margin():
+    calllist, voters, truth, twins = synthetic_pair()
+    link = link_records(calllist, voters, margin=0)
+    assert link.counts()['ambiguous'] == N_TWINS      # the twins score exactly alike
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+write_ndjson writes what VoterEncoder writes, a line per voter, and compressed
+files split at their indexed batches read back whole.
+
+    python -m pytest -q test_ndjson_writer.py
+"""
+import json
+import pytest
+import synthetic
+from voter_reader import Voter, LazyVoter, VoterEncoder
+from ndjson_writer import encode, write_ndjson, read_ndjson, read_index
+
+
+def voters(n=1500):
+    return [Voter(row) for row in synthetic.export_rows(n, malformed=0.1)]
+
+def as_voter_encoder(v):
+    "v as json.dumps(v, cls=VoterEncoder) gives it, decoded (deviations as a sorted list)."
+    d = json.loads(json.dumps(v, cls=VoterEncoder))
+    d['deviations'] = sorted(d['deviations'], key=repr)
+    return d
+
+def test_encode_matches_voter_encoder():
+    vs = voters()
+    assert any(type(v.dob) is str for v in vs) and any(v.deviations for v in vs)
+    for v in vs:
+        line = encode(v)
+        assert '\n' not in line
+        assert json.loads(line) == as_voter_encoder(v)
+
+def test_lazy_voters_encode_as_voters():
+    for row in synthetic.export_rows(300, malformed=0.1):
+        assert encode(LazyVoter(row)) == encode(Voter(row))
+
+@pytest.mark.parametrize('compression,suffix', [(None, ''), ('gzip', '.gz'), ('zstd', '.zst')])
+def test_indexed_batches_read_back(tmp_path, compression, suffix):
+    if compression == 'zstd':
+        pytest.importorskip('zstandard')
+    vs = voters()
+    fn = str(tmp_path / ('voters.ndjson' + suffix))
+    assert write_ndjson(vs, fn, compression=compression, batch_size=400, index=True) == len(vs)
+    expected = [as_voter_encoder(v) for v in vs]
+    assert list(read_ndjson(fn)) == expected
+    idx = read_index(fn)
+    assert [(first, n) for offset, first, n in idx] == [(0, 400), (400, 400), (800, 400), (1200, 300)]
+    ends = [offset for offset, first, n in idx[1:]] + [None]
+    pieces = [list(read_ndjson(fn, start=offset, end=end)) for (offset, first, n), end in zip(idx, ends)]
+    assert [len(p) for p in pieces] == [n for offset, first, n in idx]
+    assert [d for p in pieces for d in p] == expected
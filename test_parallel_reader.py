@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Parallel parsing gives what iter_voters gives, however the file is chunked.
+
+    python -m pytest -q test_parallel_reader.py
+"""
+from collections import Counter
+import synthetic
+from voter_reader import iter_voters
+from parallel_reader import iter_voters_parallel, map_voters
+
+
+def parsed(items):
+    return [(x[0], x[1].__dict__) + tuple(x[2:]) for x in items]
+
+def count_affiliations(items):
+    return Counter(v.affiliation for ind, v, dev in items)
+
+
+def test_parallel_matches_serial(tmp_path):
+    fn = str(tmp_path / 'export.csv')
+    synthetic.write_export(fn, 2000, malformed=0.05)
+    expected = parsed(iter_voters(fn, keep_raw=True))
+    for chunks in (1, 3, 7, 50):
+        assert parsed(iter_voters_parallel(fn, workers=2, keep_raw=True, chunks=chunks)) == expected
+        unordered = parsed(iter_voters_parallel(fn, workers=2, ordered=False, chunks=chunks))
+        assert sorted(unordered, key=lambda x: x[0]) == [x[:3] for x in expected]
+
+def test_map_voters(tmp_path):
+    fn = str(tmp_path / 'export.csv')
+    synthetic.write_export(fn, 1000)
+    total = sum((c for first, c in map_voters(fn, count_affiliations, workers=2)), Counter())
+    assert total == count_affiliations(iter_voters(fn))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+A ParseCache gives what parsing gives, parses only on a miss, and misses when
+the export or the parser changes.
+
+    python -m pytest -q test_parse_cache.py
+"""
+import os
+import synthetic
+import parse_cache
+import voter_table
+from parse_cache import ParseCache, FIELDS_SUFFIX
+from voter_reader import NO_DEVIATIONS, iter_voters
+
+
+def export(tmp_path, n=1500, seed=0):
+    fn = str(tmp_path / 'export.csv')
+    synthetic.write_export(fn, n, seed=seed, malformed=0.05)
+    return fn
+
+def counting_parses(monkeypatch):
+    "Count the exports parse_cache parses."
+    parsed = []
+    def counted(fn, keep_raw=False):
+        parsed.append(fn)
+        return iter_voters(fn, keep_raw)
+    monkeypatch.setattr(parse_cache.voter_reader, 'iter_voters', counted)
+    return parsed
+
+def expected(fn):
+    return [(i, v.__dict__, d, row) for i, v, d, row in iter_voters(fn, keep_raw=True)]
+
+def cached(cache, fn):
+    return [(i, v.__dict__, d, row) for i, v, d, row in cache.iter_voters(fn, keep_raw=True)]
+
+def test_miss_then_hit(tmp_path, monkeypatch):
+    fn = export(tmp_path)
+    want = expected(fn)
+    parsed = counting_parses(monkeypatch)
+    cache = ParseCache(str(tmp_path / 'cache'))
+    assert cached(cache, fn) == want
+    assert parsed == [fn]
+    assert cached(cache, fn) == want
+    assert [(i, v.__dict__, d) for i, v, d in cache.iter_voters(fn)] == [w[:3] for w in want]
+    voters, rows = cache.read_file(fn)
+    assert [v.__dict__ for v in voters] == [w[1] for w in want]
+    assert rows == [w[3] for w in want]
+    assert parsed == [fn]
+
+def test_hit_shares_no_deviations(tmp_path):
+    fn = export(tmp_path)
+    cache = ParseCache(str(tmp_path / 'cache'))
+    list(cache.iter_voters(fn))
+    voters = [v for i, v, d in cache.iter_voters(fn)]
+    assert all(v.deviations is NO_DEVIATIONS for v in voters if not v.deviations)
+    assert any(v.deviations for v in voters)
+
+def test_changed_export_misses(tmp_path, monkeypatch):
+    fn = export(tmp_path)
+    cache = ParseCache(str(tmp_path / 'cache'))
+    list(cache.iter_voters(fn))
+    synthetic.write_export(fn, 1000, seed=1, malformed=0.05)
+    parsed = counting_parses(monkeypatch)
+    assert cached(cache, fn) == expected(fn)
+    assert parsed == [fn]
+
+def test_schema_version_bump_misses(tmp_path, monkeypatch):
+    fn = export(tmp_path)
+    cache = ParseCache(str(tmp_path / 'cache'))
+    list(cache.iter_voters(fn))
+    before = set(os.listdir(cache.cache_dir))
+    monkeypatch.setattr(parse_cache, 'SCHEMA_VERSION', 'bumped')
+    monkeypatch.setattr(voter_table, 'SCHEMA_VERSION', 'bumped')
+    parsed = counting_parses(monkeypatch)
+    assert cached(cache, fn) == expected(fn)
+    assert parsed == [fn]
+    assert len(set(os.listdir(cache.cache_dir)) - before) == 2
+
+def test_missing_fields_file_reparses(tmp_path, monkeypatch):
+    fn = export(tmp_path)
+    cache = ParseCache(str(tmp_path / 'cache'))
+    list(cache.iter_voters(fn))
+    for path, size, used in cache.entries():
+        if path.endswith(FIELDS_SUFFIX):
+            os.remove(path)
+    parsed = counting_parses(monkeypatch)
+    assert [(i, v.__dict__, d) for i, v, d in cache.iter_voters(fn)] == [w[:3] for w in expected(fn)]
+    assert parsed == [fn]
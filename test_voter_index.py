@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Indexed lookups find what scanning the records finds, and typo tolerant lookups
+find what the module doc says they do.
+
+    python -m pytest -q test_voter_index.py
+"""
+import synthetic
+import voter_index
+from voter_reader import Voter
+from voter_index import VoterIndex, normalize
+
+VOTERS = [Voter(row) for row in synthetic.export_rows(5000)]
+IX = VoterIndex(VOTERS)
+
+
+def test_by_id():
+    v = VOTERS[1234]
+    assert IX.by_id(v.voter_id) is v
+    assert IX.by_id('NY999') is None
+
+def test_last_name_prefix_matches_scan():
+    for p in ('SMI', 'o', 'ZZZ', ''):
+        expected = sorted((normalize(v.name['last_name']), i) for i, v in enumerate(VOTERS)
+                          if normalize(v.name['last_name']).startswith(normalize(p)))
+        assert IX.last_name_prefix(p) == [VOTERS[i] for last, i in expected], p
+
+def test_search_matches_scan():
+    for s, field in (('ILL', 'name'), ('john', 'name'), ('LAKE', 'street'), ('OA', 'street'),
+                     ('NO SUCH', 'name')):
+        text = (lambda v: v.get_name()) if field == 'name' else (lambda v: v.address['street_name'])
+        expected = [v for v in VOTERS if normalize(s) in normalize(text(v))]
+        assert IX.search(s, field=field) == expected, s
+
+def test_district_matches_scan():
+    v = VOTERS[0]
+    assert IX.district(v.town) == [u for u in VOTERS if u.town == v.town]
+    assert IX.district(v.town, v.ward) == [u for u in VOTERS if (u.town, u.ward) == (v.town, v.ward)]
+    assert IX.district(v.town, v.ward, v.dist) == \
+        [u for u in VOTERS if (u.town, u.ward, u.dist) == (v.town, v.ward, v.dist)]
+    assert IX.district('XX') == []
+
+def test_fuzzy_finds_transposed_typos():
+    found = IX.fuzzy('SMTIH JON')
+    assert found and all(v.get_name().startswith('SMITH,JOHN') for v, score in found[:3])
+
+def test_fuzzy_street_typo():
+    street = VOTERS[0].address['street_name']
+    typo = street[:2] + street[3] + street[2] + street[4:]
+    found = IX.fuzzy(typo, field='street')
+    assert found and found[0][0].address['street_name'] == street
+
+def test_probing_long_postings_keeps_the_results(monkeypatch):
+    for s, threshold in (('SMTIH JON', 0.2), ('MARIA GARCA', 0.3), ('WILLAIMS', 0.5)):
+        expected = IX.fuzzy(s, threshold=threshold, max_postings=len(VOTERS))
+        for cost in (0, 10**9):              # always probe, never probe
+            monkeypatch.setattr(voter_index, 'PROBE_COST', cost)
+            assert IX.fuzzy(s, threshold=threshold, max_postings=0) == expected, (s, cost)
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+The compiled parser (and LazyVoter) against the set_item, set_patt,
+set_YYYYMMDD and set_history_codes checks it replaced, on fuzzed rows.
+
+    python -m pytest -q test_voter_reader.py
+"""
+import json
+import random
+import synthetic
+from voter_reader import (Voter, LazyVoter, VOTER_FIELDS, NO_DEVIATIONS, set_item, set_patt,
+                          set_YYYYMMDD, set_history_codes, VoterEncoder, read_file, iter_voters,
+                          write_json)
+
+# Values that stress the checks: empty, over-long, non-ASCII digits, near-misses.
+FUZZ = ['', ' ', 'X', 'M', 'F', 'Y', 'N', 'A', 'P', 'YN', '123', '1234', '12345', '123456789',
+        '555-1234', '-', '555-', '-1234', '20170229', '19990101', '2017010', '201701011',
+        '２０１７０１０１', '١٢٣٤٥', '12a45', 'GE16', 'GE16PE1', 'GE16PE17', 'GE16*', 'ÉÉÉÉ',
+        'A' * 50, '\t', 'NY000000000012345']
+
+
+def reference(l):
+    "What a Voter's __dict__ was, built field by field by the set_* checks."
+    d = {}
+    dev = set()
+    for group, attr, col, check in VOTER_FIELDS:
+        obj = d
+        for g in ([] if group is None else group.split('.')):
+            if type(obj.get(g)) is not dict:
+                obj[g] = {}
+            obj = obj[g]
+        v = l[col[0]:col[1]] if type(col) is tuple else l[col]
+        kind = check[0]
+        if kind == 'chars':
+            dev |= set_item(obj, attr, check[1], v)
+        elif kind == 'patt':
+            dev |= set_patt(obj, attr, check[1], v)
+        elif kind == 'date':
+            dev |= set_YYYYMMDD(obj, attr, v)
+        else:
+            dev |= set_history_codes(obj, attr, v)
+    d['deviations'] = dev
+    return d
+
+def fuzzed_rows(n, seed=0):
+    rnd = random.Random(seed)
+    for row in synthetic.export_rows(n, seed=seed, malformed=0.05):
+        for i in rnd.sample(range(len(row)), rnd.randrange(4)):
+            row[i] = rnd.choice(FUZZ)
+        yield row
+
+
+def test_compiled_parser_matches_set_checks():
+    for row in fuzzed_rows(3000):
+        assert Voter(row).__dict__ == reference(row), row
+
+def test_clean_rows_share_no_deviations():
+    voters = [Voter(row) for row in synthetic.export_rows(20, malformed=0)]
+    clean = [v for v in voters if not v.deviations]
+    assert clean and all(v.deviations is NO_DEVIATIONS for v in clean)
+
+def test_lazy_voter_matches_voter():
+    for row in fuzzed_rows(1000, seed=1):
+        v = Voter(row)
+        assert LazyVoter(row).to_dict() == v.__dict__
+        lazy = LazyVoter(row)
+        assert lazy.deviations == v.deviations        # validating first, then decoding
+        assert lazy.to_dict() == v.__dict__
+
+def test_short_rows_are_rejected():
+    row = next(synthetic.export_rows(1))[:20]
+    for cls in (Voter, LazyVoter):
+        try:
+            cls(row)
+        except IndexError:
+            continue
+        assert False, cls
+
+def test_write_json_streams_what_json_dump_writes(tmp_path):
+    fn = str(tmp_path / 'export.csv')
+    synthetic.write_export(fn, 300, malformed=0.05)
+    voters, rows = read_file(fn)
+    assert len(voters) == len(rows) == 300
+    out = str(tmp_path / 'voters.json')
+    write_json(iter_voters(fn), out)
+    with open(out) as fp:
+        assert fp.read() == json.dumps(voters, cls=VoterEncoder, ensure_ascii=False, indent=4,
+                                       sort_keys=True)
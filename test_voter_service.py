@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+The service over a small synthetic export, through a real socket.
+
+    python -m pytest -q test_voter_service.py
+"""
+import json
+import time
+import asyncio
+import synthetic
+from voter_reader import Voter
+from comment_log import CommentLog
+from voter_service import VoterService
+
+VOTERS = [Voter(row) for row in synthetic.export_rows(500)]
+
+
+async def request(reader, writer, method, path, body=b''):
+    "(status, json body) of one request on a keep-alive connection."
+    writer.write('{} {} HTTP/1.1\r\nContent-Length: {}\r\n\r\n'.format(
+        method, path, len(body)).encode('latin-1') + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        h = await reader.readline()
+        if h == b'\r\n':
+            break
+        k, _, v = h.decode('latin-1').partition(':')
+        if k.lower() == 'content-length':
+            length = int(v)
+    return status, json.loads(await reader.readexactly(length))
+
+def serve(service, requests, refresh_interval=None):
+    """
+    Run requests (a coroutine function of (reader, writer)) against service,
+    refreshing its comments every refresh_interval seconds if given; returns
+    the result of requests.
+    """
+    async def main():
+        server = await asyncio.start_server(service.handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        refresher = None
+        if refresh_interval is not None:
+            refresher = asyncio.create_task(service.refresh_comments(refresh_interval))
+        try:
+            return await requests(reader, writer)
+        finally:
+            if refresher is not None:
+                refresher.cancel()
+            writer.close()
+            server.close()
+    return asyncio.run(main())
+
+
+def test_posted_comments_reach_the_disk(tmp_path):
+    d = str(tmp_path)
+    v = VOTERS[0]
+
+    async def post(reader, writer):
+        return await request(reader, writer, 'POST', '/voters/%s/comments' % v.voter_id,
+                             json.dumps({'text': 'not home'}).encode())
+    with CommentLog(d, author='a', max_delay=0.1) as log:
+        status, c = serve(VoterService(VOTERS, log), post)
+        assert status == 201 and c['voter_id'] == v.voter_id
+        time.sleep(0.5)
+        with CommentLog(d, writer='reader') as reader:
+            assert [x.id for x in reader.for_voter(v.voter_id)] == [c['id']]
+
+def test_posts_need_text_and_a_string_author(tmp_path):
+    path = '/voters/%s/comments' % VOTERS[0].voter_id
+    bodies = [{'author': 'a'}, {'text': ''}, {'text': '  '}, {'text': 5}, {'text': ['x']},
+              {'text': 'hi', 'author': 7}, {'text': 'hi', 'author': {'name': 'a'}}, ['text'], 'text']
+
+    async def posts(reader, writer):
+        out = [await request(reader, writer, 'POST', path, json.dumps(b).encode()) for b in bodies]
+        out.append(await request(reader, writer, 'POST', path, b'{not json'))
+        out.append(await request(reader, writer, 'POST', path, json.dumps({'text': 'hi'}).encode()))
+        return out
+    with CommentLog(str(tmp_path), author='a') as log:
+        results = serve(VoterService(VOTERS, log), posts)
+        assert [s for s, b in results] == [400] * (len(bodies) + 1) + [201]
+        assert len(log) == 1
+
+def test_comments_from_other_writers_are_served(tmp_path):
+    d = str(tmp_path)
+    v = VOTERS[2]
+    path = '/voters/%s/comments' % v.voter_id
+
+    async def requests(reader, writer):
+        before = await request(reader, writer, 'GET', path)
+        with CommentLog(d, author='b', writer='other') as other:
+            other.add(v.voter_id, 'moved away')
+        await asyncio.sleep(0.5)
+        return before, await request(reader, writer, 'GET', path)
+    with CommentLog(d, author='a') as log:
+        (s1, b1), (s2, b2) = serve(VoterService(VOTERS, log), requests, refresh_interval=0.05)
+    assert (s1, b1) == (200, [])
+    assert s2 == 200 and [(c['author'], c['text']) for c in b2] == [('b', 'moved away')]
+
+def test_paging_rejects_negative_offset_and_limit():
+    town = VOTERS[0].town
+
+    async def pages(reader, writer):
+        return [await request(reader, writer, 'GET', '/voters?town={}&{}'.format(town, q))
+                for q in ('limit=-1', 'offset=-5', 'limit=0', 'limit=x', 'offset=2&limit=3', 'limit=5000')]
+    (s1, b1), (s2, b2), (s3, b3), (s4, b4), (s5, b5), (s6, b6) = serve(VoterService(VOTERS), pages)
+    assert (s1, s2, s3, s4) == (400, 400, 400, 400)
+    assert s5 == 200 and b5['offset'] == 2 and len(b5['results']) == 3
+    assert s6 == 200 and b6['limit'] == 1000 and len(b6['results']) == b6['total']
+
+def test_unexpected_errors_get_a_500(capsys):
+    service = VoterService(VOTERS)
+
+    def broken(query):
+        raise RuntimeError('index gone')
+    service.select = broken
+
+    async def requests(reader, writer):
+        return [await request(reader, writer, 'GET', path)
+                for path in ('/voters?town=CA', '/voters/' + VOTERS[1].voter_id)]
+    (s1, b1), (s2, b2) = serve(service, requests)
+    assert s1 == 500 and b1 == {'error': 'internal error'}
+    assert s2 == 200                  # the connection is still usable
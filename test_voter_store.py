@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Voters come back from a VoterStore as they were parsed from the export.
+
+    python -m pytest -q test_voter_store.py
+"""
+import synthetic
+from voter_reader import iter_voters
+from voter_store import VoterStore
+
+
+def test_round_trip(tmp_path):
+    fn = str(tmp_path / 'export.csv')
+    synthetic.write_export(fn, 2000, malformed=0.05)
+    voters = {v.voter_id: v for ind, v, dev in iter_voters(fn)}
+    with VoterStore(str(tmp_path / 'voters.db')) as store:
+        assert store.load_file(fn) == len(voters)
+        assert len(store) == len(voters)
+        for v in store.where('1'):
+            assert v.__dict__ == voters[v.voter_id].__dict__
+
+def test_upsert_keeps_raw_only_columns(tmp_path):
+    fn = str(tmp_path / 'export.csv')
+    synthetic.write_export(fn, 200, malformed=0)
+    with VoterStore(str(tmp_path / 'voters.db')) as store:
+        store.load_file(fn)
+        before = {v.voter_id: v.__dict__ for v in store.where('1')}
+        store.upsert(v for ind, v, dev in iter_voters(fn))       # Voters alone lack the raw absentee
+        assert {v.voter_id: v.__dict__ for v in store.where('1')} == before
+
+def test_where_takes_values_as_params(tmp_path):
+    fn = str(tmp_path / 'export.csv')
+    synthetic.write_export(fn, 1000, malformed=0)
+    voters = [v for ind, v, dev in iter_voters(fn)]
+    with VoterStore(str(tmp_path / 'voters.db')) as store:
+        store.load_file(fn)
+        found = store.where('affiliation = ? AND dob < ? ORDER BY voter_id', ('DEM', '1950-01-01'))
+        assert [v.voter_id for v in found] == sorted(
+            v.voter_id for v in voters if v.affiliation == 'DEM' and
+            (v.dob['year'], v.dob['month'], v.dob['day']) < (1950, 1, 1))
+        assert list(store.where('name_last_name = ?', ("X' OR '1'='1",))) == []
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+A VoterTable holds what the Voters it was built from hold, and saves and loads
+without loss.
+
+    python -m pytest -q test_voter_table.py
+"""
+from collections import Counter
+import numpy as np
+import synthetic
+from voter_reader import Voter, LazyVoter, iter_voters
+from voter_table import VoterTable, pack_row, unpack_row, ROW_SEP, ROW_ESC
+
+
+def export(tmp_path, n=2000):
+    fn = str(tmp_path / 'export.csv')
+    synthetic.write_export(fn, n, malformed=0.05)
+    return fn
+
+def test_save_load_round_trip(tmp_path):
+    fn = export(tmp_path)
+    t = VoterTable.from_file(fn)
+    t.save(str(tmp_path / 'table.vt'), meta={'source': fn})
+    u = VoterTable.load(str(tmp_path / 'table.vt'))
+    assert set(u.columns) == set(t.columns)
+    for name, c in t.columns.items():
+        assert np.array_equal(u.columns[name], c), name
+    assert np.array_equal(u.index, t.index)
+    assert list(u.rows()) == list(t.rows())
+    assert [v.__dict__ for v in u.to_voters()] == [v.__dict__ for i, v, d in iter_voters(fn)]
+
+def test_from_lazy_voters(tmp_path):
+    fn = export(tmp_path)
+    t = VoterTable.from_file(fn)
+    lazy = [(i, LazyVoter(row), d, row) for i, v, d, row in iter_voters(fn, keep_raw=True)]
+    u = VoterTable.from_stream((i, v, v.deviations, row) for i, v, d, row in lazy)
+    for name, c in t.columns.items():
+        assert np.array_equal(u.columns[name], c), name
+    assert list(u.rows()) == list(t.rows())
+
+def test_crosstab_matches_counting(tmp_path):
+    fn = export(tmp_path)
+    t = VoterTable.from_file(fn)
+    expected = Counter((v.affiliation, v.town) for i, v, d in iter_voters(fn))
+    rows, cols, counts = t.crosstab('affiliation', 'town')
+    got = {(r, c): int(counts[i, j]) for i, r in enumerate(rows) for j, c in enumerate(cols)
+           if counts[i, j]}
+    assert got == dict(expected)
+    assert t.group_counts('affiliation', 'town') == dict(expected)
+
+def test_fields_holding_the_separator_round_trip(tmp_path):
+    rows = [['a' + ROW_SEP + 'b', 'c'], ['a', 'b' + ROW_SEP + 'c'], [ROW_ESC + '_', ROW_ESC],
+            [ROW_ESC + ROW_ESC + ROW_SEP, ''], ['plain', 'row']]
+    assert [unpack_row(pack_row(r)) for r in rows] == rows
+    assert len(set(pack_row(r) for r in rows)) == len(rows)
+    row = next(synthetic.export_rows(1, malformed=0))
+    row[7] = 'MAIN' + ROW_SEP + 'ST'
+    t = VoterTable.from_stream([(0, Voter(row), Voter(row).deviations, row)])
+    t.save(str(tmp_path / 'table.vt'))
+    assert list(VoterTable.load(str(tmp_path / 'table.vt')).rows()) == [row]
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Indexes over parsed voter records, so lookups do not scan the county.
+
+Works over voter_reader.Voter records (the BoE export) and clean.Voters records
+(the call lists), or a mix of both. One pass over the records builds
+    - hash indexes on the voter id, and on town, town/ward and town/ward/dist;
+    - sorted indexes on last name and street name, for prefix queries;
+    - trigram indexes on name and street, for substring and typo tolerant queries.
+Queries return records (in the order of the list the index was built over).
+
+    ix = VoterIndex(voters)
+    ix.by_id('NY000000000123')
+    ix.district('CA', '001')
+    ix.last_name_prefix('SMI')
+    ix.search('CROTON', field='street')
+    ix.fuzzy('SMTIH JON')
+"""
+import re
+import math
+import pickle
+import hashlib
+from bisect import bisect_left
+from collections import Counter
+
+INDEX_VERSION = 1
+FIELDS = ('name', 'street')
+HOUSE_NUMBER = re.compile(r'^\s*\d+\S*\s+')
+PUNCTUATION = re.compile(r'[^\w\s]+')
+FUZZY_THRESHOLD = 0.2      # 'SMTIH JON' scores 0.24 against SMITH,JOHN
+MAX_POSTINGS = 5000        # fuzzy may probe, rather than scan, posting lists longer than this (e.g. '  S')
+PROBE_COST = 16            # a probe (bisect) costs about as much as scanning this many postings
+
+
+def normalize(s):
+    "Upper case, punctuation dropped, single spaced."
+    return ' '.join(PUNCTUATION.sub(' ', s.upper()).split())
+
+def trigrams(s):
+    "The set of trigrams of s, padded so that short strings have some."
+    s = '  ' + s + ' '
+    return set(s[i:i+3] for i in range(len(s) - 2))
+
+def record_id(r):
+    return r.voterid if hasattr(r, 'voterid') else r.voter_id
+
+def record_keys(r):
+    """
+    (id, last name, full name, street name, (town, ward, dist)) for a
+    voter_reader.Voter or a clean.Voters record.
+    """
+    if hasattr(r, 'voterid'):                # clean.Voters, from a call list
+        tw = r.town_ward
+        last = r.name.split(',')[0]
+        return (r.voterid, normalize(last), normalize(r.name),
+                normalize(HOUSE_NUMBER.sub('', r.address)),
+                (tw['town'], tw['ward'], tw['district']))
+    return (r.voter_id, normalize(r.name['last_name']), normalize(r.get_name()),
+            normalize(r.address['street_name']), (r.town, r.ward, r.dist))
+
+
+class SortedIndex:
+    "Keys in sorted order, with the position of the record for each, for prefix queries."
+    def __init__(self, pairs):
+        pairs = sorted(pairs)
+        self.keys = [k for k, p in pairs]
+        self.positions = [p for k, p in pairs]
+
+    def prefix(self, p):
+        "Positions of the records whose key starts with p."
+        lo = bisect_left(self.keys, p)
+        hi = bisect_left(self.keys, p + '\U0010ffff', lo)
+        return self.positions[lo:hi]
+
+
+class VoterIndex:
+    "The indexes over records (a list of Voter and/or clean.Voters)."
+    def __init__(self, records, _state=None):
+        self.records = records
+        if _state is not None:
+            self.__dict__.update(_state)
+            return
+        self.ids = {}
+        self.districts = {}
+        self.trigrams = {f: {} for f in FIELDS}
+        self.texts = {f: [] for f in FIELDS}         # normalized field text, by position
+        self.num_grams = {f: [] for f in FIELDS}     # size of its trigram set, by position
+        last_names, streets = [], []
+        for i, r in enumerate(records):
+            vid, last, name, street, (town, ward, dist) = record_keys(r)
+            self.ids[vid] = i
+            for key in ((town,), (town, ward), (town, ward, dist)):
+                self.districts.setdefault(key, []).append(i)
+            last_names.append((last, i))
+            streets.append((street, i))
+            for f, text in (('name', name), ('street', street)):
+                grams = trigrams(text)
+                self.texts[f].append(text)
+                self.num_grams[f].append(len(grams))
+                postings = self.trigrams[f]
+                for g in grams:
+                    postings.setdefault(g, []).append(i)
+        self.last_names = SortedIndex(last_names)
+        self.streets = SortedIndex(streets)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __repr__(self):
+        return "<VoterIndex {} records>".format(len(self))
+
+    def _records(self, positions):
+        return [self.records[i] for i in positions]
+
+    def by_id(self, voter_id):
+        "The record with voter_id, or None."
+        i = self.ids.get(voter_id)
+        return None if i is None else self.records[i]
+
+    def district(self, town, ward=None, dist=None):
+        "Records in town, or in its ward, or in its ward and election district."
+        key = (town,) if ward is None else (town, ward) if dist is None else (town, ward, dist)
+        return self._records(self.districts.get(key, []))
+
+    def last_name_prefix(self, p):
+        "Records whose last name starts with p, ordered by last name."
+        return self._records(self.last_names.prefix(normalize(p)))
+
+    def street_prefix(self, p):
+        "Records whose street name (without house number) starts with p, ordered by street."
+        return self._records(self.streets.prefix(normalize(p)))
+
+    def search(self, s, field='name'):
+        "Records whose field ('name' or 'street') contains s."
+        s = normalize(s)
+        grams = set(s[i:i+3] for i in range(len(s) - 2)) or None
+        if grams is None:                    # too short for trigrams; check every record
+            candidates = range(len(self.records))
+        else:
+            postings = sorted((self.trigrams[field].get(g, []) for g in grams), key=len)
+            candidates = set(postings[0])
+            for p in postings[1:]:
+                candidates.intersection_update(p)
+                if not candidates:
+                    break
+            candidates = sorted(candidates)
+        texts = self.texts[field]
+        return [self.records[i] for i in candidates if s in texts[i]]
+
+    def fuzzy(self, s, field='name', limit=10, threshold=FUZZY_THRESHOLD, max_postings=MAX_POSTINGS):
+        """
+        Up to limit (record, score) pairs for the records whose field is most
+        similar to s, best first; score is the Jaccard similarity of the trigram
+        sets, and must be at least threshold.
+        A record scoring threshold shares at least threshold * len(grams) of
+        the trigrams of s, so the longest posting lists, fewer than that many,
+        need not be scanned for candidates: those longer than max_postings are
+        only probed for the candidates found in the others, when there are few
+        enough of those for probing to be cheaper.
+        """
+        grams = trigrams(normalize(s))
+        postings = self.trigrams[field]
+        num_grams = self.num_grams[field]
+        lists = sorted((postings.get(g, []) for g in grams), key=len)
+        deferrable = max(math.ceil(threshold * len(grams) - 1e-9) - 1, 0)
+        common = [p for p in lists[len(lists) - deferrable:] if len(p) > max_postings]
+        shared = Counter()
+        for p in lists[:len(lists) - len(common)]:
+            shared.update(p)
+        for p in common:                     # positions are in increasing order
+            if len(shared) * PROBE_COST >= len(p):
+                shared.update(p)
+                continue
+            for i in shared:
+                j = bisect_left(p, i)
+                if j < len(p) and p[j] == i:
+                    shared[i] += 1
+        scored = []
+        for i, n in shared.items():
+            score = n / (len(grams) + num_grams[i] - n)
+            if score >= threshold:
+                scored.append((-score, i))
+        scored.sort()
+        return [(self.records[i], -score) for score, i in scored[:limit]]
+
+    def save(self, fn):
+        """
+        Write the indexes (not the records) to fn; load them back with the same
+        records, in the same order.
+        """
+        state = {k: v for k, v in self.__dict__.items() if k != 'records'}
+        with open(fn, 'wb') as fp:
+            pickle.dump((INDEX_VERSION, ids_digest(self.records), state), fp,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, fn, records):
+        "The index saved in fn, over records. Raises ValueError if records are not those indexed."
+        with open(fn, 'rb') as fp:
+            version, digest, state = pickle.load(fp)
+        if version != INDEX_VERSION:
+            raise ValueError('{} has index version {}, expected {}'.format(fn, version, INDEX_VERSION))
+        if digest != ids_digest(records):
+            raise ValueError(fn + ' was not built over these records')
+        return cls(records, _state=state)
+
+
+def ids_digest(records):
+    "A digest of the ids of records, in order."
+    h = hashlib.sha1()
+    for r in records:
+        h.update(record_id(r).encode('utf-8') + b'\x00')
+    return h.hexdigest()
@@ -6,7 +6,8 @@ All rights reserved
 """
 import re
 import csv
-import json
+import time
+import hashlib
 from pprint import pprint
 from json import JSONEncoder
 
@@ -137,97 +138,188 @@ LIBRARY_DISTRICT_CODES={
 AFFILIATIONS={'BLK', 'CON', 'DEM', 'GRE', 'IND', 'LBT', 'OTH', 'REF', 'REP', 'WEP', 'WOR'}
 
 
+# The layout of an export row, per FORMAT_DEFINITION. Each entry is
+# (group, attr, column, check): group is None for attributes of the Voter itself,
+# else the (dotted) name of the dict holding the attribute; column is an index,
+# or a (start, end) slice for multi-part fields; check is one of
+#    ('chars', n)         at most n chars (a list of n's for a slice)
+#    ('patt', p)          empty, or fullmatches the regex p
+#    ('date',)            empty, or YYYYMMDD; decoded to {'year', 'month', 'day'}
+#    ('history',)         4-char history codes; decoded to [{'year', 'type'}]
+VOTER_FIELDS = [
+    (None,       'voter_id',      0,        ('chars', 15)),
+    ('name',     'first_name',    1,        ('chars', 15)),
+    ('name',     'middle_name',   2,        ('chars', 15)),
+    ('name',     'last_name',     3,        ('chars', 20)),
+    ('name',     'suffix',        4,        ('chars', 4)),
+    ('address',  'street_number', 5,        ('chars', 8)),
+    ('address',  'half_code',     6,        ('chars', 5)),         # ... "1/2"
+    ('address',  'street_name',   7,        ('chars', 30)),
+    ('address',  'apt_number',    8,        ('chars', 12)),
+    ('address',  'address_lines', (9, 11),  ('chars', [40, 40])),
+    ('address',  'city',          11,       ('chars', 25)),
+    ('address',  'state',         12,       ('chars', 2)),
+    ('address',  'zip',           13,       ('chars', 5)),
+    ('address',  'zip_plus',      14,       ('chars', 4)),
+    (None,       'file_date',     15,       ('chars', 15)),
+    (None,       'dob',           16,       ('date',)),
+    (None,       'sex',           17,       ('patt', 'M|F')),
+    (None,       'eye',           18,       ('chars', 3)),
+    (None,       'height',        (19, 21), ('chars', [1, 1])),    # ft 1 char, inches 2 char
+    (None,       'area_code',     21,       ('patt', r'\d{3}')),
+    (None,       'tel_number',    22,       ('patt', r'(\d{3})?-(\d{4})?')),
+    (None,       'reg_date',      23,       ('date',)),
+    (None,       'reg_source',    24,       ('chars', 10)),
+    (None,       'filler',        25,       ('chars', 20)),
+    (None,       'affiliation',   26,       ('chars', 3)),
+    (None,       'town',          27,       ('chars', 3)),
+    (None,       'ward',          28,       ('chars', 3)),
+    (None,       'dist',          29,       ('chars', 3)),
+    (None,       'congress_dist', 30,       ('chars', 3)),
+    (None,       'senatorial_dist', 31,     ('chars', 3)),
+    (None,       'assembly_dist', 32,       ('chars', 3)),
+    (None,       'school_dist',   33,       ('chars', 3)),
+    (None,       'county_dist',   34,       ('chars', 3)),
+    (None,       'village_dist',  35,       ('chars', 3)),
+    (None,       'fire_dist',     36,       ('chars', 3)),
+    (None,       'lib_dist',      37,       ('chars', 3)),
+    (None,       'voter_status',  38,       ('patt', 'A|I|P')),
+    (None,       'reason',        39,       ('chars', 10)),        # \w{10}
+    (None,       'absentee',      40,       ('patt', 'Y|N')),      # replaced by the absentee group below
+    ('mailing',  'address',       (41, 45), ('chars', [40, 40, 40, 40])),
+    ('mailing',  'city',          45,       ('chars', 25)),
+    ('mailing',  'state',         46,       ('chars', 2)),
+    ('mailing',  'zip',           47,       ('patt', r'\d{5}')),
+    ('mailing',  'zip_plus',      48,       ('patt', r'\d{4}')),
+    ('absentee', 'election_code', 49,       ('chars', 4)),
+    ('absentee', 'code',          50,       ('chars', 3)),
+    ('absentee', 'application_received_date', 51, ('date',)),
+    ('absentee.add', 'add',       (52, 56), ('chars', [40, 40, 40, 40])),
+    ('absentee.add', 'city',      56,       ('chars', 25)),
+    ('absentee.add', 'state',     57,       ('chars', 2)),
+    ('absentee.add', 'zip',       58,       ('patt', r'\d{5}')),
+    ('absentee.add', 'zip_plus',  59,       ('patt', r'\d{4}')),
+    ('absentee', 'ballot_issued_date',      60, ('date',)),
+    ('absentee', 'ballot_received_date',    61, ('date',)),
+    ('absentee', 'ballot_re_issued_date',   62, ('date',)),
+    ('absentee', 'ballot_re_received_date', 63, ('date',)),
+    ('absentee', 'expiration_date',         64, ('date',)),
+    ('absentee', 'eligible',      65,       ('patt', 'Y|N')),
+    ('absentee', 'ineligible_reason', 66,   ('chars', 40)),
+    (None,       'history_codes', -2,       ('history',)),         # should be 12 x 4-char codes
+    ]
+NUM_FIELDS = 67
+NO_DEVIATIONS = frozenset()
+
+def _compile_patt(patt, v, env):
+    """
+    Return an expression testing that the (non-empty) variable v fullmatches patt. 
+    Alternations of literals (e.g. 'A|I|P') become set membership tests, 
+    '\\d{n}' a length and isdecimal() test, anything else a compiled regex.
+    """
+    if re.fullmatch(r'\w+(\|\w+)*', patt):
+        return '%s in %r' % (v, frozenset(patt.split('|')))
+    m = re.fullmatch(r'\\d\{(\d+)\}', patt)
+    if m:
+        return '(len(%s) == %s and %s.isdecimal())' % (v, m[1], v)
+    name = '_patt%d' % len(env)
+    env[name] = re.compile(patt).fullmatch
+    return '%s(%s) is not None' % (name, v)
+
+def _compile_fields(fields, num_fields=NUM_FIELDS, timed=False):
+    """
+    Compile a field spec (see VOTER_FIELDS) into a single function f(d, l) that
+    checks the fields of row l and stores them into the dict d (normally a 
+    Voter's __dict__), along with d['deviations'].
+    Produces exactly the values and deviations that the set_item, set_patt, 
+    set_YYYYMMDD and set_history_codes calls did, but in one pass, with the
+    regexes compiled once, and with a deviation tuple only built on failure.
+    Rows without deviations all share NO_DEVIATIONS rather than each getting
+    an empty set.
+    If timed, the function is f(d, l, t), and adds the time taken to check
+    fields[i] to t[i] (see ingest_stats).
+    """
+    env = {'_history': re.compile(r'(\w{4})*').fullmatch, '_clock': time.perf_counter,
+           '_none': NO_DEVIATIONS}
+    src = ['def parse(d, l%s):' % (', _t' if timed else ''),
+           '    if len(l) < %d:' % num_fields,
+           "        raise IndexError('row has ' + str(len(l)) + ' fields, expected %d')" % num_fields,
+           '    %s, = l[:%d]' % (', '.join('f%d' % i for i in range(num_fields)), num_fields),
+           '    dev = None']
+    emit = lambda line: src.append('    ' + line)
+    tree = {}                       # group -> {attr: expression}, in field order
+    for index, (group, attr, col, check) in enumerate(fields):
+        kind = check[0]
+        if timed:
+            emit('_s = _clock()')
+        if type(col) is tuple:
+            v = '[%s]' % ', '.join('f%d' % i for i in range(*col))
+        elif col < 0:
+            v = 'f_%d' % -col
+            emit('%s = l[%d]' % (v, col))
+        else:
+            v = 'f%d' % col
+        if kind == 'chars' and type(check[1]) is list:
+            for i, size in zip(range(*col), check[1]):
+                emit('if len(f%d) > %d: dev = dev or set(); dev.add((%r, %r, f%d, %d))' 
+                     % (i, size, 'length error', attr, i, size))
+        elif kind == 'chars':
+            emit('if len(%s) > %d: dev = dev or set(); dev.add((%r, %r, %d, %s))' 
+                 % (v, check[1], 'length error', attr, check[1], v))
+        elif kind == 'patt':
+            emit('if %s and not %s: dev = dev or set(); dev.add((%r, %r, %r, %s))' 
+                 % (v, _compile_patt(check[1], v, env), 'match failed', attr, check[1], v))
+        elif kind == 'date':
+            # Same test as fullmatch(YYYYMMDD, v): \d is any Unicode decimal digit.
+            emit('if %s:' % v)
+            emit('    if len(%s) != 8 or not %s.isdecimal(): dev = dev or set(); dev.add((%r, %r, %s))' 
+                 % (v, v, 'date YYYYMMDD error', attr, v))
+            emit("    else: %s = {'year':int(%s[:4]), 'month':int(%s[4:6]), 'day':int(%s[6:])}" 
+                 % (v, v, v, v))
+        elif kind == 'history':
+            emit('if _history(%s) is None: dev = dev or set(); dev.add((%r, %r, %s))' % (v, 'history code error', attr, v))
+            emit("else: %s = [{'year':%s[i+2:i+4], 'type':%s[i:i+2]} for i in range(0, len(%s), 4)]"
+                 % (v, v, v, v))
+        else:
+            raise ValueError('unknown field check ' + repr(check))
+        if timed:
+            emit('_t[%d] += _clock() - _s' % index)
+        node = tree
+        for g in ([] if group is None else group.split('.')):
+            if type(node.get(g)) is not dict:
+                # A group replacing a field (e.g. 'absentee') keeps the field's
+                # position, as setattr did.
+                node[g] = {}
+            node = node[g]
+        node[attr] = v
+
+    def literal(node):
+        return '{%s}' % ', '.join('%r: %s' % (k, literal(x) if type(x) is dict else x)
+                                  for k, x in node.items())
+    emit('d.update(%s)' % literal(tree))
+    emit("d['deviations'] = dev or _none")
+    exec('\n'.join(src), env)
+    return env['parse']
+
+_parse_row = _compile_fields(VOTER_FIELDS)
+_timed_parse_row = _compile_fields(VOTER_FIELDS, timed=True)
+
+# Identifies what a parse produces, e.g. to tell whether cached results are stale.
+# Bump PARSER_VERSION whenever _compile_fields changes its output; changes to
+# VOTER_FIELDS are picked up by the hash.
+PARSER_VERSION = 1
+SCHEMA_VERSION = '{}-{}'.format(PARSER_VERSION,
+                                hashlib.sha1(repr(VOTER_FIELDS).encode('utf-8')).hexdigest()[:10])
+
+
 class Voter:
     """Representation of the data for a voter in Putnam County, per Board of Elections.
        See FORMAT_DEFINITION for provenance.
        Received 07/10/2017 via email from Barbara Spofford at BoE in response to a FOIL.
+       The fields are laid out in VOTER_FIELDS.
     """
     def __init__(self,l):
-        dev = set()
-        dev |= set_item(self, 'voter_id',    15, l[0])              # 15 chars
-        name={}
-        dev |= set_item(name, 'first_name',  15, l[1])              # 15 chars
-        dev |= set_item(name, 'middle_name', 15, l[2])              # 15 chars
-        dev |= set_item(name, 'last_name',   20, l[3])              # 20 chars
-        dev |= set_item(name, 'suffix',       4, l[4])              # 4 chars
-        if name != {}:
-            self.name = name
-
-        addr={}
-        dev |= set_item(addr, 'street_number', 8, l[5])             # 8 chars
-        dev |= set_item(addr, 'half_code',     5, l[6])             # 5 chars ... "1/2"
-        dev |= set_item(addr, 'street_name',  30, l[7])             # 30 chars
-        dev |= set_item(addr, 'apt_number',   12, l[8])             # 12 chars
-        dev |= set_item(addr, 'address_lines', [40, 40], l[9:11])   # 2 x 40 chars
-        dev |= set_item(addr, 'city',         25, l[11])            # 25 chars
-        dev |= set_item(addr, 'state',         2, l[12])            # 2 chars
-        dev |= set_item(addr, 'zip',           5, l[13])            # 5 chars
-        dev |= set_item(addr, 'zip_plus',      4, l[14])            # 4 chars
-        if addr != {}:
-            self.address = addr
-
-        dev |= set_item(self, 'file_date', 15, l[15])               # 15 chars
-        dev |= set_YYYYMMDD(self, 'dob', l[16])                     # YYYYMMDD=\d{4}\d{2}\d{2}
-
-        dev |= set_patt(self, 'sex', 'M|F', l[17])                  # M|F
-        dev |= set_item(self, 'eye',       3, l[18])                # 3 chars
-        dev |= set_item(self, 'height',    [1,1], l[19:21])         # ft 1 char, inches 2 char
-        dev |= set_patt(self, 'area_code', '\d{3}', l[21])          # 3 chars
-        dev |= set_patt(self, 'tel_number', '(\d{3})?-(\d{4})?', l[22])   # \d{3}-\d{4}
-        dev |= set_YYYYMMDD(self, 'reg_date', l[23])                # YYYYMMDD=\d{4}\d{2}\d{2}
-        
-        dev |= set_item(self, 'reg_source',    10, l[24])        # 10 chars
-        dev |= set_item(self, 'filler',        20, l[25])        # 20 chars
-        dev |= set_item(self, 'affiliation',    3, l[26])        # 3 chars 
-        dev |= set_item(self, 'town',           3, l[27])        # 3 chars
-        dev |= set_item(self, 'ward',           3, l[28])        # 3 chars
-        dev |= set_item(self, 'dist',           3, l[29])        # 3 chars
-        dev |= set_item(self, 'congress_dist',  3, l[30])        # 3 chars
-        dev |= set_item(self, 'senatorial_dist',3, l[31])        # 3 chars
-        dev |= set_item(self, 'assembly_dist',  3, l[32])        # 3 chars
-        dev |= set_item(self, 'school_dist',    3, l[33])        # 3 chars
-        dev |= set_item(self, 'county_dist',    3, l[34])        # 3 chars
-        dev |= set_item(self, 'village_dist',   3, l[35])        # 3 chars
-        dev |= set_item(self, 'fire_dist',      3, l[36])        # 3 chars
-        dev |= set_item(self, 'lib_dist',       3, l[37])        # 3 chars
-        dev |= set_patt(self, 'voter_status', 'A|I|P', l[38])    # A|I|P
-        dev |= set_item(self, 'reason',        10, l[39])        # \w{10}
-        dev |= set_patt(self, 'absentee',      'Y|N', l[40])     # Y|N
-
-        mailing={}
-        dev |= set_item(mailing, 'address', [40,40,40,40],l[41:45])  # 4 x 40
-        dev |= set_item(mailing, 'city',    25, l[45])               # 25
-        dev |= set_item(mailing, 'state',    2, l[46])               # 2
-        dev |= set_patt(mailing, 'zip', '\d{5}', l[47])              # \d{5}
-        dev |= set_patt(mailing, 'zip_plus', '\d{4}', l[48])         # \d{4}
-        if mailing != {}:
-            self.mailing = mailing
-
-        absentee={}
-        dev |= set_item(absentee, 'election_code', 4, l[49])           # 4
-        dev |= set_item(absentee, 'code',          3, l[50])           # 3
-        dev |= set_YYYYMMDD(absentee, 'application_received_date', l[51]) # YYYYMMDD
-        absentee_add ={}
-        dev |= set_item(absentee_add, 'add', [40,40,40,40], l[52:56])  # 4 x 40 chars
-        dev |= set_item(absentee_add, 'city',    25, l[56])            # 25 chars
-        dev |= set_item(absentee_add, 'state',    2, l[57])            # 2 chars
-        dev |= set_patt(absentee_add, 'zip',  '\d{5}', l[58])          # 5 chars
-        dev |= set_patt(absentee_add, 'zip_plus','\d{4}', l[59])       # 4 chars
-        if absentee_add !={}:
-            absentee['add'] = absentee_add
-        dev |= set_YYYYMMDD(absentee, 'ballot_issued_date',      l[60])       
-        dev |= set_YYYYMMDD(absentee, 'ballot_received_date',    l[61])     
-        dev |= set_YYYYMMDD(absentee, 'ballot_re_issued_date',   l[62])    
-        dev |= set_YYYYMMDD(absentee, 'ballot_re_received_date', l[63])  
-        dev |= set_YYYYMMDD(absentee, 'expiration_date', l[64])          
-        dev |= set_patt(absentee, 'eligible', 'Y|N', l[65])              # 'Y'/'N'
-        dev |= set_item(absentee, 'ineligible_reason', 40, l[66])        # 40 chars
-        if absentee != {}:
-            self.absentee = absentee
-
-        dev |= set_history_codes(self, 'history_codes', l[-2])      # should be 12 x 4-char codes
-        # vj: hack for now, to work around bugs in rows
-        self.deviations = dev
+        _parse_row(self.__dict__, l)
         
     def get_name(self):
         res = self.name['last_name'] + "," + self.name['first_name']
@@ -250,32 +342,195 @@ class Voter:
     # end Voter
 
 
+def _top_keys(fields):
+    "The attributes of a Voter, in the order parsing sets them (a group at its first field)."
+    keys = []
+    for group, attr, col, check in fields:
+        k = attr if group is None else group.split('.')[0]
+        if k not in keys:
+            keys.append(k)
+    return keys
+
+VOTER_KEYS = _top_keys(VOTER_FIELDS)
+
+class LazyVoter:
+    """A Voter that keeps its raw row, and decodes (and validates) each attribute,
+       e.g. the whole absentee group, only when it is first read. Plain fields
+       (affiliation, town, ...) are read straight from the row. Reading
+       deviations validates the whole row. Otherwise behaves as Voter; use
+       fields_of(v) rather than v.__dict__.
+    """
+    __slots__ = ['_row', '_deviations'] + ['_' + k for k in VOTER_KEYS]
+
+    def __init__(self, l):
+        if len(l) < NUM_FIELDS:
+            raise IndexError('row has ' + str(len(l)) + ' fields, expected %d' % NUM_FIELDS)
+        self._row = l
+
+    get_name = Voter.get_name
+    __repr__ = Voter.__repr__
+    __str__ = Voter.__str__
+
+    @property
+    def deviations(self):
+        try:
+            return self._deviations
+        except AttributeError:
+            d = {}
+            _parse_row(d, self._row)
+            self._deviations = d['deviations']
+            return self._deviations
+
+    @deviations.setter
+    def deviations(self, dev):
+        self._deviations = dev
+
+    def to_dict(self):
+        "What a Voter's __dict__ would be."
+        d = {k: getattr(self, k) for k in VOTER_KEYS}
+        d['deviations'] = self.deviations
+        return d
+
+def _lazy_attribute(key):
+    "Property decoding attribute key of a LazyVoter on first access, and caching it."
+    slot = getattr(LazyVoter, '_' + key)
+    fields = [f for f in VOTER_FIELDS if (f[1] if f[0] is None else f[0].split('.')[0]) == key]
+    group, attr, col, check = fields[0]
+    if len(fields) == 1 and group is None and type(col) is int and check[0] in ('chars', 'patt'):
+        decode = lambda row: row[col]        # the value is the raw string
+    else:
+        parse = _compile_fields(fields)
+        def decode(row):
+            d = {}
+            parse(d, row)
+            return d[key]
+
+    def get(self):
+        try:
+            return slot.__get__(self)
+        except AttributeError:
+            x = decode(self._row)
+            slot.__set__(self, x)
+            return x
+    return property(get, slot.__set__)
+
+for _k in VOTER_KEYS:
+    setattr(LazyVoter, _k, _lazy_attribute(_k))
+
+def fields_of(v):
+    "The attribute dict of a Voter or LazyVoter."
+    return v.to_dict() if type(v) is LazyVoter else v.__dict__
+
+
 class VoterEncoder(JSONEncoder):
     def default(self, o):
-        return o.__dict__
-    
-def read_file(fn):
-    results=[]
-    rows=[]
+        if type(o) is set or type(o) is frozenset:
+            return sorted(o, key=repr)
+        return fields_of(o)
+
+def iter_voters(fn, keep_raw=False, stats=None):
+    """
+    Generator over the records in fn, yielding (index, voter, deviations) as each
+    row is parsed, or (index, voter, deviations, row) if keep_raw is set.
+    Nothing is accumulated, so memory stays flat however large the export is.
+    stats, an ingest_stats.IngestStats, collects timings and deviation counts.
+    """
     with open(fn, newline='') as csvfile:
         reader = csv.reader(csvfile, delimiter=',', quotechar='|')
-        for row in reader:
+        if stats is not None:
+            yield from stats.timed(_iter_voters_timed(reader, keep_raw, stats))
+            return
+        for ind, row in enumerate(reader):
             v = Voter(row)
-            results.append(v)
-            rows.append(row)
+            if keep_raw:
+                yield ind, v, v.deviations, row
+            else:
+                yield ind, v, v.deviations
+
+FIELD_NAMES = [attr if group is None else group + '.' + attr
+               for group, attr, col, check in VOTER_FIELDS]
+
+def _iter_voters_timed(reader, keep_raw, stats):
+    "iter_voters, timing each stage of each row into stats."
+    clock = time.perf_counter
+    timers = stats.timers(FIELD_NAMES)
+    profiler = stats.profiler
+    ind = 0
+    try:
+        while True:
+            if profiler is not None:
+                profiler.enable()
+            t0 = clock()
+            row = next(reader, None)
+            t1 = clock()
+            if row is None:
+                break
+            v = Voter.__new__(Voter)
+            _timed_parse_row(v.__dict__, row, timers)
+            t2 = clock()
+            if profiler is not None:
+                profiler.disable()
+            stats.rows += 1
+            stats.decode_time += t1 - t0
+            stats.parse_time += t2 - t1
+            if v.deviations:
+                stats.add_deviations(v.deviations)
+            if keep_raw:
+                yield ind, v, v.deviations, row
+            else:
+                yield ind, v, v.deviations
+            ind += 1
+    finally:
+        if profiler is not None:
+            profiler.disable()
+
+def voters_of(items):
+    "Accept either Voters or the tuples produced by iter_voters(...); yield the Voters."
+    for item in items:
+        yield item[1] if type(item) is tuple else item
+
+def iter_lazy_voters(fn):
+    "Generator over LazyVoters for the records in fn."
+    with open(fn, newline='') as csvfile:
+        for row in csv.reader(csvfile, delimiter=',', quotechar='|'):
+            yield LazyVoter(row)
+
+def read_file(fn, stats=None):
+    results=[]
+    rows=[]
+    for ind, v, dev, row in iter_voters(fn, keep_raw=True, stats=stats):
+        results.append(v)
+        rows.append(row)
     return results, rows
         
         
 def write_json(data, fn):
+    """
+    Write data (a list of Voters, or a stream from iter_voters(...)) as a json array.
+    Records are encoded one at a time, so a stream is never held in memory.
+    """
+    encoder = VoterEncoder(ensure_ascii=False, indent=4, sort_keys=True)
     with open(fn, 'w') as fp:
-        json.dump(data, fp, cls=VoterEncoder,ensure_ascii=False, indent=4, sort_keys=True)
+        sep = '[\n    '
+        for v in voters_of(data):
+            fp.write(sep)
+            fp.write(encoder.encode(v).replace('\n', '\n    '))
+            sep = ',\n    '
+        fp.write('[]' if sep == '[\n    ' else '\n]')
 
 
-def print_errors_in_voting_records(results, raws):
-    "(results, raws) obtained after a read_file(...)"
-    for ind, (result, raw) in enumerate(zip(results,raws)):
-        if result.deviations != set():
-            pprint((ind, result, len(raw), result.deviations))
+def print_errors_in_voting_records(results, raws=None):
+    """
+    (results, raws) obtained after a read_file(...), or results a stream
+    obtained from iter_voters(fn, keep_raw=True).
+    """
+    if raws is not None:
+        results = ((ind, r, r.deviations, raw) 
+                   for ind, (r, raw) in enumerate(zip(results, raws)))
+    for item in results:
+        ind, result, dev = item[:3]
+        if dev != set():
+            pprint((ind, result, len(item[3]) if len(item) > 3 else None, dev))
         
 def voting_record(votes):
     "Given a voting record as a string 'GE09PE04', return the list of elections."
@@ -339,7 +594,7 @@ def avg_voting_efficiency_by_party(results, elecs, parties=['DEM', 'REP','BLK'])
                        if r.affiliation == x]]]
 
 def rank_by_efficiency(results, elecs, bar=5):
-    sorted([(x, float2(voting_efficiency(results[x].history_codes, elecs))) 
+    return sorted([(x, float2(voting_efficiency(results[x].history_codes, elecs))) 
         for x in range(0,len(results))
             if len(results[x].history_codes) > bar], key=lambda x:-x[1])
 
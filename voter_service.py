@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+A small HTTP/json service over the voters, for canvassers' phones and laptops.
+
+The voters are loaded once, indexed (voter_index.VoterIndex), and served by an
+asyncio server (standard library only; HTTP/1.1 with keep-alive):
+
+    GET  /voters/<voter_id>                      the voter
+    GET  /voters?last=SMI                        last name starts with
+    GET  /voters?name=JOHN SMITH                 name contains
+    GET  /voters?fuzzy=JON SMTIH                 most similar names
+    GET  /voters?street=CROTON                   street name contains
+    GET  /voters?town=CA&ward=001&dist=004       town, ward, election district
+    GET  /voters/<voter_id>/comments             comments on the voter
+    POST /voters/<voter_id>/comments             {"author": ..., "text": ...}
+    GET  /comments?town=CA&ward=001&since=2017-09-01
+
+Lists take offset and limit (at most MAX_LIMIT), and answer
+{"total": n, "offset": i, "limit": k, "results": [...]}; with format=ndjson the
+whole result is streamed instead, one voter per line, in chunks. Responses to
+GETs are kept in an LRU cache, cleared by every write. Comments are only
+buffered on the event loop; the comment log's own thread writes and fsyncs them.
+Every refresh_interval seconds, what other writers (other service processes,
+or a compaction) added to the comment log is read in, on a worker thread, and
+the cache cleared if there was any.
+
+    python voter_service.py putnam.csv --comments comments/ --port 8080
+"""
+import sys
+import json
+import asyncio
+import traceback
+import argparse
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs, unquote
+from voter_index import VoterIndex, record_id, record_keys
+from ndjson_writer import encode
+from comment_log import CommentLog
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 1000
+CACHE_SIZE = 4096
+STREAM_CHUNK = 500            # voters per chunk of a streamed result
+MAX_BODY = 64 * 1024
+REFRESH_INTERVAL = 5.0        # seconds between reads of what other writers add to the comment log
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+class LRUCache:
+    "At most size responses, by request, least recently used evicted first."
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        x = self.entries.get(key)
+        if x is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return x
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+def response(status, body, content_type='application/json', keep_alive=True):
+    head = 'HTTP/1.1 {} {}\r\nContent-Type: {}\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n'.format(
+        status, REASONS.get(status, ''), content_type, len(body), 'keep-alive' if keep_alive else 'close')
+    return head.encode('latin-1') + body
+
+def json_body(x):
+    return json.dumps(x, ensure_ascii=False).encode('utf-8')
+
+
+class VoterService:
+    "The routes above over records (Voters and/or clean.Voters) and a CommentLog (optional)."
+    def __init__(self, records, comments=None, cache_size=CACHE_SIZE):
+        self.index = VoterIndex(records)
+        self.comments = comments
+        self.cache = LRUCache(cache_size)
+        self.requests = 0
+
+    # routing
+
+    def select(self, query):
+        "The records for a GET of the voter list, or raises HTTPError."
+        ix = self.index
+        q = lambda k: query[k][0]
+        if 'last' in query:
+            return ix.last_name_prefix(q('last'))
+        if 'name' in query:
+            return ix.search(q('name'), 'name')
+        if 'fuzzy' in query:
+            return [r for r, score in ix.fuzzy(q('fuzzy'), 'name', limit=MAX_LIMIT)]
+        if 'street' in query:
+            return ix.search(q('street'), 'street')
+        if 'town' in query:
+            return ix.district(q('town'), query.get('ward', [None])[0], query.get('dist', [None])[0])
+        raise HTTPError(400, 'one of last, name, fuzzy, street or town is needed')
+
+    def page(self, records, query):
+        try:
+            offset = int(query.get('offset', ['0'])[0])
+            limit = int(query.get('limit', [str(DEFAULT_LIMIT)])[0])
+        except ValueError:
+            raise HTTPError(400, 'offset and limit must be integers')
+        if offset < 0 or limit < 1:
+            raise HTTPError(400, 'offset must be at least 0 and limit at least 1')
+        limit = min(limit, MAX_LIMIT)
+        rs = records[offset:offset + limit]
+        return ('{"total":%d,"offset":%d,"limit":%d,"results":[%s]}' % (
+            len(records), offset, limit, ','.join(encode(r) for r in rs))).encode('utf-8')
+
+    def get(self, path, query):
+        "The body of the response to GET path, or raises HTTPError."
+        parts = [unquote(p) for p in path.strip('/').split('/')]
+        if parts == ['voters']:
+            return self.page(self.select(query), query)
+        if len(parts) == 2 and parts[0] == 'voters':
+            r = self.index.by_id(parts[1])
+            if r is None:
+                raise HTTPError(404, 'no voter ' + parts[1])
+            return encode(r).encode('utf-8')
+        if len(parts) == 3 and parts[0] == 'voters' and parts[2] == 'comments':
+            return json_body([c.to_dict() for c in self._comments().for_voter(parts[1])])
+        if parts == ['comments']:
+            if 'town' not in query:
+                raise HTTPError(400, 'town is needed')
+            g = lambda k: query.get(k, [None])[0]
+            cs = self._comments().district_since(g('town'), g('ward'), g('dist'), g('since'), g('until'))
+            return json_body([c.to_dict() for c in cs])
+        raise HTTPError(404, 'no such resource ' + path)
+
+    def post(self, path, body):
+        "(status, body) of the response to POST path with body, or raises HTTPError."
+        parts = [unquote(p) for p in path.strip('/').split('/')]
+        if not (len(parts) == 3 and parts[0] == 'voters' and parts[2] == 'comments'):
+            raise HTTPError(404 if parts[:1] != ['voters'] else 405, 'cannot POST to ' + path)
+        r = self.index.by_id(parts[1])
+        if r is None:
+            raise HTTPError(404, 'no voter ' + parts[1])
+        try:
+            d = json.loads(body)
+        except ValueError:
+            d = None
+        if not isinstance(d, dict):
+            raise HTTPError(400, 'expected {"text": ..., "author": ...}')
+        text, author = d.get('text'), d.get('author')
+        if type(text) is not str or not text.strip():
+            raise HTTPError(400, 'text must be a non-empty string')
+        if author is not None and type(author) is not str:
+            raise HTTPError(400, 'author must be a string')
+        c = self._comments().add(record_id(r), text, author=author, district=record_keys(r)[4],
+                                 flush=False)
+        self.cache.clear()
+        return 201, json_body(c.to_dict())
+
+    def _comments(self):
+        if self.comments is None:
+            raise HTTPError(404, 'comments are not enabled')
+        return self.comments
+
+    # the server
+
+    async def handle(self, reader, writer):
+        "Serve the requests of one connection."
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    method, target, version = line.decode('latin-1').split()
+                except ValueError:
+                    writer.write(response(400, json_body({'error': 'bad request line'}), keep_alive=False))
+                    break
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b'\r\n', b'\n', b''):
+                        break
+                    k, _, v = h.decode('latin-1').partition(':')
+                    headers[k.strip().lower()] = v.strip()
+                keep_alive = (headers.get('connection', '').lower() != 'close' and
+                              version == 'HTTP/1.1')
+                n = headers.get('content-length', '0')
+                n = int(n) if n.isdecimal() else -1
+                if n < 0 or n > MAX_BODY:
+                    writer.write(response(413 if n > 0 else 400, json_body({'error': 'bad content-length'}),
+                                          keep_alive=False))
+                    break
+                body = await reader.readexactly(n) if n else b''
+                self.requests += 1
+                await self.respond(writer, method, target, body, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, method, target, body, keep_alive):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        try:
+            if method == 'GET' and query.get('format') == ['ndjson'] and url.path.strip('/') == 'voters':
+                await self.stream(writer, self.select(query), keep_alive)
+                return
+            if method == 'GET':
+                cached = self.cache.get(target)
+                if cached is None:
+                    cached = self.get(url.path, query)
+                    self.cache.put(target, cached)
+                writer.write(response(200, cached, keep_alive=keep_alive))
+            elif method == 'POST':
+                status, out = self.post(url.path, body)
+                writer.write(response(status, out, keep_alive=keep_alive))
+            else:
+                raise HTTPError(405, 'method not allowed')
+        except HTTPError as e:
+            writer.write(response(e.status, json_body({'error': str(e)}), keep_alive=keep_alive))
+        except Exception:
+            traceback.print_exc()
+            writer.write(response(500, json_body({'error': 'internal error'}), keep_alive=keep_alive))
+
+    async def stream(self, writer, records, keep_alive):
+        "Write records as ndjson in chunks (chunked transfer encoding), letting other requests in between."
+        writer.write(('HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\n'
+                      'Transfer-Encoding: chunked\r\nConnection: {}\r\n\r\n').format(
+                          'keep-alive' if keep_alive else 'close').encode('latin-1'))
+        try:
+            for i in range(0, len(records), STREAM_CHUNK):
+                data = ''.join(encode(r) + '\n' for r in records[i:i + STREAM_CHUNK]).encode('utf-8')
+                writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+                await writer.drain()
+        except ConnectionError:
+            raise
+        except Exception:
+            # Too late for an error status: cut the response short so the client sees it incomplete.
+            traceback.print_exc()
+            writer.transport.abort()
+            return
+        writer.write(b'0\r\n\r\n')
+
+    async def refresh_comments(self, interval=REFRESH_INTERVAL):
+        "Every interval seconds, read in what other writers added to the comment log (forever)."
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                n = await asyncio.to_thread(self.comments.refresh)
+            except Exception:
+                traceback.print_exc()
+                continue
+            if n > 0:
+                self.cache.clear()
+
+    async def serve(self, host='127.0.0.1', port=8080, refresh_interval=REFRESH_INTERVAL):
+        server = await asyncio.start_server(self.handle, host, port, backlog=1024)
+        refresher = None
+        if self.comments is not None:
+            refresher = asyncio.create_task(self.refresh_comments(refresh_interval))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if refresher is not None:
+                refresher.cancel()
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Serve voter lookups and comments over HTTP.')
+    p.add_argument('export', help='BoE export (csv) to load')
+    p.add_argument('--comments', help='directory of the comment log')
+    p.add_argument('--author', default=None, help='default author of comments')
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8080)
+    p.add_argument('--refresh', type=float, default=REFRESH_INTERVAL,
+                   help='seconds between reads of comments added by other writers')
+    args = p.parse_args(argv)
+    from voter_reader import read_file
+    voters, rows = read_file(args.export)
+    del rows
+    comments = CommentLog(args.comments, author=args.author) if args.comments else None
+    service = VoterService(voters, comments)
+    print('serving {} voters on http://{}:{}/'.format(len(voters), args.host, args.port), file=sys.stderr)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.refresh))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if comments is not None:
+            comments.close()
+
+if __name__ == '__main__':
+    main()
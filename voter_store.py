@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+A local store of voters, in an SQLite database file (no server needed).
+
+The voters table has a column per field of VOTER_FIELDS, named by its group and
+attribute (e.g. name_last_name, absentee_add_zip), keyed by voter_id. Values are
+the fields as read, except that dates that parse are stored as YYYY-MM-DD (so
+they sort and compare), multi-part fields as json lists, and the history as its
+code string. The number of deviations and the deviations themselves (json) are
+kept too. Voters are rebuilt from their columns, identical to those parsed from
+the export. There are indexes on name, street and town/ward/dist.
+
+Loading upserts (by voter_id) in batches, each in one transaction, so a county
+loads in seconds and a newer export simply updates the rows that changed.
+
+    store = VoterStore('putnam.db')
+    store.load_file('putnam.csv')
+    store.district('CA', '001')
+    store.by_last_name('SMI')
+"""
+import json
+import sqlite3
+from itertools import islice
+from voter_reader import (Voter, VOTER_FIELDS, NUM_FIELDS, NO_DEVIATIONS, SCHEMA_VERSION,
+                          fields_of, iter_voters)
+
+DEFAULT_BATCH_SIZE = 5000
+INDEXES = {
+    'name': ['name_last_name', 'name_first_name'],
+    'street': ['address_street_name', 'address_street_number'],
+    'district': ['town', 'ward', 'dist'],
+    'affiliation': ['affiliation'],
+    }
+
+
+def column_name(group, attr):
+    return attr if group is None else group.replace('.', '_') + '_' + attr
+
+COLUMNS = [column_name(g, a) for g, a, col, check in VOTER_FIELDS] + ['n_deviations', 'deviations']
+# Fields that parsing replaces by their group (absentee): only known from the raw row.
+GROUPS = set(g.split('.')[0] for g, a, col, check in VOTER_FIELDS if g is not None)
+RAW_ONLY = [a for g, a, col, check in VOTER_FIELDS if g is None and a in GROUPS]
+
+
+def _get(d, group, attr):
+    for g in ([] if group is None else group.split('.')):
+        d = d[g]
+    return d[attr]
+
+def _store_value(x, check):
+    "The column value of a parsed field."
+    if check[0] == 'date' and type(x) is dict:
+        return '%04d-%02d-%02d' % (x['year'], x['month'], x['day'])
+    if check[0] == 'history' and type(x) is list:
+        return ''.join(c['type'] + c['year'] for c in x)
+    if type(x) is list:
+        return json.dumps(x, ensure_ascii=False)
+    return x
+
+def _row_value(x, check, col, bad):
+    """
+    The export row entries of a column value (the inverse of _store_value);
+    bad is True for a date that failed to parse, and so is stored as read.
+    """
+    if x is None:
+        return ''
+    if type(col) is tuple:
+        return json.loads(x)
+    if check[0] == 'date' and not bad and len(x) == 10:
+        return x[:4] + x[5:7] + x[8:]
+    return x
+
+def record_of(v, row=None):
+    """
+    The column values (in COLUMNS order) of a Voter or LazyVoter. A field that
+    parsing replaces by its group (absentee) is taken from the raw row, if known.
+    """
+    d = fields_of(v)
+    if row is None:
+        row = getattr(v, '_row', None)       # a LazyVoter has its row
+    values = []
+    for group, attr, col, check in VOTER_FIELDS:
+        x = _get(d, group, attr)
+        if type(x) is dict and check[0] != 'date':
+            x = None if row is None else row[col]
+        values.append(_store_value(x, check))
+    values.append(len(v.deviations))
+    values.append(json.dumps(sorted(v.deviations, key=repr), ensure_ascii=False)
+                  if v.deviations else None)
+    return values
+
+def voter_of(record):
+    "The Voter for a row of the voters table (as selected by VoterStore.where)."
+    devs = record[len(VOTER_FIELDS)]
+    devs = NO_DEVIATIONS if devs is None else set(tuple(d) for d in json.loads(devs))
+    bad_dates = set(d[1] for d in devs if d[0] == 'date YYYYMMDD error')
+    row = [''] * NUM_FIELDS + ['', '']
+    for (group, attr, col, check), x in zip(VOTER_FIELDS, record):
+        x = _row_value(x, check, col, attr in bad_dates)
+        if type(col) is tuple:
+            row[col[0]:col[1]] = x
+        else:
+            row[col] = x
+    v = Voter(row)
+    v.deviations = devs
+    return v
+
+
+class VoterStore:
+    "The voters in the SQLite database fn (created if need be)."
+    def __init__(self, fn):
+        self.fn = fn
+        self.db = sqlite3.connect(fn, cached_statements=256)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self._create()
+        cols = ', '.join(COLUMNS)
+        self._upsert = 'INSERT INTO voters ({}) VALUES ({}) ON CONFLICT(voter_id) DO UPDATE SET {}'.format(
+            cols, ', '.join('?' * len(COLUMNS)),
+            ', '.join(('{0}=coalesce(excluded.{0}, {0})' if c in RAW_ONLY else '{0}=excluded.{0}').format(c)
+                      for c in COLUMNS if c != 'voter_id'))
+        self._select = 'SELECT {} FROM voters '.format(', '.join(COLUMNS[:-2] + ['deviations']))
+
+    def _create(self):
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            found = self.db.execute("SELECT value FROM meta WHERE key = 'schema'").fetchone()
+            if found is not None and found[0] != SCHEMA_VERSION:
+                raise ValueError('{} has schema {}, expected {}'.format(self.fn, found[0], SCHEMA_VERSION))
+            self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', ('schema', SCHEMA_VERSION))
+            self.db.execute('CREATE TABLE IF NOT EXISTS voters ({})'.format(', '.join(
+                c + (' TEXT PRIMARY KEY' if c == 'voter_id' else
+                     ' INTEGER' if c == 'n_deviations' else ' TEXT') for c in COLUMNS)))
+            for name, cols in INDEXES.items():
+                self.db.execute('CREATE INDEX IF NOT EXISTS voters_{} ON voters ({})'.format(
+                    name, ', '.join(cols)))
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute('SELECT count(*) FROM voters').fetchone()[0]
+
+    def upsert(self, voters, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Insert or update voters (Voters, LazyVoters, or an iter_voters(...)
+        stream, best with keep_raw=True), batch_size per transaction. Returns
+        the number written.
+        """
+        n = 0
+        it = iter(voters)
+        while True:
+            batch = [record_of(x[1], x[3] if len(x) > 3 else None) if type(x) is tuple else record_of(x)
+                     for x in islice(it, batch_size)]
+            if not batch:
+                return n
+            with self.db:
+                self.db.executemany(self._upsert, batch)
+            n += len(batch)
+
+    def load_file(self, fn, batch_size=DEFAULT_BATCH_SIZE):
+        "Upsert the voters of the export fn."
+        n = self.upsert(iter_voters(fn, keep_raw=True), batch_size)
+        with self.db:
+            self.db.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', ('loaded:' + fn, str(n)))
+        return n
+
+    def delete(self, voter_ids):
+        with self.db:
+            self.db.executemany('DELETE FROM voters WHERE voter_id = ?', ((x,) for x in voter_ids))
+
+    def where(self, condition, params=()):
+        """
+        Generator over the Voters satisfying condition, an SQL expression over
+        the COLUMNS (it may end in ORDER BY), e.g.
+            store.where('affiliation = ? AND dob < ?', ('DEM', '1950-01-01'))
+        condition is pasted into the query as is, so it must be written by the
+        program: values, above all anything a user typed, go in params, one
+        per ? placeholder.
+        """
+        for record in self.db.execute(self._select + 'WHERE ' + condition, params):
+            yield voter_of(record)
+
+    def by_id(self, voter_id):
+        "The Voter with voter_id, or None."
+        return next(self.where('voter_id = ?', (voter_id,)), None)
+
+    def by_last_name(self, prefix, first_name=None):
+        "Voters whose last name starts with prefix (and with first_name if given), by name."
+        if first_name is None:
+            return list(self.where('name_last_name >= ? AND name_last_name < ? '
+                                   'ORDER BY name_last_name, name_first_name',
+                                   (prefix, prefix + '\U0010ffff')))
+        return list(self.where('name_last_name >= ? AND name_last_name < ? AND name_first_name = ? '
+                               'ORDER BY name_last_name', (prefix, prefix + '\U0010ffff', first_name)))
+
+    def by_street(self, street, number=None):
+        "Voters on street (a prefix of the street name), or at number on it."
+        if number is None:
+            return list(self.where('address_street_name >= ? AND address_street_name < ? '
+                                   'ORDER BY address_street_name, address_street_number',
+                                   (street, street + '\U0010ffff')))
+        return list(self.where('address_street_name = ? AND address_street_number = ?',
+                               (street, number)))
+
+    def district(self, town, ward=None, dist=None):
+        "Voters in town, or in its ward, or in its ward and election district."
+        if ward is None:
+            return list(self.where('town = ?', (town,)))
+        if dist is None:
+            return list(self.where('town = ? AND ward = ?', (town, ward)))
+        return list(self.where('town = ? AND ward = ? AND dist = ?', (town, ward, dist)))
+
+    def count_by(self, *columns):
+        "Dict mapping each combination of values of columns (e.g. 'town', 'affiliation') to its count."
+        for c in columns:
+            if c not in COLUMNS:
+                raise ValueError('no column ' + c)
+        cols = ', '.join(columns)
+        return {tuple(r[:-1]): r[-1] for r in self.db.execute(
+            'SELECT {0}, count(*) FROM voters GROUP BY {0}'.format(cols))}
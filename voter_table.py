@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+(c) Vijay Saraswat 2017
+All rights reserved
+
+Columnar representation of a parsed BoE export, for whole-county analytics.
+
+A VoterTable keeps one numpy array per analytic field instead of one Voter object
+(with its nested dicts) per row. Short codes (affiliation, town, ward, dist, ...)
+are stored as small integer codes into a Categorical, decoded through AFFILIATIONS,
+TOWN_CODES, SCHOOL_DISTRICT_CODES, FIRE_DISTRICT_CODES etc. Dates are stored as
+day numbers (date.toordinal(), MISSING_DAY when empty or invalid). The raw rows
+are kept packed in a single byte buffer, so any selection can be turned back into
+Voter objects exactly as read_file would have produced them.
+
+    t = VoterTable.from_file('putnam.csv')
+    dems = t[t.eq('affiliation', 'DEM')]
+    dems.crosstab('town', 'ward')
+    list(dems.to_voters())
+"""
+import re
+import json
+import mmap
+import struct
+from datetime import date
+import numpy as np
+from voter_reader import (Voter, iter_voters, fields_of, AFFILIATIONS, TOWN_CODES,
+                          SCHOOL_DISTRICT_CODES, FIRE_DISTRICT_CODES,
+                          LIBRARY_DISTRICT_CODES, SCHEMA_VERSION)
+
+MISSING_DAY = 0          # date.toordinal() is always >= 1
+ROW_SEP = '\x1f'         # separates the fields of a row in the packed buffer
+ROW_ESC = '\x1b'         # escapes ROW_SEP (and itself) in the rare field holding one
+_UNESCAPE = re.compile(ROW_ESC + '[' + ROW_ESC + '_]')
+
+# Categorical columns, and the codes known in advance for each. Values not known
+# in advance (e.g. ward numbers, or bad data) are added as they are seen.
+CATEGORICAL_COLUMNS = {
+    'affiliation':     sorted(AFFILIATIONS),
+    'town':            sorted(TOWN_CODES),
+    'ward':            [],
+    'dist':            [],
+    'congress_dist':   [],
+    'senatorial_dist': [],
+    'assembly_dist':   [],
+    'school_dist':     sorted(SCHOOL_DISTRICT_CODES),
+    'county_dist':     [],
+    'village_dist':    [],
+    'fire_dist':       sorted(FIRE_DISTRICT_CODES),
+    'lib_dist':        sorted(LIBRARY_DISTRICT_CODES),
+    'voter_status':    ['A', 'I', 'P'],
+    'sex':             ['M', 'F'],
+    'zip':             [],
+    }
+DATE_COLUMNS = ['dob', 'reg_date']
+
+# On-disk layout written by VoterTable.save: MAGIC, then a FILE_HEADER giving the
+# format version and the length of a json header, then the json header, then each
+# array (columns, index, offsets, packed rows) at an ALIGN-aligned offset recorded
+# in the json header, so VoterTable.load can map them in place.
+MAGIC = b'VTRTABLE'
+FORMAT_VERSION = 2
+FILE_HEADER = struct.Struct('<IQ')
+ALIGN = 64
+
+
+class Categorical:
+    "Maps the values of a low-cardinality column to small integer codes and back."
+    def __init__(self, labels=()):
+        self.labels = []
+        self.index = {}
+        for l in labels:
+            self.code(l)
+
+    def code(self, v):
+        "The code for v, allocating one if v has not been seen before."
+        c = self.index.get(v)
+        if c is None:
+            c = self.index[v] = len(self.labels)
+            self.labels.append(v)
+        return c
+
+    def decode(self, codes):
+        "Array of labels for an array of codes."
+        return np.array(self.labels, dtype=object)[codes]
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __repr__(self):
+        return "<Categorical {}>".format(self.labels)
+
+
+def pack_row(row):
+    "The fields of row joined by ROW_SEP, escaped (only) if a field holds ROW_SEP or ROW_ESC."
+    s = ROW_SEP.join(row)
+    if ROW_ESC in s or s.count(ROW_SEP) != len(row) - 1:
+        s = ROW_SEP.join(f.replace(ROW_ESC, ROW_ESC + ROW_ESC).replace(ROW_SEP, ROW_ESC + '_')
+                         for f in row)
+    return s
+
+def unpack_row(s):
+    "Inverse of pack_row."
+    fields = s.split(ROW_SEP)
+    if ROW_ESC in s:
+        fields = [_UNESCAPE.sub(lambda m: ROW_SEP if m[0][1] == '_' else ROW_ESC, f) for f in fields]
+    return fields
+
+
+def to_day(d):
+    "Day number for a Voter date field: a {'year','month','day'} dict, or a raw (bad) string."
+    if type(d) is not dict:
+        return MISSING_DAY
+    try:
+        return date(d['year'], d['month'], d['day']).toordinal()
+    except ValueError:
+        return MISSING_DAY
+
+def from_day(n):
+    "Inverse of to_day, giving a datetime.date, or None for MISSING_DAY."
+    return None if n == MISSING_DAY else date.fromordinal(int(n))
+
+
+class VoterTable:
+    """
+    Columns of a parsed export. columns maps a field name to a numpy array
+    (int16 codes for categoricals, int32 day numbers for dates), categories maps
+    each categorical field to its Categorical. Row i of the table is row
+    self.index[i] of the original file.
+    """
+    def __init__(self, columns, categories, index, offsets, buf):
+        self.columns = columns
+        self.categories = categories
+        self.index = index           # original row indices
+        self._offsets = offsets      # start/end of row i of the file in buf
+        self._buf = buf
+
+    @classmethod
+    def from_file(cls, fn):
+        return cls.from_stream(iter_voters(fn, keep_raw=True))
+
+    @classmethod
+    def from_stream(cls, items):
+        "Build from (index, Voter or LazyVoter, deviations, row) tuples, e.g. iter_voters(fn, keep_raw=True)."
+        categories = {name: Categorical(labels) for name, labels in CATEGORICAL_COLUMNS.items()}
+        codes = {name: [] for name in categories}
+        days = {name: [] for name in DATE_COLUMNS}
+        ids, index, n_devs = [], [], []
+        buf = bytearray()
+        offsets = [0]
+        for ind, v, dev, row in items:
+            d = fields_of(v)
+            for name, cat in categories.items():
+                codes[name].append(cat.code(d[name] if name != 'zip' else d['address']['zip']))
+            for name in DATE_COLUMNS:
+                days[name].append(to_day(d[name]))
+            ids.append(d['voter_id'])
+            index.append(ind)
+            n_devs.append(len(dev))
+            buf += pack_row(row).encode('utf-8')
+            offsets.append(len(buf))
+        columns = {name: np.array(c, dtype=np.int16 if len(categories[name]) < 2**15 else np.int32)
+                   for name, c in codes.items()}
+        columns.update({name: np.array(d, dtype=np.int32) for name, d in days.items()})
+        columns['voter_id'] = np.array(ids, dtype='U15') if ids else np.zeros(0, dtype='U15')
+        columns['n_deviations'] = np.array(n_devs, dtype=np.int16)
+        offsets = np.array(offsets, dtype=np.int64)
+        return cls(columns, categories, np.array(index, dtype=np.int64),
+                   np.stack([offsets[:-1], offsets[1:]], axis=1), bytes(buf))
+
+    def __len__(self):
+        return len(self.index)
+
+    def __repr__(self):
+        return "<VoterTable {} rows>".format(len(self))
+
+    def __getitem__(self, key):
+        "t['town'] is a column; t[mask] (or t[array of positions]) a new table of the selected rows."
+        if type(key) is str:
+            return self.columns[key]
+        return VoterTable({name: c[key] for name, c in self.columns.items()},
+                          self.categories, self.index[key], self._offsets[key], self._buf)
+
+    def decode(self, name):
+        "The column name as labels (or datetime.dates) rather than codes."
+        if name in self.categories:
+            return self.categories[name].decode(self.columns[name])
+        if name in DATE_COLUMNS:
+            return np.array([from_day(n) for n in self.columns[name]], dtype=object)
+        return self.columns[name]
+
+    def eq(self, name, *values):
+        "Boolean mask of the rows whose (categorical) field name has one of values."
+        cat = self.categories[name]
+        wanted = [cat.index[v] for v in values if v in cat.index]
+        return np.isin(self.columns[name], wanted)
+
+    def group_by(self, *names):
+        """
+        Dict mapping each (decoded) key tuple over the fields names to the
+        array of positions of the rows in that group.
+        """
+        keys, inverse = self._group_keys(names)
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(keys) + 1))
+        return {key: order[bounds[i]:bounds[i+1]] for i, key in enumerate(keys)}
+
+    def group_counts(self, *names):
+        "Dict mapping each (decoded) key tuple over the fields names to its number of rows."
+        keys, inverse = self._group_keys(names)
+        counts = np.bincount(inverse, minlength=len(keys))
+        return {key: int(n) for key, n in zip(keys, counts)}
+
+    def crosstab(self, row, col):
+        """
+        Counts of rows by the categorical fields row and col:
+        (row labels, col labels, 2-d array of counts), with empty labels dropped.
+        """
+        r, c = self.columns[row], self.columns[col]
+        nr, nc = len(self.categories[row]), len(self.categories[col])
+        counts = np.bincount(r.astype(np.int64) * nc + c, minlength=nr * nc).reshape(nr, nc)
+        rs, cs = counts.any(axis=1), counts.any(axis=0)
+        return (self.categories[row].decode(np.flatnonzero(rs)),
+                self.categories[col].decode(np.flatnonzero(cs)),
+                counts[rs][:, cs])
+
+    def _group_keys(self, names):
+        "Distinct (decoded) key tuples over names, and the group number of each row."
+        key = np.zeros(len(self), dtype=np.int64)
+        for name in names:
+            key = key * len(self.categories[name]) + self.columns[name]
+        uniq, inverse = np.unique(key, return_inverse=True)
+        decoded = []
+        for name in reversed(names):
+            n = len(self.categories[name])
+            decoded.append(self.categories[name].decode(uniq % n))
+            uniq = uniq // n
+        keys = list(zip(*reversed(decoded))) if names else [()] * len(uniq)
+        return keys, inverse.reshape(-1)
+
+    def rows(self):
+        "Generator over the raw (csv) rows of the table."
+        buf = self._buf
+        for start, end in self._offsets:
+            yield unpack_row(str(buf[start:end], 'utf-8'))
+
+    def to_voters(self):
+        "Generator over the Voter objects for the rows of the table."
+        for row in self.rows():
+            yield Voter(row)
+
+    def nbytes(self):
+        "Memory held by the columns and the packed rows."
+        return (sum(c.nbytes for c in self.columns.values()) + self.index.nbytes +
+                self._offsets.nbytes + len(self._buf))
+
+    def save(self, fn, meta=None):
+        """
+        Write the table to fn in the layout described at MAGIC. meta is any json
+        value, stored in the header and returned by read_meta.
+        """
+        arrays = [('column.' + name, c) for name, c in self.columns.items()]
+        arrays += [('index', self.index), ('offsets', self._offsets),
+                   ('buf', np.frombuffer(self._buf, dtype=np.uint8))]
+        sections = []
+        pos = 0
+        for name, a in arrays:
+            a = np.ascontiguousarray(a)
+            sections.append([name, a.dtype.str, list(a.shape), pos, a.nbytes])
+            pos += -(-a.nbytes // ALIGN) * ALIGN
+        header = json.dumps({'schema': SCHEMA_VERSION, 'meta': meta, 'sections': sections,
+                             'categories': {name: c.labels for name, c in self.categories.items()}},
+                            ensure_ascii=False).encode('utf-8')
+        start = -(-(len(MAGIC) + FILE_HEADER.size + len(header)) // ALIGN) * ALIGN
+        with open(fn, 'wb') as fp:
+            fp.write(MAGIC + FILE_HEADER.pack(FORMAT_VERSION, len(header)) + header)
+            for (name, a), (_, _, _, offset, nbytes) in zip(arrays, sections):
+                fp.seek(start + offset)
+                fp.write(np.ascontiguousarray(a).tobytes())
+            fp.truncate(start + pos)
+
+    @classmethod
+    def load(cls, fn):
+        """
+        Read a table written by save. The arrays are mapped from the file, not read,
+        so this takes the same time whatever the size of the table.
+        Raises ValueError if fn is not a table of this format and schema.
+        """
+        with open(fn, 'rb') as fp:
+            mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        header, start = _read_header(mm, fn)
+        arrays = {}
+        for name, dtype, shape, offset, nbytes in header['sections']:
+            count = nbytes // np.dtype(dtype).itemsize
+            arrays[name] = np.frombuffer(mm, dtype=dtype, count=count,
+                                         offset=start + offset).reshape(shape)
+        columns = {name[len('column.'):]: a for name, a in arrays.items()
+                   if name.startswith('column.')}
+        categories = {name: Categorical(labels) for name, labels in header['categories'].items()}
+        return cls(columns, categories, arrays['index'], arrays['offsets'],
+                   memoryview(arrays['buf']))
+
+
+def _read_header(mm, fn):
+    "The json header of a saved table, and the offset at which its arrays start."
+    n = len(MAGIC) + FILE_HEADER.size
+    if len(mm) < n or mm[:len(MAGIC)] != MAGIC:
+        raise ValueError(fn + ' is not a saved VoterTable')
+    version, size = FILE_HEADER.unpack(mm[len(MAGIC):n])
+    if version != FORMAT_VERSION:
+        raise ValueError('{} has format version {}, expected {}'.format(fn, version, FORMAT_VERSION))
+    header = json.loads(str(mm[n:n + size], 'utf-8'))
+    if header['schema'] != SCHEMA_VERSION:
+        raise ValueError('{} was parsed with schema {}, expected {}'.format(
+            fn, header['schema'], SCHEMA_VERSION))
+    return header, -(-(n + size) // ALIGN) * ALIGN
+
+def read_meta(fn):
+    "The meta saved with the table in fn."
+    with open(fn, 'rb') as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return _read_header(mm, fn)[0]['meta']